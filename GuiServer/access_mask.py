@@ -0,0 +1,71 @@
+"""Schreibrechte (RO/RW) der Register-Map als Bitmaske pro Tabelle.
+
+Ein Eintrag in registers.yaml kann `access: RO` oder `access: RW` tragen.
+Ohne Angabe gilt die Modbus-Beschreibung: beschreibbar sind die Datenpunkte
+mit Number 00-49 aus refresh_timeout.REFRESH_NUMBERS und alle Einstellungen
+ab Number 50; Coils sind immer beschreibbar.
+
+Die Masken haben ein Bit pro Wort (Coils: pro Bit) und werden einmal beim
+Laden bzw. Hot Reload gebaut; ein Client-Schreibzugriff prüft nur die Bits
+des geschriebenen Bereichs.
+"""
+from bit_block import PackedBits
+from refresh_timeout import is_refresh_datapoint
+
+ACCESS_RO = "RO"
+ACCESS_RW = "RW"
+
+# Tables a client can write to (FC 5/6/15/16)
+WRITABLE_TABLES = {'holding': 'h', 'coil': 'c'}
+
+# Modbus-Beschreibung: Number 50-99 are settings (RW)
+SETTINGS_NUMBER = 50
+
+
+def default_access(reg):
+    """Zugriff laut Modbus-Beschreibung, wenn registers.yaml keinen angibt."""
+    if reg['mode'] == 'coil':
+        return ACCESS_RW
+    address = reg['address']
+    if address % 100 >= SETTINGS_NUMBER or is_refresh_datapoint(address):
+        return ACCESS_RW
+    return ACCESS_RO
+
+
+def register_access(reg):
+    """RO oder RW eines Registers (ValueError bei unbekannten Angaben)."""
+    access = reg.get('access')
+    if access is None:
+        return default_access(reg)
+    access = str(access).upper()
+    if access not in (ACCESS_RO, ACCESS_RW):
+        raise ValueError(f"{reg['mode']} {reg['address']}: access must be RO or RW, "
+                         f"not {reg['access']!r}")
+    return access
+
+
+def build_write_masks(registers, words_of):
+    """Schreibmasken {table: PackedBits} der beschreibbaren Tabellen.
+
+    words_of(reg) liefert die Wörter (bzw. Bits) eines Registers; gesetzt
+    werden nur die Bits von RW-Registern.
+    """
+    entries = {table: [] for table in WRITABLE_TABLES.values()}
+    sizes = dict.fromkeys(WRITABLE_TABLES.values(), 0)
+    for reg in registers:
+        table = WRITABLE_TABLES.get(reg['mode'])
+        if table is None:
+            continue
+        count = len(words_of(reg))
+        sizes[table] = max(sizes[table], reg['address'] + count)
+        if register_access(reg) == ACCESS_RW:
+            entries[table].append((reg['address'], count))
+
+    masks = {}
+    for table, size in sizes.items():
+        # Same size as the images: one spare element at the end
+        mask = PackedBits(size + 1)
+        for address, count in entries[table]:
+            mask.fill(address, count, 1)
+        masks[table] = mask
+    return masks
@@ -0,0 +1,99 @@
+"""Virtuelle Energie-Akkumulatoren (32 Bit), beim Lesen berechnet.
+
+Statt die Zähler per Timer hochzuschreiben, ergibt sich ihr Wert aus
+Startwert + Rate * vergangene Zeit (monotone Uhr). Dadurch sind High- und
+Low-Wort immer konsistent und es entsteht kein Schreibverkehr.
+"""
+import time
+
+# Previous timer behaviour: +10 every 10 seconds
+DEFAULT_ACCUMULATOR_RATE = 1.0
+
+
+class VirtualAccumulator:
+    """Ein 32-Bit-Zähler über zwei Holding-Register (High-Wort zuerst)."""
+
+    __slots__ = ("address", "start_value", "rate", "started")
+
+    def __init__(self, address, start_value=0, rate=DEFAULT_ACCUMULATOR_RATE, now=None):
+        self.address = address
+        self.start_value = start_value
+        self.rate = rate
+        self.started = time.monotonic() if now is None else now
+
+    def value(self, now=None):
+        """Aktueller Zählerstand."""
+        now = time.monotonic() if now is None else now
+        return int(self.start_value + self.rate * (now - self.started)) & 0xFFFFFFFF
+
+    def rebase(self, value, now=None):
+        """Setze den Zählerstand (z.B. nach einem Schreibzugriff)."""
+        self.start_value = value
+        self.started = time.monotonic() if now is None else now
+
+    def set_rate(self, rate, now=None):
+        """Ändere die Rate ohne Sprung im Zählerstand."""
+        now = time.monotonic() if now is None else now
+        self.rebase(self.start_value + self.rate * (now - self.started), now)
+        self.rate = rate
+
+
+class AccumulatorBank:
+    """Alle virtuellen Akkumulatoren eines Geräts."""
+
+    def __init__(self, accumulators):
+        self.accumulators = {acc.address: acc for acc in accumulators}
+        # address of every word -> (accumulator, word index 0 = high, 1 = low)
+        self._words = {}
+        for acc in self.accumulators.values():
+            self._words[acc.address] = (acc, 0)
+            self._words[acc.address + 1] = (acc, 1)
+        self.low = min(self._words) if self._words else 0
+        self.high = max(self._words) if self._words else -1
+
+    def __contains__(self, address):
+        return address in self.accumulators
+
+    def __getitem__(self, address):
+        return self.accumulators[address]
+
+    def overlaps(self, address, count):
+        """True, wenn der Bereich ein Akkumulator-Wort enthält."""
+        if address > self.high or address + count <= self.low:
+            return False
+        return any(addr in self._words for addr in range(address, address + count))
+
+    def overlay(self, address, values):
+        """Ersetze Akkumulator-Wörter in gelesenen Werten durch den aktuellen Stand."""
+        if not self.overlaps(address, len(values)):
+            return values
+        now = time.monotonic()
+        values = list(values)
+        for offset in range(len(values)):
+            word = self._words.get(address + offset)
+            if word is not None:
+                acc, index = word
+                value = acc.value(now)
+                values[offset] = (value >> 16) & 0xFFFF if index == 0 else value & 0xFFFF
+        return values
+
+    def sync(self, image):
+        """Schreibe den aktuellen Stand aller Akkumulatoren ins Register-Image."""
+        now = time.monotonic()
+        for acc in self.accumulators.values():
+            value = acc.value(now)
+            image[acc.address] = (value >> 16) & 0xFFFF
+            image[acc.address + 1] = value & 0xFFFF
+
+    def rebase_from(self, image, address, count):
+        """Übernimm geschriebene Wörter aus dem Image als neue Startwerte."""
+        now = time.monotonic()
+        touched = {self._words[addr][0] for addr in range(address, address + count)
+                   if addr in self._words}
+        for acc in touched:
+            acc.rebase((image[acc.address] << 16) | image[acc.address + 1], now)
+
+    def values(self):
+        """Momentaufnahme aller Zählerstände, Schlüssel Adresse."""
+        now = time.monotonic()
+        return {address: acc.value(now) for address, acc in self.accumulators.items()}
@@ -0,0 +1,291 @@
+"""Bit-gepackte Coils und Discrete Inputs.
+
+Ein Bit pro Coil in einem bytearray statt eines Python-Objekts pro Bit, in
+der Modbus-Reihenfolge (erstes Bit im niederwertigsten Bit des ersten
+Bytes). FC 1/2 antworten direkt mit den gepackten Bytes, FC 15 schreibt die
+empfangenen Bytes ohne Umweg über eine Liste; nur Logging und Change-Events
+entpacken bei Bedarf.
+
+In registers.yaml belegt ein Eintrag mit `count` einen ganzen Bitbereich:
+
+    - address: 0
+      mode: coil            # oder discrete_input
+      type: bool
+      count: 4096
+      initial_value: 0      # 0/1 für alle Bits oder eine Liste
+"""
+from itertools import chain
+import struct
+
+from pymodbus.constants import ExcCodes
+from pymodbus.datastore import ModbusSequentialDataBlock
+from pymodbus.pdu import ExceptionResponse
+from pymodbus.pdu.bit_message import (
+    ReadCoilsRequest, ReadCoilsResponse, ReadDiscreteInputsResponse,
+    WriteMultipleCoilsRequest, WriteMultipleCoilsResponse
+)
+
+BIT_MODES = {'coil': 'c', 'discrete_input': 'd'}
+
+# byte -> its 8 bits, least significant first
+_BYTE_BITS = [tuple((byte >> bit) & 1 for bit in range(8)) for byte in range(256)]
+
+
+def unpack_bits(data, count):
+    """Gepackte Bytes -> Liste von 0/1."""
+    return list(chain.from_iterable(_BYTE_BITS[byte] for byte in data))[:count]
+
+
+def pack_bits(bits):
+    """Liste von 0/1 (oder bool) -> gepackte Bytes."""
+    value = 0
+    for index, bit in enumerate(bits):
+        if bit:
+            value |= 1 << index
+    return value.to_bytes((len(bits) + 7) // 8, 'little')
+
+
+class PackedBits:
+    """Listenartiges Bitfeld auf einem bytearray.
+
+    Index- und Slice-Zugriffe liefern 0/1 wie die bisherigen Listen, damit
+    Datastore, Change-Events und Checkpoints unverändert funktionieren.
+    """
+
+    __slots__ = ("_bytes", "_size")
+
+    def __init__(self, size=0):
+        self._bytes = bytearray((size + 7) // 8)
+        self._size = size
+
+    @classmethod
+    def from_bits(cls, bits):
+        bits = list(bits)
+        packed = cls(len(bits))
+        packed.write_packed(0, len(bits), pack_bits(bits))
+        return packed
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return iter(self.read_bits(0, self._size))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._size)
+            if step != 1:
+                return self.read_bits(0, self._size)[index]
+            return self.read_bits(start, max(stop - start, 0))
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("bit index out of range")
+        return (self._bytes[index >> 3] >> (index & 7)) & 1
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(self._size)
+            bits = list(value)
+            if len(bits) != stop - start:
+                raise ValueError("a bit field cannot change its size by slice assignment")
+            self.write_packed(start, len(bits), pack_bits(bits))
+            return
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("bit index out of range")
+        if value:
+            self._bytes[index >> 3] |= 1 << (index & 7)
+        else:
+            self._bytes[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def extend(self, values):
+        """Bitfeld vergrößern (Hot Reload)."""
+        bits = list(values)
+        start = self._size
+        self._size += len(bits)
+        self._bytes.extend(bytes((self._size + 7) // 8 - len(self._bytes)))
+        self.write_packed(start, len(bits), pack_bits(bits))
+
+    def read_bits(self, start, count):
+        return unpack_bits(self.read_packed(start, count), count)
+
+    def read_packed(self, start, count):
+        """count Bits ab start als gepackte Bytes (Modbus-Reihenfolge)."""
+        if count <= 0:
+            return b""
+        first, shift = start >> 3, start & 7
+        size = (count + 7) // 8
+        if shift == 0:
+            data = bytearray(self._bytes[first:first + size])
+        else:
+            value = int.from_bytes(self._bytes[first:first + size + 1], 'little') >> shift
+            data = bytearray(value.to_bytes(size + 1, 'little')[:size])
+        if count & 7:
+            # Bits beyond count are sent as 0
+            data[-1] &= (1 << (count & 7)) - 1
+        return bytes(data)
+
+    def write_packed(self, start, count, data):
+        """count Bits ab start aus gepackten Bytes setzen."""
+        if count <= 0:
+            return
+        first, shift = start >> 3, start & 7
+        span = (shift + count + 7) // 8
+        mask = ((1 << count) - 1) << shift
+        value = (int.from_bytes(data[:(count + 7) // 8], 'little') << shift) & mask
+        old = int.from_bytes(self._bytes[first:first + span], 'little')
+        self._bytes[first:first + span] = ((old & ~mask) | value).to_bytes(span, 'little')
+
+    def copy(self):
+        packed = PackedBits()
+        packed._bytes = bytearray(self._bytes)
+        packed._size = self._size
+        return packed
+
+    def fill(self, start, count, value):
+        """count Bits ab start auf 0 oder 1 setzen."""
+        self.write_packed(start, count, (b"\xff" if value else b"\x00") * ((count + 7) // 8))
+
+    def count_set(self, start, count):
+        """Anzahl gesetzter Bits im Bereich."""
+        return bin(int.from_bytes(self.read_packed(start, count), 'little')).count("1")
+
+    def all_set(self, start, count):
+        """True, wenn alle count Bits ab start gesetzt sind."""
+        first, shift = start >> 3, start & 7
+        full = (1 << count) - 1
+        value = int.from_bytes(self._bytes[first:first + (shift + count + 7) // 8], 'little')
+        return (value >> shift) & full == full
+
+    def nbytes(self):
+        return len(self._bytes)
+
+
+class PackedBitBlock(ModbusSequentialDataBlock):
+    """Datenblock für Coils/Discrete Inputs auf einem PackedBits-Feld."""
+
+    def __init__(self, address, bits):
+        self.address = address
+        self.values = bits if isinstance(bits, PackedBits) else PackedBits.from_bits(bits)
+        self.default_value = 0
+
+    def reset(self):
+        self.values = PackedBits(len(self.values))
+
+
+def register_bits(reg):
+    """Initialwerte eines Bit-Eintrags (count Bits, Standard 1)."""
+    count = int(reg.get('count', 1))
+    initial = reg.get('initial_value', 0)
+    if isinstance(initial, list):
+        if len(initial) != count:
+            raise ValueError(f"{reg['mode']} {reg['address']}: "
+                             f"{len(initial)} initial values for {count} bits")
+        return [1 if bit else 0 for bit in initial]
+    return [1 if initial else 0] * count
+
+
+def build_bit_images(registers):
+    """Bitfelder und Gültigkeitsmasken pro Bit-Tabelle: {table: (PackedBits, PackedBits)}."""
+    entries = {table: [] for table in BIT_MODES.values()}
+    sizes = dict.fromkeys(BIT_MODES.values(), 0)
+    for reg in registers:
+        table = BIT_MODES.get(reg['mode'])
+        if table is None:
+            continue
+        count = int(reg.get('count', 1))
+        entries[table].append((reg['address'], count, reg))
+        sizes[table] = max(sizes[table], reg['address'] + count)
+
+    images = {}
+    for table, size in sizes.items():
+        # Same layout as the register images: one spare element at the end
+        bits, valid = PackedBits(size + 1), PackedBits(size + 1)
+        for address, count, reg in entries[table]:
+            initial = reg.get('initial_value', 0)
+            if isinstance(initial, list):
+                bits.write_packed(address, count, pack_bits(register_bits(reg)))
+            else:
+                bits.fill(address, count, initial)
+            valid.fill(address, count, 1)
+        images[table] = (bits, valid)
+    return images
+
+
+class PackedReadBitsResponse(ReadCoilsResponse):
+    """FC-1/2-Antwort mit bereits gepackten Bytes."""
+
+    def __init__(self, payload=b"", **kwargs):
+        super().__init__(**kwargs)
+        self.payload = payload
+
+    def encode(self):
+        return struct.pack(">B", len(self.payload)) + self.payload
+
+
+class PackedReadDiscreteInputsResponse(PackedReadBitsResponse):
+    function_code = ReadDiscreteInputsResponse.function_code
+
+
+class PackedReadCoilsRequest(ReadCoilsRequest):
+    """FC 1/2 direkt aus dem Bitfeld (get_packed_bits des Kontexts)."""
+
+    async def update_datastore(self, context):
+        get_packed_bits = getattr(context, 'get_packed_bits', None)
+        data = (get_packed_bits(self.function_code, self.address, self.count)
+                if get_packed_bits is not None else None)
+        if data is None:
+            # Not a packed block (e.g. a shared image): generic path
+            return await super().update_datastore(context)
+        if isinstance(data, ExcCodes):
+            return ExceptionResponse(self.function_code, data)
+        response_class = (PackedReadBitsResponse if self.function_code == 1
+                          else PackedReadDiscreteInputsResponse)
+        return response_class(payload=data, dev_id=self.dev_id,
+                              transaction_id=self.transaction_id)
+
+
+class PackedReadDiscreteInputsRequest(PackedReadCoilsRequest):
+    function_code = 2
+
+
+class PackedWriteMultipleCoilsRequest(WriteMultipleCoilsRequest):
+    """FC 15: behält die empfangenen Bytes und schreibt sie gepackt (set_packed_bits)."""
+
+    @property
+    def bits(self):
+        # Unpacked only for observers that need single bits (traffic recorder)
+        if self.packed is not None:
+            return unpack_bits(self.packed, self.count)
+        return self._bits
+
+    @bits.setter
+    def bits(self, value):
+        self._bits = value
+        self.packed = None
+
+    def decode(self, data):
+        self.address, self.count, byte_count = struct.unpack(">HHB", data[0:5])
+        self.packed = bytes(data[5:5 + byte_count])
+
+    async def update_datastore(self, context):
+        set_packed_bits = getattr(context, 'set_packed_bits', None)
+        if self.packed is None or set_packed_bits is None:
+            return await super().update_datastore(context)
+        rc = set_packed_bits(self.function_code, self.address, self.count, self.packed)
+        if rc is None:
+            # Not a packed block: generic path with the unpacked bits
+            self._bits = unpack_bits(self.packed, self.count)
+            self.packed = None
+            return await super().update_datastore(context)
+        if isinstance(rc, ExcCodes):
+            return ExceptionResponse(self.function_code, rc)
+        return WriteMultipleCoilsResponse(address=self.address, count=self.count,
+                                          dev_id=self.dev_id,
+                                          transaction_id=self.transaction_id)
+
+
+PACKED_BIT_PDUS = [PackedReadCoilsRequest, PackedReadDiscreteInputsRequest,
+                   PackedWriteMultipleCoilsRequest]
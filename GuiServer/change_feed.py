@@ -0,0 +1,280 @@
+"""Lokaler Change-Feed: Registeränderungen als Stream über Unix- oder TCP-Socket.
+
+Jede Änderung (Client-Schreibzugriff, GUI, Simulation, Refresh-Timeout)
+wird als JSON-Zeile verschickt:
+
+    {"unit": 1, "table": "h", "address": 1004, "old": 0, "new": 215, "ts": 1710316800.25}
+
+Pro Abonnent werden noch nicht gesendete Änderungen pro (Unit, Tabelle,
+Adresse) zusammengefasst: "old" ist der zuletzt gesendete Wert, "new" der
+aktuelle. Ein langsamer Abonnent bekommt also weniger Zwischenstände, aber
+nie einen veralteten Endstand; sein Rückstand ist durch die Anzahl der
+Adressen begrenzt. Wer mehr als max_pending Adressen im Rückstand ist,
+wird getrennt.
+
+Ein Abonnent kann optional eine Filterzeile senden:
+
+    {"units": [1, 2], "ranges": [[1000, 1099]], "tables": ["h"]}
+
+Aufruf als Skript zeigt den Feed an:
+    python change_feed.py /tmp/lambda-changes.sock
+    python change_feed.py 5021
+"""
+import argparse
+import asyncio
+from collections import deque
+import json
+import os
+import sys
+
+CHANGE_FEED_MAX_PENDING = 100000     # coalesced addresses per subscriber
+CHANGE_FEED_WRITE_BUFFER = 64 * 1024  # bytes in the socket buffer before coalescing kicks in
+
+
+def parse_feed_address(address):
+    """Portnummer (TCP auf 127.0.0.1) oder Pfad (Unix-Socket)."""
+    if isinstance(address, int) or str(address).isdigit():
+        return ("127.0.0.1", int(address))
+    return str(address)
+
+
+class ChangeSubscriber:
+    """Ein verbundener Abonnent mit eigenem, zusammengefasstem Rückstand."""
+
+    def __init__(self, feed, reader, writer):
+        self.feed = feed
+        self.reader = reader
+        self.writer = writer
+        # (unit, table, address) -> [old, new, ts]; insertion order = send order
+        self.pending = {}
+        self.units = None
+        self.tables = None
+        self.ranges = None
+        self.sent = 0
+        self.coalesced = 0
+        self._wakeup = asyncio.Event()
+
+    def wants(self, unit, table, address):
+        """Filter des Abonnenten."""
+        if self.units is not None and unit not in self.units:
+            return False
+        if self.tables is not None and table not in self.tables:
+            return False
+        if self.ranges is not None:
+            return any(first <= address <= last for first, last in self.ranges)
+        return True
+
+    def add(self, event):
+        """Änderungen eines ChangeEvents in den Rückstand übernehmen."""
+        pending = self.pending
+        unit, table, ts = event.unit, event.table, event.timestamp
+        filtered = self.units is not None or self.tables is not None or self.ranges is not None
+        for address, old, new in event.changes:
+            if filtered and not self.wants(unit, table, address):
+                continue
+            key = (unit, table, address)
+            entry = pending.get(key)
+            if entry is None:
+                pending[key] = [old, new, ts]
+            else:
+                self.coalesced += 1
+                if entry[0] == new:
+                    # Back to the value the subscriber already has
+                    del pending[key]
+                else:
+                    entry[1] = new
+                    entry[2] = ts
+        if len(pending) > self.feed.max_pending:
+            self.feed.log("Change feed subscriber too slow, disconnecting")
+            self.close()
+            return
+        if pending:
+            self._wakeup.set()
+
+    def set_filter(self, line):
+        """Filterzeile des Abonnenten übernehmen (ungültige Zeilen ignorieren)."""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return
+        if not isinstance(request, dict):
+            return
+        if request.get("units") is not None:
+            self.units = frozenset(int(unit) for unit in request["units"])
+        if request.get("tables") is not None:
+            self.tables = frozenset(request["tables"])
+        if request.get("ranges") is not None:
+            self.ranges = [(int(first), int(last)) for first, last in request["ranges"]]
+        # Changes queued before the filter arrived
+        for key in [key for key in self.pending if not self.wants(*key)]:
+            del self.pending[key]
+
+    async def send_loop(self):
+        """Rückstand senden; während drain() wartet, wird weiter zusammengefasst."""
+        try:
+            await self._send_pending()
+        except ConnectionError:
+            self.close()
+
+    async def _send_pending(self):
+        writer = self.writer
+        while not writer.is_closing():
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self.pending:
+                continue
+            batch, self.pending = self.pending, {}
+            writer.write("".join(
+                json.dumps({"unit": unit, "table": table, "address": address,
+                            "old": old, "new": new, "ts": round(ts, 6)},
+                           separators=(",", ":")) + "\n"
+                for (unit, table, address), (old, new, ts) in batch.items()
+            ).encode())
+            self.sent += len(batch)
+            await writer.drain()
+
+    async def read_loop(self):
+        """Filterzeilen lesen, bis der Abonnent die Verbindung schließt."""
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            self.set_filter(line)
+
+    def close(self):
+        self.writer.close()
+
+
+class ChangeFeedServer:
+    """Verteilt ChangeEvents aller Units an die Socket-Abonnenten.
+
+    Der Listener läuft im schreibenden Thread (Event-Loop oder GUI) und hängt
+    Events nur an eine Deque an; verteilt wird im Event-Loop.
+    """
+
+    def __init__(self, address, log_message=None, max_pending=CHANGE_FEED_MAX_PENDING):
+        self.address = parse_feed_address(address)
+        self.log_message = log_message
+        self.max_pending = max_pending
+        self.subscribers = set()
+        self.events = 0
+        self._incoming = deque()
+        self._dispatch_scheduled = False
+        self._loop = None
+        self._server = None
+
+    async def start(self):
+        """Socket im laufenden Event-Loop öffnen."""
+        self._loop = asyncio.get_running_loop()
+        if isinstance(self.address, tuple):
+            host, port = self.address
+            self._server = await asyncio.start_server(self._handle, host, port)
+        else:
+            if os.path.exists(self.address):
+                # Stale socket of a previous run
+                os.unlink(self.address)
+            self._server = await asyncio.start_unix_server(self._handle, self.address)
+
+    def on_change(self, event):
+        """ChangeEvent-Listener (beliebiger Thread, blockiert nie)."""
+        if not self.subscribers or self._loop is None:
+            return
+        self._incoming.append(event)
+        if not self._dispatch_scheduled:
+            self._dispatch_scheduled = True
+            self._loop.call_soon_threadsafe(self._dispatch)
+
+    def _dispatch(self):
+        """Eingegangene Events in die Rückstände der Abonnenten übernehmen."""
+        self._dispatch_scheduled = False
+        incoming = self._incoming
+        subscribers = list(self.subscribers)
+        while incoming:
+            event = incoming.popleft()
+            self.events += 1
+            for subscriber in subscribers:
+                subscriber.add(event)
+
+    async def _handle(self, reader, writer):
+        """Verbindung eines Abonnenten."""
+        writer.transport.set_write_buffer_limits(high=CHANGE_FEED_WRITE_BUFFER)
+        subscriber = ChangeSubscriber(self, reader, writer)
+        self.subscribers.add(subscriber)
+        self.log(f"Change feed subscriber connected ({len(self.subscribers)} total)")
+        sender = asyncio.ensure_future(subscriber.send_loop())
+        try:
+            await subscriber.read_loop()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Server shutdown with connected subscribers; the stream callback
+            # would report a cancelled handler task as an error
+            pass
+        finally:
+            self.subscribers.discard(subscriber)
+            sender.cancel()
+            subscriber.close()
+            self.log(f"Change feed subscriber disconnected ({len(self.subscribers)} total)")
+
+    def close(self):
+        """Socket schließen und alle Abonnenten trennen."""
+        for subscriber in list(self.subscribers):
+            subscriber.close()
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            if not isinstance(self.address, tuple) and os.path.exists(self.address):
+                os.unlink(self.address)
+
+    def log(self, text):
+        if self.log_message is not None:
+            self.log_message("FEED", 0, 0, text)
+
+    def stats(self):
+        """Zähler des Feeds."""
+        return {
+            "subscribers": len(self.subscribers),
+            "events": self.events,
+            "sent": sum(subscriber.sent for subscriber in self.subscribers),
+            "coalesced": sum(subscriber.coalesced for subscriber in self.subscribers),
+            "pending": sum(len(subscriber.pending) for subscriber in self.subscribers),
+        }
+
+
+async def _print_feed(address, subscription):
+    address = parse_feed_address(address)
+    if isinstance(address, tuple):
+        reader, writer = await asyncio.open_connection(*address)
+    else:
+        reader, writer = await asyncio.open_unix_connection(address)
+    if subscription:
+        writer.write(json.dumps(subscription).encode() + b"\n")
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        sys.stdout.write(line.decode())
+        sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Change-Feed des Servers anzeigen")
+    parser.add_argument("address", help="Pfad des Unix-Sockets oder TCP-Port")
+    parser.add_argument("--unit", type=int, action="append", help="nur diese Unit(s)")
+    parser.add_argument("--range", action="append",
+                        help="nur Adressbereich VON-BIS (mehrfach möglich)")
+    args = parser.parse_args()
+    subscription = {}
+    if args.unit:
+        subscription["units"] = args.unit
+    if args.range:
+        subscription["ranges"] = [[int(part) for part in (text.split("-") + [text])[:2]]
+                                  for text in args.range]
+    try:
+        asyncio.run(_print_feed(args.address, subscription))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Binäre Checkpoints des kompletten Register-Images aller Units.
+
+Ein Checkpoint enthält pro Unit eine Kopie jeder Tabelle (h, i, c, d), die
+Zählerstände der virtuellen Akkumulatoren und optional den Zustand der
+thermischen Simulation. Im Speicher sind die Tabellen einfache Listen-Kopien,
+zurückgespielt wird per Slice-Zuweisung (ein Block-Kopiervorgang pro
+Tabelle) – schnell genug, um zwischen hunderten Testfällen zurückzusetzen.
+
+Datei:  b"MBCP", Version (B), Länge Metadaten (I), Metadaten (JSON),
+        danach die Tabellen (uint16) und Simulations-Arrays als Rohdaten
+        in der Reihenfolge der Metadaten.
+"""
+from array import array
+import json
+import struct
+import time
+
+try:
+    # Only needed for checkpoints carrying simulation state
+    import numpy as np
+except ImportError:
+    np = None
+
+CHECKPOINT_MAGIC = b"MBCP"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_HEADER = struct.Struct("<4sBI")
+
+TABLES = ("h", "i", "c", "d")
+
+
+class RegisterCheckpoint:
+    """Momentaufnahme aller Units (und der Simulation)."""
+
+    __slots__ = ("units", "accumulators", "simulation", "hp_mode", "created")
+
+    def __init__(self, units, accumulators, simulation=None, hp_mode=None, created=None):
+        # unit -> {table: list of words}
+        self.units = units
+        # unit -> {address: 32-bit value}
+        self.accumulators = accumulators
+        # name -> numpy array / float (ThermalSimulation.save_state) or None
+        self.simulation = simulation
+        self.hp_mode = hp_mode
+        self.created = time.time() if created is None else created
+
+    def save(self, path):
+        """Checkpoint als Binärdatei schreiben."""
+        blobs = []
+        meta = {"hp_mode": self.hp_mode, "created": self.created,
+                "units": [], "simulation": []}
+        for unit, tables in self.units.items():
+            entry = {"unit": unit, "tables": [],
+                     "accumulators": {str(address): value for address, value
+                                      in self.accumulators.get(unit, {}).items()}}
+            for table, words in tables.items():
+                entry["tables"].append([table, len(words)])
+                blobs.append(array("H", words).tobytes())
+            meta["units"].append(entry)
+        if self.simulation is not None:
+            for name, value in self.simulation.items():
+                if name == "time":
+                    meta["sim_time"] = value
+                    continue
+                data = value.tobytes()
+                meta["simulation"].append([name, value.dtype.str, list(value.shape), len(data)])
+                blobs.append(data)
+        header = json.dumps(meta, separators=(",", ":")).encode()
+        with open(path, "wb") as f:
+            f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, len(header)))
+            f.write(header)
+            for blob in blobs:
+                f.write(blob)
+
+    @classmethod
+    def load(cls, path):
+        """Checkpoint aus einer Datei lesen."""
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, header_size = CHECKPOINT_HEADER.unpack_from(data, 0)
+        if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+            raise ValueError(f"{path} is not a register checkpoint")
+        offset = CHECKPOINT_HEADER.size
+        meta = json.loads(data[offset:offset + header_size])
+        offset += header_size
+
+        units, accumulators = {}, {}
+        for entry in meta["units"]:
+            tables = {}
+            for table, count in entry["tables"]:
+                words = array("H")
+                words.frombytes(data[offset:offset + 2 * count])
+                tables[table] = words.tolist()
+                offset += 2 * count
+            units[entry["unit"]] = tables
+            accumulators[entry["unit"]] = {int(address): value for address, value
+                                           in entry["accumulators"].items()}
+
+        simulation = None
+        if meta["simulation"]:
+            if np is None:
+                raise RuntimeError("checkpoint contains simulation state, numpy is required")
+            simulation = {"time": meta.get("sim_time", 0.0)}
+            for name, dtype, shape, size in meta["simulation"]:
+                simulation[name] = np.frombuffer(
+                    data[offset:offset + size], dtype=dtype).reshape(shape).copy()
+                offset += size
+        return cls(units, accumulators, simulation, meta["hp_mode"], meta["created"])
+
+    def size(self):
+        """Anzahl der gespeicherten Registerwörter."""
+        return sum(len(words) for tables in self.units.values() for words in tables.values())
@@ -0,0 +1,167 @@
+"""Lokale HTTP/JSON-Steuerschnittstelle für Testaufbauten.
+
+Ein Aufruf setzt hunderte Register auf mehreren Units, schaltet den WP-Modus
+um oder spielt einen Snapshot zurück – ohne Modbus-Schreibzugriffe und ohne
+Neustart. Schreibzugriffe laufen im Event-Loop des Servers, also atomar
+zwischen zwei Modbus-Requests.
+
+    GET  /registers?unit=1&address=1000&count=30
+    POST /registers        {"writes": [{"unit": 1, "address": 1000, "values": [...]}]}
+                           ("unit": "all" schreibt auf alle Units)
+    GET  /mode             POST /mode {"hp_mode": 2}
+    POST /snapshot/save    {"path": "scenario.json"} (ohne path: Snapshot in der Antwort)
+    POST /snapshot/load    {"path": "scenario.json"} oder {"snapshot": {...}}
+    POST /checkpoint       {"name": "clean"} (im Speicher) oder {"path": "clean.mbcp"}
+    POST /checkpoint/restore  {"name": "clean"} oder {"path": "clean.mbcp"}
+    GET  /stats
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+from urllib.parse import parse_qs, urlparse
+
+CONTROL_API_HOST = "127.0.0.1"
+CONTROL_API_POLL_INTERVAL = 0.05
+
+
+class ControlApiHandler(BaseHTTPRequestHandler):
+    """Routing der JSON-Endpunkte."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        route = self.server.routes.get((method, url.path))
+        if route is None:
+            self._reply(404, {"error": f"no route {method} {url.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else {}
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            self._reply(200, route(body, query))
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {"error": str(e)})
+        except (RuntimeError, OSError) as e:
+            self._reply(409, {"error": str(e)})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload, separators=(",", ":")).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # No stderr line per call; test suites call the API very often
+        pass
+
+
+class ControlApiServer:
+    """HTTP-Server in einem Hintergrund-Thread, bedient einen ModbusServerThread."""
+
+    def __init__(self, server_thread, port, host=CONTROL_API_HOST):
+        self.server_thread = server_thread
+        self.httpd = ThreadingHTTPServer((host, port), ControlApiHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.routes = {
+            ("GET", "/registers"): self.get_registers,
+            ("POST", "/registers"): self.set_registers,
+            ("GET", "/mode"): self.get_mode,
+            ("POST", "/mode"): self.set_mode,
+            ("POST", "/snapshot/save"): self.save_snapshot,
+            ("POST", "/snapshot/load"): self.load_snapshot,
+            ("POST", "/checkpoint"): self.create_checkpoint,
+            ("POST", "/checkpoint/restore"): self.restore_checkpoint,
+            ("GET", "/stats"): self.get_stats,
+        }
+        # name -> RegisterCheckpoint kept in memory
+        self.checkpoints = {}
+        self.port = self.httpd.server_address[1]
+        # Short poll interval: stop() waits for one poll cycle
+        self._thread = threading.Thread(target=self.httpd.serve_forever,
+                                        kwargs={"poll_interval": CONTROL_API_POLL_INTERVAL},
+                                        name="ControlApi", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """HTTP-Server beenden und Port freigeben."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def get_registers(self, body, query):
+        unit = int(query.get("unit", 1))
+        address = int(query["address"])
+        count = int(query.get("count", 1))
+        return {"unit": unit, "address": address,
+                "values": self.server_thread.read_registers(unit, address, count)}
+
+    def set_registers(self, body, query):
+        writes = {}
+        all_units = range(1, self.server_thread.units + 1)
+        for write in body["writes"]:
+            units = all_units if write.get("unit", 1) == "all" else [int(write.get("unit", 1))]
+            run = (int(write["address"]), [int(value) for value in write["values"]])
+            for unit in units:
+                writes.setdefault(unit, []).append(run)
+        return {"changed": self.server_thread.write_registers(writes)}
+
+    def get_mode(self, body, query):
+        return {"hp_mode": self.server_thread.hp_mode}
+
+    def set_mode(self, body, query):
+        self.server_thread.set_heat_pump_mode(int(body["hp_mode"]))
+        return {"hp_mode": self.server_thread.hp_mode,
+                "registers": len(self.server_thread.registers)}
+
+    def save_snapshot(self, body, query):
+        snapshot = self.server_thread.take_snapshot()
+        path = body.get("path")
+        if path is None:
+            return snapshot
+        with open(path, "w") as f:
+            json.dump(snapshot, f)
+        return {"path": path}
+
+    def load_snapshot(self, body, query):
+        snapshot = body.get("snapshot")
+        if snapshot is None:
+            with open(body["path"]) as f:
+                snapshot = json.load(f)
+        return {"changed": self.server_thread.restore_snapshot(snapshot)}
+
+    def create_checkpoint(self, body, query):
+        checkpoint = self.server_thread.create_checkpoint(body.get("path"))
+        if "name" in body:
+            self.checkpoints[body["name"]] = checkpoint
+        return {"name": body.get("name"), "path": body.get("path"), "words": checkpoint.size()}
+
+    def restore_checkpoint(self, body, query):
+        if "name" in body:
+            checkpoint = self.checkpoints.get(body["name"])
+            if checkpoint is None:
+                raise KeyError(f"unknown checkpoint {body['name']!r}")
+        else:
+            checkpoint = body["path"]
+        self.server_thread.restore_checkpoint(checkpoint)
+        return {"restored": body.get("name") or body["path"]}
+
+    def get_stats(self, body, query):
+        thread = self.server_thread
+        return {
+            "units": thread.units,
+            "hp_mode": thread.hp_mode,
+            "connections": thread.get_connection_stats(),
+            "cache": thread.get_cache_stats(),
+            "change_feed": thread.get_change_feed_stats(),
+            "traffic": thread.get_traffic_summary(),
+        }
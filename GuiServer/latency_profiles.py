@@ -0,0 +1,176 @@
+"""Antwortzeit- und Durchsatz-Profile zur Emulation einer realen Steuerung."""
+import bisect
+import json
+import random
+import time
+
+
+class FixedLatency:
+    """Konstante Antwortzeit."""
+
+    def __init__(self, ms):
+        self.seconds = ms / 1000.0
+
+    def sample(self):
+        """Antwortzeit in Sekunden."""
+        return self.seconds
+
+
+class NormalLatency:
+    """Normalverteilte Antwortzeit (nach unten auf min_ms begrenzt)."""
+
+    def __init__(self, mean_ms, stddev_ms, min_ms=0.0):
+        self.mean = mean_ms / 1000.0
+        self.stddev = stddev_ms / 1000.0
+        self.minimum = min_ms / 1000.0
+
+    def sample(self):
+        """Antwortzeit in Sekunden."""
+        return max(self.minimum, random.gauss(self.mean, self.stddev))
+
+
+class HistogramLatency:
+    """Antwortzeit gemäß gemessenem Histogramm einer realen Steuerung.
+
+    buckets: Liste von (von_ms, bis_ms, anzahl); innerhalb eines Buckets gleichverteilt.
+    """
+
+    def __init__(self, buckets):
+        buckets = [(lower, upper, count) for lower, upper, count in buckets if count > 0]
+        if not buckets:
+            raise ValueError("Latency histogram has no samples")
+        self.buckets = buckets
+        self.cumulative = []
+        total = 0
+        for _, _, count in buckets:
+            total += count
+            self.cumulative.append(total)
+        self.total = total
+
+    @classmethod
+    def from_file(cls, path):
+        """Lade ein Histogramm aus JSON: {"buckets": [[von_ms, bis_ms, anzahl], ...]}."""
+        with open(path, 'r') as f:
+            return cls(json.load(f)["buckets"])
+
+    def sample(self):
+        """Antwortzeit in Sekunden."""
+        index = bisect.bisect_right(self.cumulative, random.random() * self.total)
+        lower, upper, _ = self.buckets[min(index, len(self.buckets) - 1)]
+        return random.uniform(lower, upper) / 1000.0
+
+
+class TokenBucket:
+    """Token-Bucket für Request-Raten; liefert Wartezeiten statt zu blockieren."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, now=None):
+        """Reserviere ein Token und gib die nötige Wartezeit in Sekunden zurück."""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # Tokens may go negative: queued requests are spaced by 1/rate
+        self.tokens -= 1.0
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class EmulationProfile:
+    """Kombiniert Antwortzeit-Modell, Ratenbegrenzung und Stall-Injektion."""
+
+    def __init__(self, latency=None, global_rate=None, global_burst=None,
+                 connection_rate=None, connection_burst=None,
+                 stall_probability=0.0, stall_duration=0.0):
+        self.latency = latency
+        self.global_bucket = TokenBucket(global_rate, global_burst) if global_rate else None
+        self.connection_rate = connection_rate
+        self.connection_burst = connection_burst
+        self.stall_probability = stall_probability
+        self.stall_duration = stall_duration
+        self.stalled_until = 0.0
+        self.stalls = 0
+
+    def new_connection_bucket(self):
+        """Token-Bucket für eine neue Verbindung (oder None)."""
+        if not self.connection_rate:
+            return None
+        return TokenBucket(self.connection_rate, self.connection_burst)
+
+    def delay(self, connection_bucket=None):
+        """Gesamte Verzögerung in Sekunden für den nächsten Request."""
+        now = time.monotonic()
+        wait = 0.0
+        if connection_bucket is not None:
+            wait = max(wait, connection_bucket.reserve(now))
+        if self.global_bucket is not None:
+            wait = max(wait, self.global_bucket.reserve(now))
+
+        # A stall blocks every client until it is over, like a busy controller
+        if self.stall_probability and random.random() < self.stall_probability:
+            self.stalled_until = max(self.stalled_until, now + self.stall_duration)
+            self.stalls += 1
+        if self.stalled_until > now:
+            wait = max(wait, self.stalled_until - now)
+
+        if self.latency is not None:
+            wait += self.latency.sample()
+        return wait
+
+
+def build_latency_model(config):
+    """Erzeuge ein Antwortzeit-Modell aus einer Konfiguration (dict)."""
+    model = config.get("model", "fixed")
+    if model == "fixed":
+        return FixedLatency(config.get("ms", 0.0))
+    if model == "normal":
+        return NormalLatency(config["mean_ms"], config.get("stddev_ms", 0.0),
+                             config.get("min_ms", 0.0))
+    if model == "histogram":
+        if "file" in config:
+            return HistogramLatency.from_file(config["file"])
+        return HistogramLatency(config["buckets"])
+    raise ValueError(f"Unknown latency model: {model}")
+
+
+def build_profile(config):
+    """Erzeuge ein EmulationProfile aus einer Konfiguration (dict) oder None."""
+    if not config:
+        return None
+    latency = build_latency_model(config["latency"]) if config.get("latency") else None
+    return EmulationProfile(
+        latency=latency,
+        global_rate=config.get("global_rate"),
+        global_burst=config.get("global_burst"),
+        connection_rate=config.get("connection_rate"),
+        connection_burst=config.get("connection_burst"),
+        stall_probability=config.get("stall_probability", 0.0),
+        stall_duration=config.get("stall_duration", 0.0),
+    )
+
+
+# Ready-made profiles for EMULATION_PROFILE in server_threaded.py
+PROFILES = {
+    "lan": {
+        "latency": {"model": "normal", "mean_ms": 5, "stddev_ms": 2},
+    },
+    "lambda": {
+        "latency": {"model": "normal", "mean_ms": 40, "stddev_ms": 15, "min_ms": 10},
+        "connection_rate": 20,
+        "global_rate": 100,
+        "stall_probability": 0.001,
+        "stall_duration": 3.0,
+    },
+    "congested": {
+        "latency": {"model": "normal", "mean_ms": 250, "stddev_ms": 120, "min_ms": 50},
+        "connection_rate": 5,
+        "global_rate": 20,
+        "stall_probability": 0.01,
+        "stall_duration": 8.0,
+    },
+}
@@ -0,0 +1,86 @@
+"""Begrenzter, nicht blockierender Ringpuffer für Log-Nachrichten.
+
+Der Server schreibt mit put_nowait() hinein und wartet nie; ist der Puffer
+voll, wird der älteste Eintrag verdrängt und als verworfen gezählt. Die GUI
+holt die Einträge gesammelt mit drain() ab. Lesezugriffe können gesampelt
+werden (nur jeder N-te READ wird protokolliert).
+"""
+from collections import deque
+import itertools
+
+LOG_BUFFER_SIZE = 10000
+
+
+class LogRingBuffer:
+    """Ringpuffer mit Verwerfen der ältesten Einträge und Sampling pro Typ.
+
+    deque.append/popleft sind unter dem GIL atomar, Schreiber und Leser
+    brauchen daher keine gemeinsame Sperre.
+    """
+
+    def __init__(self, capacity=LOG_BUFFER_SIZE, sample_rates=None):
+        self.capacity = capacity
+        self._items = deque(maxlen=capacity)
+        # msg_type -> N: keep only every N-th message of that type
+        self.sample_rates = dict(sample_rates or {})
+        self._sample_counters = {msg_type: itertools.count()
+                                 for msg_type in self.sample_rates}
+        self.put_count = 0
+        self.dropped = 0
+        self.sampled_out = 0
+
+    def accepts(self, msg_type):
+        """Sampling-Entscheidung vor dem (teuren) Formatieren einer Nachricht."""
+        rate = self.sample_rates.get(msg_type, 1)
+        if rate <= 1:
+            return True
+        if next(self._sample_counters[msg_type]) % rate == 0:
+            return True
+        self.sampled_out += 1
+        return False
+
+    def put_nowait(self, item):
+        """Eintrag anhängen, blockiert nie; verdrängt bei vollem Puffer den ältesten."""
+        if len(self._items) >= self.capacity:
+            # Benign race: the counter may be off by one under contention
+            self.dropped += 1
+        self._items.append(item)
+        self.put_count += 1
+
+    def put(self, item, block=False, timeout=None):
+        """Kompatibel zu queue.Queue.put, blockiert aber nie."""
+        self.put_nowait(item)
+
+    def drain(self, max_items=None):
+        """Hole bis zu max_items Einträge (älteste zuerst)."""
+        items = []
+        popleft = self._items.popleft
+        while max_items is None or len(items) < max_items:
+            try:
+                items.append(popleft())
+            except IndexError:
+                break
+        return items
+
+    def empty(self):
+        """True, wenn keine Einträge anstehen."""
+        return not self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        """Zähler des Puffers."""
+        return {
+            "capacity": self.capacity,
+            "pending": len(self._items),
+            "put": self.put_count,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+        }
+
+
+def log_accepts(log_queue, msg_type):
+    """Sampling-Entscheidung für beliebige Log-Queues (queue.Queue: immer)."""
+    accepts = getattr(log_queue, 'accepts', None)
+    return accepts is None or accepts(msg_type)
@@ -0,0 +1,88 @@
+"""Refresh-Timeout für beschreibbare Datenpunkte mit Number 00-49.
+
+Laut Modbus-Beschreibung (3.3) müssen diese Werte regelmäßig neu geschrieben
+werden; nach 5 Minuten ohne Aktualisierung gilt der Wert als ungültig und die
+Steuerung setzt einen Defaultwert.
+"""
+import heapq
+import time
+
+# Modbus-Beschreibung 3.3: timeout after 5 min
+REFRESH_TIMEOUT = 300.0
+
+# Writable datapoints with Number 00-49 per module index (first address digit)
+REFRESH_NUMBERS = {
+    0: {2},                      # General: ambient temp (0002), E-Manager actual power (0102)
+    1: {14, 15, 16, 17, 18},     # Heat pump: request password, type and setpoints
+    3: {4, 5, 6, 7, 8, 9},       # Buffer: modbus buffer temp, request type and setpoints
+    5: {4, 5, 6},                # Heating circuit: room device temp, flow line setpoint, mode
+}
+
+
+def is_refresh_datapoint(address):
+    """True, wenn die Adresse ein beschreibbarer Datenpunkt mit Number 00-49 ist."""
+    return address % 100 in REFRESH_NUMBERS.get(address // 1000, ())
+
+
+def collect_refresh_defaults(registers, words_of):
+    """Defaultwerte (Registerwörter) aller Refresh-Datenpunkte, Schlüssel Adresse."""
+    return {reg['address']: words_of(reg) for reg in registers
+            if reg['mode'] == 'holding' and is_refresh_datapoint(reg['address'])}
+
+
+class RefreshScheduler:
+    """Min-Heap der Ablaufzeitpunkte für beliebig viele (unit, address).
+
+    Ein erneutes Schreiben legt nur einen neuen Heap-Eintrag an; veraltete
+    Einträge werden beim Entnehmen verworfen (lazy deletion). So genügt ein
+    einziger periodischer Timer für alle Register aller Geräte.
+    """
+
+    def __init__(self, timeout=REFRESH_TIMEOUT):
+        self.timeout = timeout
+        self._heap = []
+        # (unit, address) -> currently valid deadline
+        self._deadlines = {}
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def touch(self, key, now=None):
+        """Datenpunkt wurde geschrieben: Ablaufzeit neu setzen."""
+        now = time.monotonic() if now is None else now
+        deadline = now + self.timeout
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+        # Rewrites leave stale entries behind; rebuild once they dominate
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(d, k) for k, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def discard(self, key):
+        """Datenpunkt nicht mehr überwachen."""
+        self._deadlines.pop(key, None)
+
+    def next_deadline(self):
+        """Frühester gültiger Ablaufzeitpunkt oder None."""
+        heap = self._heap
+        while heap and self._deadlines.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_expired(self, now=None):
+        """Entnimm alle abgelaufenen Schlüssel."""
+        now = time.monotonic() if now is None else now
+        heap = self._heap
+        expired = []
+        while heap and heap[0][0] <= now:
+            deadline, key = heapq.heappop(heap)
+            if self._deadlines.get(key) == deadline:
+                del self._deadlines[key]
+                expired.append(key)
+        self.expired += len(expired)
+        return expired
+
+    def confirm_expired(self, key, now=None):
+        """True, wenn der Datenpunkt seit pop_expired() nicht neu geschrieben wurde."""
+        return key not in self._deadlines
@@ -0,0 +1,80 @@
+"""Kompilierter Binär-Cache für registers.yaml (schneller Serverstart)."""
+import marshal
+import os
+import sys
+
+import yaml
+
+CACHE_SUFFIX = ".cache"
+CACHE_MAGIC = b"MBRC"
+CACHE_VERSION = 1
+
+# The C loader is far faster on large maps; fall back to pure Python.
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def get_cache_file(config_file):
+    """Pfad der kompilierten Cache-Datei zu einer YAML-Datei."""
+    return config_file + CACHE_SUFFIX
+
+
+def get_source_key(config_file):
+    """Schlüssel, der die Quelldatei identifiziert (mtime + Größe)."""
+    stat = os.stat(config_file)
+    return (CACHE_VERSION, tuple(sys.version_info[:2]),
+            stat.st_mtime_ns, stat.st_size)
+
+
+def parse_registers(config_file):
+    """Parse registers.yaml und sortiere nach Adresse."""
+    with open(config_file, 'r') as file:
+        registers = yaml.load(file, Loader=YamlLoader)['registers']
+        return sorted(registers, key=lambda x: x['address'])
+
+
+def load_compiled(config_file):
+    """Lade die kompilierte Register-Map, None wenn fehlend oder veraltet."""
+    try:
+        with open(get_cache_file(config_file), 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+
+    if not data.startswith(CACHE_MAGIC):
+        return None
+    try:
+        source_key, registers = marshal.loads(data[len(CACHE_MAGIC):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+    if source_key != get_source_key(config_file):
+        return None
+    return registers
+
+
+def save_compiled(config_file, registers, source_key):
+    """Schreibe die kompilierte Register-Map atomar neben die YAML-Datei."""
+    cache_file = get_cache_file(config_file)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        data = marshal.dumps((source_key, registers))
+        with open(tmp_file, 'wb') as file:
+            file.write(CACHE_MAGIC + data)
+        os.replace(tmp_file, cache_file)
+    except (OSError, ValueError):
+        # Read-only checkouts or exotic YAML values: just skip the cache
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+
+
+def load_registers(config_file):
+    """Lade Register aus dem Cache, bei veraltetem Cache aus YAML."""
+    registers = load_compiled(config_file)
+    if registers is None:
+        # Take the key before parsing so an edit during parsing marks it stale
+        source_key = get_source_key(config_file)
+        registers = parse_registers(config_file)
+        save_compiled(config_file, registers, source_key)
+    return registers
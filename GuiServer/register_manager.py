@@ -145,36 +145,46 @@ def get_value_text(address, value):
         return mapping["mapping"][value]
     return str(value)
 
-def load_state():
+def load_state(state_file=STATE_FILE):
     """Lädt den gespeicherten State aus der JSON-Datei."""
-    if not os.path.exists(STATE_FILE):
+    if not os.path.exists(state_file):
         return {
             "heat_pump_mode": 1,
             "registers": {},
             "last_accumulated_values": {}
         }
     
-    with open(STATE_FILE, 'r') as f:
+    with open(state_file, 'r') as f:
         return json.load(f)
 
-def save_state(state):
-    """Speichert den State in die JSON-Datei."""
-    with open(STATE_FILE, 'w') as f:
+def save_state(state, state_file=STATE_FILE):
+    """Speichert den State atomar (temporäre Datei, fsync, rename)."""
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, 'w') as f:
         json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, state_file)
 
-def update_register_value(state, address, value):
-    """Aktualisiert einen Register-Wert im State."""
+def update_register_value(state, address, value, journal=None):
+    """Aktualisiert einen Register-Wert im State (mit Journal ohne Neuschreiben der Datei)."""
     state["registers"][str(address)] = value
-    save_state(state)
+    if journal is not None:
+        journal.set_register(address, value)
+    else:
+        save_state(state)
 
 def get_register_value(state, address, default_value=None):
     """Holt einen Register-Wert aus dem State."""
     return state["registers"].get(str(address), default_value)
 
-def update_accumulated_value(state, address, value):
-    """Aktualisiert einen Akkumulator-Wert im State."""
+def update_accumulated_value(state, address, value, journal=None):
+    """Aktualisiert einen Akkumulator-Wert im State (mit Journal ohne Neuschreiben der Datei)."""
     state["last_accumulated_values"][str(address)] = value
-    save_state(state)
+    if journal is not None:
+        journal.set_accumulated(address, value)
+    else:
+        save_state(state)
 
 def get_accumulated_value(state, address, default_value=0):
     """Holt einen Akkumulator-Wert aus dem State."""
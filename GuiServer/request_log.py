@@ -0,0 +1,237 @@
+"""Persistentes Request-Log in rotierenden, komprimierten Binär-Segmenten.
+
+Der Event-Loop hängt nur kodierte Records an eine Warteschlange an; ein
+Hintergrund-Thread fasst sie zu Blöcken zusammen, komprimiert sie (zlib)
+und schreibt sie in Segmentdateien. Ist ein Segment voll, wird ein neues
+begonnen; überschreitet das Verzeichnis max_bytes, werden die ältesten
+Segmente gelöscht.
+
+Segment:  b"MBRL", Version (B), danach Blöcke
+Block:    Länge komprimiert (I), Anzahl Records (I), erste/letzte Zeit (d, d),
+          kleinste Start- und größte End-Adresse (H, H), zlib-Daten
+Record:   wie traffic_recorder.RECORD, Zeit jedoch absolut (µs seit Epoch)
+"""
+from collections import deque
+import glob
+import os
+import struct
+import threading
+import time
+import zlib
+
+from traffic_recorder import RECORD, Record, encode_request, pack_record
+
+SEGMENT_MAGIC = b"MBRL"
+SEGMENT_VERSION = 1
+SEGMENT_HEADER = struct.Struct("<4sB")
+BLOCK_HEADER = struct.Struct("<IIddHH")
+SEGMENT_PATTERN = "requests-*.mblog"
+
+REQUEST_LOG_SEGMENT_BYTES = 4 * 1024 * 1024
+REQUEST_LOG_MAX_BYTES = 64 * 1024 * 1024
+REQUEST_LOG_BATCH = 2000
+REQUEST_LOG_FLUSH_INTERVAL = 1.0
+REQUEST_LOG_QUEUE_SIZE = 200000
+
+
+class RequestLogWriter(threading.Thread):
+    """Hintergrund-Thread, der Request-Records blockweise komprimiert speichert."""
+
+    def __init__(self, directory, segment_bytes=REQUEST_LOG_SEGMENT_BYTES,
+                 max_bytes=REQUEST_LOG_MAX_BYTES, batch=REQUEST_LOG_BATCH,
+                 flush_interval=REQUEST_LOG_FLUSH_INTERVAL,
+                 queue_size=REQUEST_LOG_QUEUE_SIZE):
+        super().__init__(daemon=True, name="RequestLogWriter")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.batch = batch
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        # (unix time, first address, last address, packed record); appended
+        # by the event loop
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._file = None
+        self._segment_size = 0
+        self._segment_index = 0
+        self.records = 0
+        self.dropped = 0
+        self.blocks = 0
+        self.bytes_written = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, conn, pdu):
+        """Request protokollieren (Event-Loop, blockiert nie)."""
+        if len(self._pending) >= self.queue_size:
+            self.dropped += 1
+            return
+        now = time.time()
+        address, count, payload = encode_request(pdu)
+        self._pending.append((now, address, address + max(count, 1) - 1, pack_record(
+            now, conn, pdu.dev_id, pdu.function_code, address, count, payload)))
+        if len(self._pending) == self.batch:
+            self._wakeup.set()
+
+    def run(self):
+        """Blöcke schreiben, bis stop() aufgerufen wird."""
+        while not self._stop_event.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._write_pending()
+        self._write_pending()
+        self._close_segment()
+
+    def stop(self, timeout=5.0):
+        """Restliche Records schreiben und Thread beenden."""
+        self._stop_event.set()
+        self._wakeup.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    # Alias so the TCP server can close all request observers alike
+    close = stop
+
+    def _write_pending(self):
+        """Alle anstehenden Records in Blöcken zu je `batch` Records schreiben."""
+        pending = self._pending
+        while pending:
+            chunk = []
+            popleft = pending.popleft
+            while pending and len(chunk) < self.batch:
+                chunk.append(popleft())
+            self._write_block(chunk)
+        if self._file is not None:
+            self._file.flush()
+
+    def _write_block(self, chunk):
+        """Einen komprimierten Block schreiben, ggf. Segment rotieren."""
+        data = zlib.compress(b"".join(record for _, _, _, record in chunk), 6)
+        low = min(first for _, first, _, _ in chunk)
+        high = max(last for _, _, last, _ in chunk)
+        header = BLOCK_HEADER.pack(len(data), len(chunk), chunk[0][0], chunk[-1][0],
+                                   low & 0xFFFF, min(high, 0xFFFF))
+        if self._file is None or self._segment_size >= self.segment_bytes:
+            self._open_segment()
+        self._file.write(header)
+        self._file.write(data)
+        size = len(header) + len(data)
+        self._segment_size += size
+        self.bytes_written += size
+        self.records += len(chunk)
+        self.blocks += 1
+
+    def _open_segment(self):
+        """Neues Segment beginnen und den Plattenplatz begrenzen."""
+        self._close_segment()
+        self._segment_index += 1
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory,
+                            f"requests-{stamp}-{os.getpid()}-{self._segment_index:04d}.mblog")
+        self._file = open(path, 'wb')
+        self._file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION))
+        self._segment_size = SEGMENT_HEADER.size
+        self._enforce_limit(keep=path)
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _enforce_limit(self, keep):
+        """Älteste Segmente löschen, bis das Verzeichnis unter max_bytes liegt."""
+        segments = list_segments(self.directory)
+        total = sum(size for _, size in segments) + self.segment_bytes
+        for path, size in segments:
+            if total <= self.max_bytes or path == keep:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        """Zähler des Writers."""
+        return {
+            "records": self.records,
+            "pending": len(self._pending),
+            "dropped": self.dropped,
+            "blocks": self.blocks,
+            "bytes_written": self.bytes_written,
+        }
+
+
+def list_segments(directory):
+    """Segmente eines Verzeichnisses, älteste zuerst: [(Pfad, Größe)]."""
+    segments = []
+    for path in glob.glob(os.path.join(directory, SEGMENT_PATTERN)):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        segments.append((stat.st_mtime_ns, path, stat.st_size))
+    segments.sort()
+    return [(path, size) for _, path, size in segments]
+
+
+def iter_blocks(path):
+    """Blöcke eines Segments: (Blockheader-Tupel, komprimierte Daten)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < SEGMENT_HEADER.size:
+        return
+    magic, version = SEGMENT_HEADER.unpack_from(data, 0)
+    if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+        raise ValueError(f"{path} is not a request log segment")
+    offset = SEGMENT_HEADER.size
+    while offset + BLOCK_HEADER.size <= len(data):
+        header = BLOCK_HEADER.unpack_from(data, offset)
+        offset += BLOCK_HEADER.size
+        end = offset + header[0]
+        if end > len(data):
+            # Truncated last block (server killed while writing)
+            return
+        yield header, data[offset:end]
+        offset = end
+
+
+def decode_block(compressed):
+    """Records eines Blocks (Zeit als Unix-Zeit in Sekunden)."""
+    data = zlib.decompress(compressed)
+    records = []
+    offset = 0
+    unpack_from = RECORD.unpack_from
+    while offset + RECORD.size <= len(data):
+        time_us, conn, unit, function, address, count, words = unpack_from(data, offset)
+        offset += RECORD.size
+        payload = list(struct.unpack_from(f"<{words}H", data, offset)) if words else []
+        offset += 2 * words
+        records.append(Record(time_us / 1_000_000, conn, unit, function,
+                              address, count, payload))
+    return records
+
+
+def read_request_log(paths, since=None, until=None, address_range=None, functions=None):
+    """Gefilterte Records aus Segmenten; nicht passende Blöcke werden nicht entpackt."""
+    for path in paths:
+        for (_, _, first, last, low, high), compressed in iter_blocks(path):
+            if since is not None and last < since:
+                continue
+            if until is not None and first > until:
+                continue
+            if address_range is not None and (high < address_range[0] or low > address_range[1]):
+                continue
+            for record in decode_block(compressed):
+                if since is not None and record.time < since:
+                    continue
+                if until is not None and record.time > until:
+                    continue
+                if functions and record.function not in functions:
+                    continue
+                if address_range is not None:
+                    end = record.address + max(record.count, 1) - 1
+                    if end < address_range[0] or record.address > address_range[1]:
+                        continue
+                yield record
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Decoder für das binäre Request-Log (REQUEST_LOG_DIR).
+
+Beispiele:
+    python request_log_decode.py logs/
+    python request_log_decode.py logs/ --since "2025-03-13 08:00" --until "2025-03-13 09:00"
+    python request_log_decode.py logs/ --address 1000-1099 --function 3 --function 16
+    python request_log_decode.py logs/ --summary
+"""
+import argparse
+from collections import Counter
+from datetime import datetime
+import os
+import sys
+
+from request_log import list_segments, read_request_log
+from traffic_stats import FUNCTION_NAMES
+
+
+def parse_time(text):
+    """Zeitpunkt als Unix-Zeit: Sekunden oder ISO-Datum (YYYY-MM-DD[ HH:MM[:SS]])."""
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+def parse_address_range(text):
+    """'1004' oder '1000-1099' als (von, bis)."""
+    first, _, last = text.partition('-')
+    return int(first), int(last or first)
+
+
+def collect_paths(inputs):
+    """Segmentdateien aus Verzeichnissen und Dateinamen (Verzeichnisse: älteste zuerst)."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(path for path, _ in list_segments(item))
+        else:
+            paths.append(item)
+    return paths
+
+
+def format_record(record):
+    """Eine Textzeile pro Request."""
+    stamp = datetime.fromtimestamp(record.time).strftime('%Y-%m-%d %H:%M:%S.%f')
+    name = FUNCTION_NAMES.get(record.function, f"function_{record.function}")
+    line = (f"{stamp} conn={record.conn} unit={record.unit} {name} "
+            f"addr={record.address} count={record.count}")
+    if record.function == 23 and record.payload:
+        # Read range above, write address and words in the payload
+        line += f" write_addr={record.payload[0]} values={record.payload[1:]}"
+    elif record.payload:
+        line += f" values={record.payload}"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binäres Request-Log dekodieren")
+    parser.add_argument("inputs", nargs="+", help="Log-Verzeichnis oder Segmentdateien")
+    parser.add_argument("--since", type=parse_time, help="ab Zeitpunkt (Unix-Zeit oder ISO)")
+    parser.add_argument("--until", type=parse_time, help="bis Zeitpunkt (Unix-Zeit oder ISO)")
+    parser.add_argument("--address", type=parse_address_range,
+                        help="Adresse oder Bereich, z.B. 1004 oder 1000-1099")
+    parser.add_argument("--function", type=int, action="append",
+                        help="Funktionscode (mehrfach möglich)")
+    parser.add_argument("--summary", action="store_true",
+                        help="nur Anzahl pro (Unit, Funktion, Adresse, Anzahl) ausgeben")
+    args = parser.parse_args()
+
+    records = read_request_log(collect_paths(args.inputs), since=args.since,
+                               until=args.until, address_range=args.address,
+                               functions=set(args.function or ()))
+
+    if args.summary:
+        counts = Counter((r.unit, r.function, r.address, r.count) for r in records)
+        for (unit, function, address, count), requests in counts.most_common():
+            name = FUNCTION_NAMES.get(function, f"function_{function}")
+            print(f"{requests:10d}  unit={unit} {name} addr={address} count={count}")
+        return
+
+    write = sys.stdout.write
+    try:
+        for record in records:
+            write(format_record(record) + "\n")
+    except BrokenPipeError:
+        # e.g. piped into head
+        pass
+
+
+if __name__ == "__main__":
+    main()
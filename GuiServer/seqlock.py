@@ -0,0 +1,60 @@
+"""Sequenz-Lock für konsistente Lesezugriffe ohne Leser-Sperre.
+
+Schreiber erhöhen den Zähler vor und nach der Änderung (ungerade = Schreiben
+läuft) und sind untereinander per Lock serialisiert. Leser sperren nie:
+sie lesen den Zähler, kopieren die Daten und wiederholen den Versuch, falls
+sich der Zähler zwischendurch geändert hat.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Optimistic attempts before a reader queues behind the writers
+READ_RETRIES = 64
+
+
+class SeqLock:
+    """Versionszähler eines Register-Images (eine Instanz pro Gerät)."""
+
+    def __init__(self):
+        self._sequence = 0
+        self._write_lock = threading.RLock()
+        self._writer = None
+
+    @property
+    def version(self):
+        """Anzahl abgeschlossener Schreibvorgänge (ändert sich bei jedem Update)."""
+        return self._sequence >> 1
+
+    @contextmanager
+    def write(self):
+        """Schreibabschnitt; verschachtelte Abschnitte zählen als einer."""
+        with self._write_lock:
+            outer = not self._sequence & 1
+            if outer:
+                self._writer = threading.get_ident()
+                self._sequence += 1
+            try:
+                yield
+            finally:
+                if outer:
+                    self._sequence += 1
+                    self._writer = None
+
+    def read(self, reader):
+        """Führe reader() aus, bis das Ergebnis keinem Schreibvorgang überlappt."""
+        for _ in range(READ_RETRIES):
+            start = self._sequence
+            if start & 1:
+                if self._writer == threading.get_ident():
+                    # Read-your-writes inside a write section of this thread
+                    return reader()
+                # A writer in another thread is active: let it finish
+                time.sleep(0)
+                continue
+            result = reader()
+            if self._sequence == start:
+                return result
+        # Writers never pause: take the writer lock once so the reader progresses
+        with self._write_lock:
+            return reader()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""Headless-Betrieb des GUI-Servers (ohne Tk, z.B. in Containern und CI).
+
+Gleicher Funktionsumfang wie server_gui.py – WP-Modus-Filter, State mit
+Journal, Akkumulatoren, Hot Reload – gesteuert über Kommandozeile oder eine
+YAML-Konfigurationsdatei (Schlüssel wie die Optionen, z.B. `hp_mode: 2`).
+Kommandozeilen-Optionen haben Vorrang vor der Konfigurationsdatei.
+
+Mit --workers N laufen N Server-Prozesse auf demselben Port (SO_REUSEPORT)
+mit einem gemeinsamen Register-Image in Shared Memory. Worker 0 führt
+zusätzlich Simulation, Journal, Change-Feed und Steuer-API aus; Hot Reload
+und WP-Umschaltung im laufenden Betrieb gibt es in diesem Modus nicht.
+
+Beispiele:
+    python server_daemon.py --port 5020 --hp-mode 2
+    python server_daemon.py --workers 4 --no-watch
+    python server_daemon.py --config daemon.yaml --log - --log /var/log/lambda.log
+    python server_daemon.py --state-file none --log-types WRITE,ERROR
+"""
+import argparse
+import logging
+import multiprocessing
+import signal
+import sys
+import threading
+
+import yaml
+
+from server_threaded import (
+    MODBUS_SERVER_PORT, ModbusServerThread, RegisterFileWatcher, create_shared_image,
+    load_registers
+)
+from shared_image import SharedRegisterImage
+from log_buffer import LogRingBuffer, LOG_BUFFER_SIZE
+from register_manager import STATE_FILE, ACCUMULATOR_REGISTERS, filter_registers_for_mode
+from state_journal import StateJournal, recover_state
+
+LOG_POLL_INTERVAL = 0.2                 # seconds between two log buffer drains
+ACCUMULATOR_PERSIST_INTERVAL = 60.0     # seconds, like the GUI
+WORKER_STOP_TIMEOUT = 10.0              # seconds before a worker is killed
+
+DEFAULTS = {
+    "port": MODBUS_SERVER_PORT,
+    "hp_mode": None,                    # None = from the saved state
+    "registers": "registers.yaml",
+    "state_file": STATE_FILE,
+    "log": ["-"],
+    "log_types": None,
+    "sample_reads": 1,
+    "watch_registers": True,
+    "simulation": 0,
+    "simulation_speed": 1.0,
+    "request_log_dir": None,
+    "change_feed": None,
+    "control_api": None,
+    "workers": 1,
+}
+
+
+def parse_args(argv=None):
+    """Kommandozeile und Konfigurationsdatei zu einem Options-Dictionary zusammenführen."""
+    parser = argparse.ArgumentParser(description="Lambda Modbus-Simulator ohne GUI")
+    parser.add_argument("--config", help="YAML-Konfigurationsdatei")
+    parser.add_argument("--port", type=int, help=f"Modbus-TCP-Port (Standard {MODBUS_SERVER_PORT})")
+    parser.add_argument("--hp-mode", type=int, choices=(1, 2), help="1 WP oder 2 WP")
+    parser.add_argument("--registers", help="Register-Datei (Standard registers.yaml)")
+    parser.add_argument("--state-file",
+                        help=f"State-Datei mit Journal (Standard {STATE_FILE}, 'none' = keine)")
+    parser.add_argument("--log", action="append",
+                        help="Log-Ziel: '-' (stdout), 'stderr' oder Dateipfad; mehrfach möglich, "
+                             "'none' schaltet das Log ab")
+    parser.add_argument("--log-types", help="nur diese Typen, z.B. WRITE,ERROR")
+    parser.add_argument("--sample-reads", type=int, help="nur jeden N-ten READ protokollieren")
+    parser.add_argument("--no-watch", dest="watch_registers", action="store_const", const=False,
+                        help="registers.yaml nicht auf Änderungen überwachen")
+    parser.add_argument("--simulation", type=int, metavar="DEVICES",
+                        help="thermische Simulation mit N Geräten (Units 1..N)")
+    parser.add_argument("--simulation-speed", type=float, help="simulierte Sekunden pro Sekunde")
+    parser.add_argument("--request-log-dir", help="binäres Request-Log in dieses Verzeichnis")
+    parser.add_argument("--change-feed", help="Change-Feed: Unix-Socket-Pfad oder TCP-Port")
+    parser.add_argument("--control-api", type=int, help="Port der HTTP/JSON-Steuer-API")
+    parser.add_argument("--workers", type=int,
+                        help="Anzahl Server-Prozesse mit gemeinsamem Register-Image")
+    args = parser.parse_args(argv)
+
+    options = dict(DEFAULTS)
+    if args.config:
+        with open(args.config) as f:
+            config = yaml.safe_load(f) or {}
+        unknown = set(config) - set(DEFAULTS)
+        if unknown:
+            parser.error(f"unknown keys in {args.config}: {', '.join(sorted(unknown))}")
+        options.update(config)
+    options.update({key: value for key, value in vars(args).items()
+                    if key != "config" and value is not None})
+    if isinstance(options["log"], str):
+        options["log"] = [options["log"]]
+    if isinstance(options["log_types"], str):
+        options["log_types"] = options["log_types"].split(",")
+    if str(options["state_file"]).lower() == "none":
+        options["state_file"] = None
+    if options["workers"] < 1:
+        parser.error("--workers must be at least 1")
+    return options
+
+
+def setup_logging(sinks, worker=None):
+    """Logger mit einem Handler pro Ziel (Format wie server.py, ggf. mit Worker-Nummer)."""
+    name = "lambda_daemon" if worker is None else f"lambda_daemon.worker{worker}"
+    prefix = "" if worker is None else f"[worker {worker}] "
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    formatter = logging.Formatter(f'%(asctime)s [%(levelname)s] {prefix}%(message)s',
+                                  datefmt='%Y-%m-%d %H:%M:%S')
+    for sink in sinks:
+        if sink == "none":
+            continue
+        if sink == "-":
+            handler = logging.StreamHandler(sys.stdout)
+        elif sink == "stderr":
+            handler = logging.StreamHandler(sys.stderr)
+        else:
+            handler = logging.FileHandler(sink)
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    return logger
+
+
+class ServerDaemon:
+    """Server, Journal und Log-Ausgabe ohne GUI.
+
+    Als Worker (shared_image gesetzt) bedient die Instanz nur Modbus; Worker 0
+    ist der primäre Prozess mit Simulation, Journal, Change-Feed und Steuer-API.
+    """
+
+    def __init__(self, options, worker=None, shared_image=None):
+        if worker:
+            options = dict(options, state_file=None, change_feed=None, control_api=None,
+                           simulation=0)
+        self.options = options
+        self.worker = worker
+        self.shared_image = shared_image
+        self.logger = setup_logging(options["log"], worker)
+        self.log_types = set(options["log_types"]) if options["log_types"] else None
+        self.log_queue = LogRingBuffer(LOG_BUFFER_SIZE, {"READ": options["sample_reads"]})
+        self.reported_drops = 0
+        self.stop_event = threading.Event()
+        self.journal = None
+        self.server_thread = None
+        self.register_watcher = None
+
+        if options["state_file"]:
+            self.state, replayed = recover_state(options["state_file"])
+            self.journal = StateJournal(self.state, options["state_file"])
+            if replayed:
+                self.logger.info(f"State recovered: {replayed} journal entries replayed")
+        else:
+            self.state = {"heat_pump_mode": 1, "registers": {}, "last_accumulated_values": {}}
+        self.hp_mode = options["hp_mode"] or self.state.get("heat_pump_mode", 1)
+        self.registers = load_registers(options["registers"])
+
+    def start(self):
+        """Journal, Modbus-Server und Registerüberwachung starten."""
+        options = self.options
+        if self.journal is not None:
+            self.journal.start()
+            if self.hp_mode != self.state.get("heat_pump_mode"):
+                self.journal.set_mode(self.hp_mode)
+        filtered_registers = filter_registers_for_mode(self.registers, self.hp_mode)
+        # The parent applied the saved values to a shared image already
+        state_values = ({} if self.shared_image is not None else
+                        {int(addr): value for addr, value in self.state["registers"].items()})
+        self.server_thread = ModbusServerThread(
+            self.log_queue, filtered_registers, port=options["port"],
+            enable_simulation=bool(options["simulation"]),
+            simulated_devices=options["simulation"] or 1,
+            simulation_speed=options["simulation_speed"],
+            request_log_dir=options["request_log_dir"],
+            change_feed=options["change_feed"],
+            control_api=options["control_api"],
+            accumulator_values=self.load_accumulator_values(),
+            all_registers=self.registers, hp_mode=self.hp_mode,
+            state_values=state_values, shared_image=self.shared_image,
+            reuse_port=self.shared_image is not None,
+            # Worker 0 resets expired refresh datapoints for all workers
+            expire_refresh=not self.worker)
+        if self.journal is not None:
+            self.server_thread.add_change_listener(self.journal.on_change)
+        self.server_thread.start()
+        if not self.server_thread.wait_ready():
+            raise RuntimeError("Server did not start within 5 s")
+        self.logger.info(f"Server started on port {options['port']} with "
+                         f"{len(filtered_registers)} registers (WP mode: {self.hp_mode})")
+
+        if options["watch_registers"] and self.shared_image is None:
+            self.register_watcher = RegisterFileWatcher(
+                options["registers"], self.on_registers_file_changed, log_queue=self.log_queue)
+            self.register_watcher.start()
+
+    def run(self):
+        """Log ausgeben und Akkumulatoren sichern, bis stop() aufgerufen wird."""
+        since_persist = 0.0
+        while not self.stop_event.wait(LOG_POLL_INTERVAL):
+            self.write_log()
+            since_persist += LOG_POLL_INTERVAL
+            if since_persist >= ACCUMULATOR_PERSIST_INTERVAL:
+                self.persist_accumulators()
+                since_persist = 0.0
+        self.shutdown()
+
+    def stop(self, *_):
+        """Beenden anfordern (auch als Signal-Handler)."""
+        self.stop_event.set()
+
+    def shutdown(self):
+        """Akkumulatoren sichern, Server und Journal beenden."""
+        if self.register_watcher:
+            self.register_watcher.stop()
+        if self.server_thread:
+            self.persist_accumulators()
+            self.server_thread.stop()
+        if self.journal is not None:
+            if self.server_thread and self.server_thread.hp_mode != self.hp_mode:
+                # Switched through the control API
+                self.journal.set_mode(self.server_thread.hp_mode)
+            self.journal.stop()
+        self.write_log()
+        self.logger.info("Server stopped")
+
+    def on_registers_file_changed(self, registers):
+        """registers.yaml wurde geändert (läuft im Watcher-Thread)."""
+        self.registers = registers
+        self.server_thread.all_registers = registers
+        self.server_thread.reload_registers(
+            filter_registers_for_mode(registers, self.server_thread.hp_mode))
+
+    def load_accumulator_values(self):
+        """Gespeicherte 32-Bit-Zählerstände (High-/Low-Wort) aus dem State."""
+        values = {}
+        registers = self.state["registers"]
+        for addr in ACCUMULATOR_REGISTERS:
+            high = registers.get(str(addr))
+            low = registers.get(str(addr + 1))
+            if high is not None and low is not None:
+                values[addr] = (high << 16) | low
+        return values
+
+    def persist_accumulators(self):
+        """Aktuelle Zählerstände ins Journal schreiben."""
+        if self.journal is None or self.server_thread is None:
+            return
+        words = {}
+        for addr, value in self.server_thread.get_accumulator_values().items():
+            words[addr] = (value >> 16) & 0xFFFF
+            words[addr + 1] = value & 0xFFFF
+        if words:
+            self.journal.set_registers(words)
+
+    def write_log(self):
+        """Log-Puffer leeren und an die Log-Ziele weitergeben."""
+        for log_msg in self.log_queue.drain():
+            log_type = log_msg["type"]
+            if self.log_types is not None and log_type not in self.log_types:
+                continue
+            message = f"[{log_type}] Addr: {log_msg['address']}"
+            if log_msg.get("values"):
+                message += f", Val: {log_msg['values']}"
+            if log_msg.get("function"):
+                message += f" ({log_msg['function']})"
+            if log_type == "ERROR":
+                self.logger.error(message)
+            else:
+                self.logger.info(message)
+        dropped = self.log_queue.dropped
+        if dropped > self.reported_drops:
+            self.logger.warning(f"{dropped - self.reported_drops} log entries dropped "
+                                f"(buffer full, {dropped} in total)")
+            self.reported_drops = dropped
+
+
+def run_worker(options, worker, handle):
+    """Einstiegspunkt eines Worker-Prozesses (--workers)."""
+    shared_image = SharedRegisterImage.attach(handle)
+    daemon = ServerDaemon(options, worker, shared_image)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    try:
+        daemon.start()
+    except RuntimeError as e:
+        daemon.logger.error(str(e))
+        daemon.shutdown()
+        sys.exit(1)
+    try:
+        daemon.run()
+    finally:
+        shared_image.close()
+
+
+def run_workers(options):
+    """Gemeinsames Image anlegen, Worker starten und bis zum Signal überwachen."""
+    logger = setup_logging(options["log"])
+    if options["state_file"]:
+        state, _ = recover_state(options["state_file"])
+    else:
+        state = {"heat_pump_mode": 1, "registers": {}}
+    # All workers must serve the same mode
+    options = dict(options, hp_mode=options["hp_mode"] or state.get("heat_pump_mode", 1))
+    registers = filter_registers_for_mode(load_registers(options["registers"]),
+                                          options["hp_mode"])
+    image = create_shared_image(
+        registers, options["simulation"] or 1,
+        {int(addr): value for addr, value in state["registers"].items()})
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    processes = [multiprocessing.Process(target=run_worker, name=f"worker-{index}",
+                                         args=(options, index, image.handle()))
+                 for index in range(options["workers"])]
+    for process in processes:
+        process.start()
+    logger.info(f"{len(processes)} workers started on port {options['port']} "
+                f"(shared image: {image.segment_size(image.layout)} bytes)")
+
+    failed = False
+    while not stop_event.wait(LOG_POLL_INTERVAL):
+        exited = [process for process in processes if process.exitcode is not None]
+        if exited:
+            for process in exited:
+                logger.error(f"{process.name} exited with code {process.exitcode}")
+            failed = True
+            break
+    for process in processes:
+        if process.exitcode is None:
+            process.terminate()
+    for process in processes:
+        process.join(WORKER_STOP_TIMEOUT)
+        if process.exitcode is None:
+            logger.error(f"{process.name} did not stop, killing it")
+            process.kill()
+            process.join()
+    image.close()
+    logger.info("All workers stopped")
+    if failed:
+        sys.exit(1)
+
+
+def main(argv=None):
+    """Hauptfunktion."""
+    options = parse_args(argv)
+    if options["workers"] > 1:
+        run_workers(options)
+        return
+    daemon = ServerDaemon(options)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    try:
+        daemon.start()
+    except RuntimeError as e:
+        daemon.logger.error(str(e))
+        daemon.shutdown()
+        sys.exit(1)
+    daemon.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""Modbus-Server als eigener Prozess für die GUI.
+
+Tk, Journal und Akkumulator-Timer der GUI teilen sich so nicht mehr den GIL
+mit dem Server: GUI-Aktivität hat keinen Einfluss auf die Antwortzeiten.
+
+    Server-Prozess   ModbusServerThread, Registerüberwachung, veröffentlicht
+                     das Holding-Image von Unit 1 in Shared Memory
+    GUI-Prozess      liest Registerwerte direkt aus dem Shared Memory,
+                     erfährt Änderungen über den Change-Feed (Unix-Socket)
+
+Befehle der GUI (Registerwert setzen, WP-Modus, Statistiken) laufen über
+eine Pipe, Log-Einträge kommen gebündelt über eine zweite Pipe zurück.
+Der Server-Prozess wird per "spawn" gestartet, erbt also keinen Tk-Zustand;
+spawn importiert das Hauptmodul erneut, daher lädt server_gui.py Tk erst in main().
+"""
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+
+from log_buffer import LogRingBuffer, LOG_BUFFER_SIZE
+from shared_image import SharedRegisterImage
+from server_threaded import (
+    MODBUS_SERVER_PORT, ModbusServerThread, RegisterFileWatcher
+)
+from register_manager import filter_registers_for_mode
+
+# Published image: holding registers of unit 1, complete 16-bit address space
+PUBLISHED_IMAGE_WORDS = 65536
+LOG_FORWARD_INTERVAL = 0.2     # seconds between two log batches to the GUI
+COMMAND_TIMEOUT = 10.0         # seconds to wait for the server process
+START_TIMEOUT = 15.0           # spawn, imports and binding the port
+
+
+class ImageMirror:
+    """Hält das veröffentlichte Image mit dem Holding-Image einer Unit gleich.
+
+    Als Change-Listener übernimmt es jede Änderung einzeln; nach Umbauten
+    ohne ChangeEvents (Hot Reload, WP-Umschaltung) kopiert sync() das Image.
+    Virtuelle Akkumulatoren erscheinen mit ihren gespeicherten Wörtern.
+    """
+
+    def __init__(self, image, unit=1):
+        self.unit = unit
+        self.words = image.words(1, 'h')
+        self.seqlock = image.seqlock(1)
+
+    def sync(self, store):
+        """Komplettes Holding-Image übernehmen."""
+        words = store.capture_image()[0]['h'][:len(self.words)]
+        words += [0] * (len(self.words) - len(words))
+        with self.seqlock.write():
+            self.words[:] = words
+
+    def on_change(self, event):
+        """ChangeEvent-Listener des Servers."""
+        if event.unit != self.unit or event.table != 'h':
+            return
+        words = self.words
+        size = len(words)
+        with self.seqlock.write():
+            for address, _, new in event.changes:
+                if address < size:
+                    words[address] = new
+
+
+def _forward_logs(log_queue, connection, stop_event):
+    """Log-Einträge des Servers gebündelt an die GUI schicken."""
+    while not stop_event.wait(LOG_FORWARD_INTERVAL):
+        batch = log_queue.drain()
+        if batch or log_queue.dropped:
+            try:
+                # Blocks only this thread if the GUI is slow; the ring buffer drops
+                connection.send((batch, log_queue.dropped))
+            except (OSError, ValueError):
+                return
+
+
+def run_server_process(options, handle, commands, logs):
+    """Einstiegspunkt des Server-Prozesses."""
+    image = SharedRegisterImage.attach(handle)
+    mirror = ImageMirror(image)
+    log_queue = LogRingBuffer(LOG_BUFFER_SIZE, {"READ": options["sample_reads"]})
+    server = ModbusServerThread(
+        log_queue, filter_registers_for_mode(options["all_registers"], options["hp_mode"]),
+        port=options["port"], change_feed=options["feed_path"],
+        accumulator_values=options["accumulator_values"],
+        all_registers=options["all_registers"], hp_mode=options["hp_mode"],
+        state_values=options["state_values"])
+    server.add_change_listener(mirror.on_change)
+    server.start()
+    try:
+        if not server.wait_ready(START_TIMEOUT):
+            raise RuntimeError("Server did not start in time")
+    except RuntimeError as e:
+        commands.send(("error", str(e)))
+        server.stop()
+        image.close()
+        return
+    server.run_in_loop(mirror.sync, server.context[1])
+
+    def on_registers_file_changed(registers):
+        server.all_registers = registers
+        server.reload_registers(filter_registers_for_mode(registers, server.hp_mode))
+        server.run_in_loop(mirror.sync, server.context[1])
+
+    watcher = RegisterFileWatcher(options["registers_file"], on_registers_file_changed,
+                                  log_queue=log_queue)
+    watcher.start()
+    stop_event = threading.Event()
+    forwarder = threading.Thread(target=_forward_logs, args=(log_queue, logs, stop_event),
+                                 name="LogForwarder", daemon=True)
+    forwarder.start()
+
+    def set_heat_pump_mode(hp_mode):
+        server.set_heat_pump_mode(hp_mode)
+        server.run_in_loop(mirror.sync, server.context[1])
+        return len(server.registers)
+
+    handlers = {
+        "update_register_value": server.update_register_value,
+        "set_heat_pump_mode": set_heat_pump_mode,
+        "get_accumulator_values": server.get_accumulator_values,
+        "get_traffic_summary": server.get_traffic_summary,
+        "get_cache_stats": server.get_cache_stats,
+    }
+    commands.send(("ready", len(server.registers)))
+    try:
+        while True:
+            try:
+                method, args = commands.recv()
+            except EOFError:
+                # GUI process gone
+                break
+            if method == "stop":
+                break
+            try:
+                commands.send(("ok", handlers[method](*args)))
+            except Exception as e:
+                commands.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        watcher.stop()
+        server.stop()
+        stop_event.set()
+        forwarder.join()
+        # Last entries, e.g. the shutdown of the change feed
+        try:
+            logs.send((log_queue.drain(), log_queue.dropped))
+        except (OSError, ValueError):
+            pass
+        image.close()
+        try:
+            commands.send(("stopped", None))
+        except (OSError, ValueError):
+            pass
+
+
+class ServerProcess:
+    """GUI-seitiger Zugriff auf den Server-Prozess.
+
+    on_change(address, new) wird für jede Änderung eines Holding-Registers
+    von Unit 1 aufgerufen – im Feed-Thread, nicht im Tk-Thread.
+    """
+
+    def __init__(self, log_queue, all_registers, hp_mode, port=MODBUS_SERVER_PORT,
+                 accumulator_values=None, state_values=None, on_change=None,
+                 registers_file="registers.yaml", sample_reads=1):
+        self.log_queue = log_queue
+        self.on_change = on_change
+        self.registers_count = 0
+        self.feed_path = os.path.join(tempfile.gettempdir(),
+                                      f"lambda-gui-{os.getpid()}.sock")
+        self.options = {
+            "all_registers": all_registers,
+            "hp_mode": hp_mode,
+            "port": port,
+            "accumulator_values": accumulator_values or {},
+            "state_values": state_values or {},
+            "feed_path": self.feed_path,
+            "registers_file": registers_file,
+            "sample_reads": sample_reads,
+        }
+        self.context = multiprocessing.get_context("spawn")
+        self.image = None
+        self.process = None
+        self._commands = None
+        self._logs = None
+        self._command_lock = threading.Lock()
+        self._threads = []
+        self._feed_socket = None
+        self._reported_drops = 0
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        """Server-Prozess starten und warten, bis er lauscht (RuntimeError bei Fehlern)."""
+        self.image = SharedRegisterImage.create(
+            {'h': [0] * PUBLISHED_IMAGE_WORDS, 'i': [], 'c': [], 'd': []}, 1,
+            context=self.context)
+        self._seqlock = self.image.seqlock(1)
+        self._words = self.image.words(1, 'h')
+        self._commands, child_commands = self.context.Pipe()
+        self._logs, child_logs = self.context.Pipe(duplex=False)
+        self.process = self.context.Process(
+            target=run_server_process, name="ModbusServer", daemon=True,
+            args=(self.options, self.image.handle(), child_commands, child_logs))
+        self.process.start()
+        child_commands.close()
+        child_logs.close()
+
+        status, payload = self._receive(START_TIMEOUT)
+        if status != "ready":
+            self._cleanup()
+            raise RuntimeError(f"Server failed to start: {payload}")
+        self.registers_count = payload
+        for target, name in ((self._receive_logs, "LogReceiver"),
+                             (self._follow_changes, "ChangeFeedClient")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=COMMAND_TIMEOUT):
+        """Server-Prozess beenden und Shared Memory freigeben."""
+        if self.process is None:
+            return
+        try:
+            with self._command_lock:
+                self._commands.send(("stop", ()))
+                while self._receive(timeout)[0] != "stopped":
+                    pass
+        except (OSError, RuntimeError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        if self._feed_socket is not None:
+            try:
+                # The feed closes with the server; this only unblocks a stuck reader
+                self._feed_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._feed_socket.close()
+            self._feed_socket = None
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._cleanup()
+
+    def call(self, method, *args):
+        """Befehl im Server-Prozess ausführen und das Ergebnis liefern."""
+        if not self.running:
+            raise RuntimeError("server process not running")
+        with self._command_lock:
+            self._commands.send((method, args))
+            status, payload = self._receive(COMMAND_TIMEOUT)
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def read_register_values(self, address, count):
+        """Konsistente Momentaufnahme aus dem veröffentlichten Image."""
+        return self._seqlock.read(lambda: self._words[address:address + count])
+
+    def _receive(self, timeout):
+        if not self._commands.poll(timeout):
+            raise RuntimeError("server process does not answer")
+        return self._commands.recv()
+
+    def _receive_logs(self):
+        """Log-Bündel des Servers in den Log-Puffer der GUI übernehmen."""
+        while True:
+            try:
+                batch, dropped = self._logs.recv()
+            except (EOFError, OSError):
+                return
+            for log_msg in batch:
+                self.log_queue.put_nowait(log_msg)
+            if dropped > self._reported_drops:
+                self.log_queue.dropped += dropped - self._reported_drops
+                self._reported_drops = dropped
+
+    def _follow_changes(self):
+        """Change-Feed abonnieren (Holding-Register von Unit 1)."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.feed_path)
+        except OSError:
+            sock.close()
+            return
+        self._feed_socket = sock
+        sock.sendall(json.dumps({"units": [1], "tables": ["h"]}).encode() + b"\n")
+        with sock.makefile("rb") as stream:
+            try:
+                for line in stream:
+                    change = json.loads(line)
+                    if self.on_change is not None:
+                        self.on_change(change["address"], change["new"])
+            except (OSError, ValueError):
+                pass
+
+    def _cleanup(self):
+        for connection in (self._commands, self._logs):
+            if connection is not None:
+                connection.close()
+        self._commands = self._logs = None
+        if self.image is not None:
+            self.image.close()
+            self.image = None
+        self.process = None
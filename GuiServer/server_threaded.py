@@ -1,27 +1,312 @@
 """Threading-fähiger Modbus-Server mit GUI-Integration."""
+import asyncio
+import concurrent.futures
 import threading
+import time
 import queue
+import struct
 from datetime import datetime
-from pymodbus.server import StartTcpServer
 from pymodbus.datastore import ModbusServerContext
 from pymodbus.datastore import ModbusDeviceContext, ModbusSequentialDataBlock
 from pymodbus.exceptions import ModbusException
 from pymodbus.constants import ExcCodes
+from pymodbus.pdu import ExceptionResponse
+from pymodbus.pdu.register_message import (
+    ReadHoldingRegistersRequest, ReadHoldingRegistersResponse
+)
 
 import yaml
 import os
+from collections import namedtuple
+
+import register_cache
+from tcp_server import LambdaTcpServer
+from latency_profiles import PROFILES, build_profile
+from traffic_recorder import TrafficRecorder
+from request_log import RequestLogWriter, REQUEST_LOG_MAX_BYTES
+from refresh_timeout import REFRESH_TIMEOUT, RefreshScheduler, collect_refresh_defaults
+from accumulators import DEFAULT_ACCUMULATOR_RATE, AccumulatorBank, VirtualAccumulator
+from register_manager import ACCUMULATOR_REGISTERS
+from seqlock import SeqLock
+from log_buffer import log_accepts
+from traffic_stats import TrafficStats, TRAFFIC_TOP_N, format_summary
+from change_feed import ChangeFeedServer
+from control_api import ControlApiServer
+from checkpoint import RegisterCheckpoint, TABLES
+from shared_image import SharedDataBlock, SharedRegisterImage
+from bit_block import (
+    BIT_MODES, PACKED_BIT_PDUS, PackedBitBlock, build_bit_images, register_bits, unpack_bits
+)
+from access_mask import build_write_masks
+from register_manager import filter_registers_for_mode
+
+try:
+    # NumPy is only needed for the thermal simulation
+    import simulation
+except ImportError:
+    simulation = None
 
 MODBUS_SERVER_PORT = 5020
 
+# Response cache for hot FC 0x03 read ranges (opt-in)
+ENABLE_RESPONSE_CACHE = False
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+
+# Read back every register after building the initial image (slow, for debugging)
+SELF_CHECK = False
+
+# Connection handling like the real controller (None = unlimited / no timeout)
+MAX_CLIENTS = None       # Lambda: LAMBDA_MAX_CLIENTS (16)
+IDLE_TIMEOUT = None      # Lambda: LAMBDA_IDLE_TIMEOUT (60 s)
+
+# Response time / throughput emulation: None, a name from
+# latency_profiles.PROFILES (e.g. "lambda") or a profile dict
+EMULATION_PROFILE = None
+
+# Record every request to this file for traffic_replay.py (None = off)
+RECORD_TRAFFIC_FILE = None
+
+# Persistent binary request log (rotating compressed segments, None = off);
+# decode with request_log_decode.py
+REQUEST_LOG_DIR = None
+REQUEST_LOG_DISK_LIMIT = REQUEST_LOG_MAX_BYTES
+
+# Change feed for dashboards/test harnesses: Unix socket path or TCP port
+# on 127.0.0.1, e.g. "/tmp/lambda-changes.sock" or 5021 (None = off)
+CHANGE_FEED_ADDRESS = None
+
+# Local HTTP/JSON control API for test orchestration (port on 127.0.0.1,
+# None = off): bulk register get/set, WP mode switch, snapshots
+CONTROL_API_PORT = None
+
+# Seconds between two checks of a shared register image (worker processes,
+# see shared_image.py) for changes made by other workers
+SHARED_CHANGE_POLL_INTERVAL = 0.05
+
+# Per-(unit, function, range) request counters; the top ranges are written
+# to the log every TRAFFIC_SUMMARY_INTERVAL seconds (None = only on demand)
+ENABLE_TRAFFIC_STATS = True
+TRAFFIC_SUMMARY_INTERVAL = 60
+
+# Datapoints 00-49 written by a client fall back to their default after
+# this many seconds without a rewrite (None = keep values forever)
+REFRESH_TIMEOUT_SECONDS = REFRESH_TIMEOUT
+
+# Energy accumulators are computed on read: start value + rate * elapsed time
+ACCUMULATOR_RATE = DEFAULT_ACCUMULATOR_RATE   # counts per second
+
+# Thermal simulation of temperatures, power and states (requires numpy)
+ENABLE_SIMULATION = False
+SIMULATION_DEVICES = 1       # Simulated controllers, served as unit ids 1..N (max 247)
+SIMULATION_INTERVAL = 1.0    # Seconds between two simulation steps
+SIMULATION_SPEED = 1.0       # Simulated seconds per real second
+
+
+# Client writes are checked against the RO/RW flags of registers.yaml
+# (access_mask.py): undefined addresses answer exception code 2, RO
+# datapoints READ_ONLY_EXCEPTION. False = accept writes within the
+# +1000 buffer like before.
+ENFORCE_ACCESS = True
+READ_ONLY_EXCEPTION = ExcCodes.ILLEGAL_VALUE
+
+
+# Coil and discrete-input functions, validated against the per-table bit masks
+BIT_FUNCTION_CODES = frozenset((1, 2, 5, 15))
+
+# One aggregated change notification per write request or internal batch;
+# changes is a list of (address, old, new) for words that actually changed.
+ChangeEvent = namedtuple("ChangeEvent", "unit table changes timestamp")
+
+
+class ReadResponseCache:
+    """Cache für fertig kodierte FC-0x03-Antworten, Schlüssel (unit, address, count)."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = {}
+        # (unit, address) -> keys of all cached ranges covering that address
+        self._by_address = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self):
+        """Zähler, der bei jeder Invalidierung erhöht wird."""
+        return self._generation
+
+    def get(self, unit, address, count):
+        """Liefert (registers, payload, formatted) oder None."""
+        entry = self._entries.get((unit, address, count))
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, unit, address, count, registers, formatted, generation):
+        """Kodiert und speichert eine Antwort, sofern seit `generation` nichts geschrieben wurde."""
+        payload = struct.pack(f">B{count}H", count * 2, *registers)
+        entry = (registers, payload, formatted)
+        key = (unit, address, count)
+        with self._lock:
+            # A write between reading the values and storing them would
+            # otherwise leave a stale entry behind.
+            if generation != self._generation:
+                return entry
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                self._drop(next(iter(self._entries)))
+            self._entries[key] = entry
+            for addr in range(address, address + count):
+                self._by_address.setdefault((unit, addr), set()).add(key)
+        return entry
+
+    def invalidate(self, unit, address, count=1):
+        """Entfernt alle Einträge, die sich mit dem geschriebenen Bereich überschneiden."""
+        with self._lock:
+            self._generation += 1
+            for addr in range(address, address + count):
+                keys = self._by_address.get((unit, addr))
+                if keys:
+                    for key in list(keys):
+                        self._drop(key)
+                        self.invalidations += 1
+
+    def clear(self):
+        """Leert den Cache vollständig."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_address.clear()
+
+    def stats(self):
+        """Liefert die Zähler des Caches."""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+    def _drop(self, key):
+        """Entfernt einen Eintrag samt Adress-Index (Lock muss gehalten werden)."""
+        if self._entries.pop(key, None) is None:
+            return
+        unit, address, count = key
+        for addr in range(address, address + count):
+            keys = self._by_address.get((unit, addr))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_address[(unit, addr)]
+
+
+class CachedReadHoldingRegistersResponse(ReadHoldingRegistersResponse):
+    """FC-0x03-Antwort, die eine bereits kodierte Payload unverändert sendet."""
+
+    def __init__(self, payload=None, **kwargs):
+        super().__init__(**kwargs)
+        self.payload = payload
+
+    def encode(self):
+        """Kodiere die Antwort (aus dem Cache, falls vorhanden)."""
+        if self.payload is not None:
+            return self.payload
+        return super().encode()
+
+
+class CachedReadHoldingRegistersRequest(ReadHoldingRegistersRequest):
+    """FC-0x03-Anfrage, die Antworten über den ReadResponseCache des Kontexts bedient."""
+
+    async def update_datastore(self, context):
+        """Beantworte die Anfrage aus dem Cache oder lese und cache das Ergebnis."""
+        cache = getattr(context, 'response_cache', None)
+        if cache is None or self.function_code != 3:
+            return await super().update_datastore(context)
+        # Accumulators change continuously, never cache ranges containing them
+        accumulators = getattr(context, 'accumulators', None)
+        if accumulators is not None and accumulators.overlaps(self.address, self.count):
+            return await super().update_datastore(context)
+
+        unit = context.unit_id
+        entry = cache.get(unit, self.address, self.count)
+        if entry is None:
+            generation = cache.generation
+            values = await context.async_getValues(
+                self.function_code, self.address, self.count
+            )
+            if isinstance(values, ExcCodes):
+                return ExceptionResponse(self.function_code, values)
+            entry = cache.put(unit, self.address, self.count, list(values),
+                              context.format_values(values), generation)
+        elif context.log_queue is not None and log_accepts(context.log_queue, "READ"):
+            context.log_message("READ", self.address, self.count,
+                                entry[2], "read_holding_registers")
+
+        registers, payload, _ = entry
+        return CachedReadHoldingRegistersResponse(
+            payload=payload,
+            registers=registers,
+            dev_id=self.dev_id,
+            transaction_id=self.transaction_id,
+        )
+
 
 class LoggingSlaveContext(ModbusDeviceContext):
     """Modbus Slave Context mit Queue-basiertem Logging."""
     
-    def __init__(self, log_queue=None, valid_addresses=None, *args, **kwargs):
+    def __init__(self, log_queue=None, valid_addresses=None, *args,
+                 unit_id=1, response_cache=None, refresh_scheduler=None,
+                 refresh_defaults=None, accumulators=None, valid_bits=None,
+                 write_masks=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.log_queue = log_queue
         self._last_write_values = {}
         self.valid_addresses = valid_addresses or set()
+        # table ('c'/'d') -> PackedBits with a 1 for every defined bit
+        self.valid_bits = valid_bits or {}
+        # table ('h'/'c') -> PackedBits with a 1 for every RW word (empty = not enforced)
+        self.write_masks = write_masks or {}
+        self.unit_id = unit_id
+        self.response_cache = response_cache
+        self.refresh_scheduler = refresh_scheduler
+        # address -> default words of datapoints 00-49 (refresh timeout)
+        self.refresh_defaults = refresh_defaults or {}
+        # Virtual 32-bit accumulators (AccumulatorBank) of the holding table
+        self.accumulators = accumulators
+        # Counting rate of the accumulators; None = no virtual accumulators
+        self.accumulator_rate = None
+        # Multi-word updates are atomic for readers, readers never block each other
+        self.seqlock = SeqLock()
+        # Callbacks receiving a ChangeEvent per write request / bulk update
+        self.change_listeners = []
+
+    @property
+    def valid_addresses(self):
+        """Menge der gültigen Registeradressen."""
+        return self._valid_index[0]
+
+    @valid_addresses.setter
+    def valid_addresses(self, addresses):
+        """Tausche den Gültigkeitsindex (Menge + Grenzen) in einem Schritt aus."""
+        addresses = frozenset(addresses)
+        if addresses:
+            self._valid_index = (addresses, min(addresses), max(addresses))
+        else:
+            self._valid_index = (addresses, 0, 0)
+
+    @staticmethod
+    def format_values(values):
+        """Formatiere Registerwerte für das Log."""
+        formatted_values = []
+        for val in values:
+            if isinstance(val, (int, float)):
+                formatted_values.append(f"0x{val:04x} ({val})")
+            else:
+                formatted_values.append(str(val))
+        return formatted_values
         
     def log_message(self, msg_type, address, count, values=None, function=None):
         """Sende Log-Nachricht an GUI."""
@@ -35,23 +320,29 @@ class LoggingSlaveContext(ModbusDeviceContext):
                 "function": function
             }
             try:
-                self.log_queue.put(log_msg, timeout=0.1)
+                # Never block the server; a full queue drops the entry
+                self.log_queue.put_nowait(log_msg)
             except queue.Full:
                 pass
     
     def getValues(self, fx, address, count=1):
         """Lesen mit Logging."""
+        # One snapshot of the index, it may be swapped by a hot reload
+        valid_addresses, min_valid_addr, max_valid_addr = self._valid_index
+
         # Different validation for single vs batch reads
-        if count == 1:
+        if fx in BIT_FUNCTION_CODES:
+            error = self._check_bits(fx, address, count, "read")
+            if error is not None:
+                return error
+        elif count == 1:
             # Single register read - strict validation
-            if address not in self.valid_addresses:
+            if address not in valid_addresses:
                 self.log_message("ERROR", address, count, "Invalid single register address - Exception Code 2", f"read_function_{fx}")
                 return ExcCodes.ILLEGAL_ADDRESS
         else:
             # Batch read - less strict validation
             # Only validate if address is completely outside the valid range
-            min_valid_addr = min(self.valid_addresses) if self.valid_addresses else 0
-            max_valid_addr = max(self.valid_addresses) if self.valid_addresses else 0
 
             # Allow reading beyond valid addresses - just return zeros for undefined registers
             # Only throw exception for addresses that are completely out of range
@@ -59,7 +350,11 @@ class LoggingSlaveContext(ModbusDeviceContext):
                 self.log_message("ERROR", address, count, "Address completely out of range - Exception Code 2", f"read_function_{fx}")
                 return ExcCodes.ILLEGAL_ADDRESS
 
-        values = super().getValues(fx, address, count)
+        values = self.snapshot(fx, address, count)
+        if self.log_queue is None or not log_accepts(self.log_queue, "READ"):
+            # Skip formatting for reads that are not logged (sampling)
+            return values
+
         function_name = {
             1: "read_coils",
             2: "read_discrete_inputs",
@@ -68,52 +363,183 @@ class LoggingSlaveContext(ModbusDeviceContext):
         }.get(fx, f"unknown_function_{fx}")
 
         # Format values
-        formatted_values = []
-        for val in values:
-            if isinstance(val, (int, float)):
-                formatted_values.append(f"0x{val:04x} ({val})")
-            else:
-                formatted_values.append(str(val))
+        formatted_values = self.format_values(values)
 
         self.log_message("READ", address, count, formatted_values, function_name)
         return values
     
+    def _check_bits(self, fx, address, count, access):
+        """Alle Bits des Bereichs müssen in der Register-Map definiert sein (sonst Code 2)."""
+        valid = self.valid_bits.get(self.decode(fx))
+        if (valid is None or address < 0 or address + count > len(valid)
+                or valid.count_set(address, count) != count):
+            self.log_message("ERROR", address, count, "Undefined bit address - Exception Code 2",
+                             f"{access}_function_{fx}")
+            return ExcCodes.ILLEGAL_ADDRESS
+        return None
+
+    def _check_write(self, fx, address, count):
+        """Client-Schreibzugriff gegen die Schreibmaske prüfen.
+
+        Code 2 für nicht definierte Adressen, READ_ONLY_EXCEPTION für
+        RO-Datenpunkte; None, wenn alle Wörter beschreibbar sind.
+        """
+        table = self.decode(fx)
+        mask = self.write_masks.get(table)
+        if mask is None:
+            return None
+        if address >= 0 and address + count <= len(mask) and (
+                mask[address] if count == 1 else mask.all_set(address, count)):
+            return None
+
+        # Rejected: tell undefined addresses from RO datapoints
+        valid = self.valid_bits.get(table)
+        if valid is not None:
+            defined = (address >= 0 and address + count <= len(valid)
+                       and valid.count_set(address, count) == count)
+        else:
+            valid_addresses = self.valid_addresses
+            defined = all(addr in valid_addresses for addr in range(address, address + count))
+        if not defined:
+            self.log_message("ERROR", address, count, "Undefined address - Exception Code 2",
+                             f"write_function_{fx}")
+            return ExcCodes.ILLEGAL_ADDRESS
+        self.log_message("ERROR", address, count,
+                         f"Read-only datapoint - Exception Code {int(READ_ONLY_EXCEPTION)}",
+                         f"write_function_{fx}")
+        return READ_ONLY_EXCEPTION
+
+    def get_packed_bits(self, fx, address, count):
+        """FC 1/2: gepackte Bytes direkt aus dem Bitfeld.
+
+        Liefert None, wenn die Tabelle nicht gepackt ist (z.B. Shared Image),
+        bei ungültigen Adressen einen ExcCodes-Wert.
+        """
+        bits = self.store[self.decode(fx)].values
+        if not hasattr(bits, 'read_packed'):
+            return None
+        error = self._check_bits(fx, address, count, "read")
+        if error is not None:
+            return error
+        data = self.seqlock.read(lambda: bits.read_packed(address, count))
+        if self.log_queue is not None and log_accepts(self.log_queue, "READ"):
+            self.log_message("READ", address, count,
+                             self.format_values(unpack_bits(data, count)),
+                             "read_coils" if fx == 1 else "read_discrete_inputs")
+        return data
+
+    def set_packed_bits(self, fx, address, count, data):
+        """FC 15: empfangene Bytes direkt ins Bitfeld schreiben.
+
+        Liefert True, bei ungültigen Adressen einen ExcCodes-Wert und None,
+        wenn die Tabelle nicht gepackt ist.
+        """
+        table = self.decode(fx)
+        bits = self.store[table].values
+        if not hasattr(bits, 'write_packed'):
+            return None
+        error = self._check_write(fx, address, count) or self._check_bits(
+            fx, address, count, "write")
+        if error is not None:
+            return error
+        if self.log_queue is not None and log_accepts(self.log_queue, "WRITE"):
+            self.log_message("WRITE", address, count,
+                             self.format_values(unpack_bits(data, count)),
+                             "write_multiple_coils")
+        with self.seqlock.write():
+            if self.change_listeners:
+                old_values = bits[address:address + count]
+            bits.write_packed(address, count, data)
+        if self.change_listeners:
+            self._notify(table, [(address + offset, old, new) for offset, (old, new)
+                                 in enumerate(zip(old_values, unpack_bits(data, count)))
+                                 if old != new])
+        return True
+
+    @property
+    def version(self):
+        """Versionszähler des Images, ändert sich mit jedem Schreibvorgang."""
+        return self.seqlock.version
+
+    def snapshot(self, fx, address, count=1):
+        """Konsistente Kopie eines Bereichs (nie halb geschriebene Multi-Word-Werte)."""
+        return self.seqlock.read(lambda: self._read_block(fx, address, count))
+
+    def _read_block(self, fx, address, count):
+        """Werte ohne Prüfung und Logging lesen (inkl. virtueller Akkumulatoren)."""
+        values = ModbusDeviceContext.getValues(self, fx, address, count)
+        if self.accumulators is not None and self.decode(fx) == 'h':
+            values = self.accumulators.overlay(address, values)
+        return values
+
     def setValues(self, fx, address, values):
-        """Schreiben mit Logging."""
+        """Schreiben mit Logging (Modbus-Client, nur RW-Datenpunkte)."""
+        error = self._check_write(fx, address, len(values))
+        if error is not None:
+            return error
+        return self.write_values(fx, address, values, refresh=True)
+
+    def write_values(self, fx, address, values, refresh=False):
+        """Schreiben mit Logging; refresh=True startet den Refresh-Timeout neu."""
         # Check if the requested addresses are valid
         # Only validate if address is completely outside the valid range
-        min_valid_addr = min(self.valid_addresses) if self.valid_addresses else 0
-        max_valid_addr = max(self.valid_addresses) if self.valid_addresses else 0
+        _, min_valid_addr, max_valid_addr = self._valid_index
         
         # Allow writing beyond valid addresses - just ignore undefined registers
         # Only throw exception for addresses that are completely out of range
-        if address < min_valid_addr or address > max_valid_addr + 1000:  # Allow some buffer
+        if fx in BIT_FUNCTION_CODES:
+            error = self._check_bits(fx, address, len(values), "write")
+            if error is not None:
+                return error
+        elif address < min_valid_addr or address > max_valid_addr + 1000:  # Allow some buffer
             self.log_message("ERROR", address, len(values), "Address completely out of range - Exception Code 2", f"write_function_{fx}")
             return ExcCodes.ILLEGAL_ADDRESS
 
-        function_name = {
-            5: "write_single_coil",
-            6: "write_single_register",
-            15: "write_multiple_coils",
-            16: "write_multiple_registers"
-        }.get(fx, f"unknown_function_{fx}")
+        if self.log_queue is not None and log_accepts(self.log_queue, "WRITE"):
+            function_name = {
+                5: "write_single_coil",
+                6: "write_single_register",
+                15: "write_multiple_coils",
+                16: "write_multiple_registers"
+            }.get(fx, f"unknown_function_{fx}")
 
-        # Format values
-        formatted_values = []
-        for val in values:
-            if isinstance(val, (int, float)):
-                formatted_values.append(f"0x{val:04x} ({val})")
-            else:
-                formatted_values.append(str(val))
+            # Format values
+            formatted_values = self.format_values(values)
+
+            self.log_message("WRITE", address, len(values),
+                            formatted_values, function_name)
+
+        table = self.decode(fx)
+        accumulator_write = (self.accumulators is not None and table == 'h'
+                             and self.accumulators.overlaps(address, len(values)))
+        with self.seqlock.write():
+            if accumulator_write:
+                # Partial writes (one word only) keep the current other word
+                self.accumulators.sync(self.store['h'].values)
+            if self.change_listeners:
+                old_values = self.store[table].values[address:address + len(values)]
 
-        # Store previous value for comparison
-        old_value = self._last_write_values.get(address, None)
+            # Actual write
+            super().setValues(fx, address, values)
 
-        self.log_message("WRITE", address, len(values),
-                        formatted_values, function_name)
+            if accumulator_write:
+                self.accumulators.rebase_from(self.store['h'].values, address, len(values))
 
-        # Actual write
-        super().setValues(fx, address, values)
+            # Drop cached read responses overlapping the written range
+            if self.response_cache is not None and self.decode(fx) == 'h':
+                self.response_cache.invalidate(self.unit_id, address, len(values))
+
+            # Client writes to datapoints 00-49 must be repeated within the timeout;
+            # inside the write section so an expiry (other worker) cannot interleave
+            if refresh and self.refresh_scheduler is not None and table == 'h':
+                for addr in range(address, address + len(values)):
+                    if addr in self.refresh_defaults:
+                        self.refresh_scheduler.touch((self.unit_id, addr))
+
+        if self.change_listeners:
+            new_values = self.store[table].values[address:address + len(values)]
+            self._notify(table, [(address + offset, old, new) for offset, (old, new)
+                                 in enumerate(zip(old_values, new_values)) if old != new])
 
         # Store new value
         if len(values) > 0:
@@ -121,38 +547,485 @@ class LoggingSlaveContext(ModbusDeviceContext):
     
     def update_register(self, address, value):
         """Live-Update eines Registers (für GUI)."""
-        self.setValues(3, address, [value])
+        self.bulk_update([(address, [value])])
+
+    def update_registers(self, address, values):
+        """Atomares Live-Update mehrerer Register, z.B. High- und Low-Wort (für GUI)."""
+        self.bulk_update([(address, list(values))])
+
+    def bulk_update(self, runs, table='h'):
+        """Interner Schreibpfad: Läufe [(Adresse, Wörter)] direkt in den Datenblock.
+
+        Ohne Request-Validierung, Formatierung und Logging pro Register; für
+        GUI-Änderungen und periodische Massen-Updates (Simulation). Die Adressen
+        müssen im Image liegen. Alle Läufe werden atomar geschrieben und
+        erzeugen höchstens ein ChangeEvent. Liefert die Anzahl geänderter Wörter.
+        """
+        values = self.store[table].values
+        cache = self.response_cache if table == 'h' else None
+        accumulators = self.accumulators if table == 'h' else None
+        changes = [] if self.change_listeners else None
+        changed = 0
+        with self.seqlock.write():
+            for address, words in runs:
+                end = address + len(words)
+                accumulator_write = accumulators is not None and accumulators.overlaps(
+                    address, len(words))
+                if accumulator_write:
+                    accumulators.sync(values)
+                old_values = values[address:end]
+                if old_values == words:
+                    continue
+                values[address:end] = words
+                changed += len(words)
+                if changes is not None:
+                    changes.extend((address + offset, old, new) for offset, (old, new)
+                                   in enumerate(zip(old_values, words)) if old != new)
+                if accumulator_write:
+                    accumulators.rebase_from(values, address, len(words))
+                if cache is not None:
+                    cache.invalidate(self.unit_id, address, len(words))
+        if changes:
+            self._notify(table, changes)
+        return changed
+
+    def capture_image(self):
+        """Kopie aller Tabellen und Akkumulator-Stände (für Checkpoints)."""
+        def copy():
+            return ({table: list(self.store[table].values) for table in TABLES},
+                    self.accumulators.values() if self.accumulators is not None else {})
+        return self.seqlock.read(copy)
+
+    def restore_image(self, tables, accumulator_values):
+        """Tabellen per Slice-Zuweisung zurückspielen, Akkumulatoren neu aufsetzen.
+
+        Die Tabellen müssen so lang sein wie die aktuellen (restore_checkpoint
+        prüft das vorher). Offene Refresh-Timeouts der Unit verfallen, der
+        Response-Cache wird geleert. Listener erhalten die geänderten Wörter
+        als ein ChangeEvent pro Tabelle.
+        """
+        events = []
+        with self.seqlock.write():
+            for table, words in tables.items():
+                values = self.store[table].values
+                if self.change_listeners:
+                    events.append((table, changed_words(values, words)))
+                values[:] = words
+            if self.accumulators is not None:
+                now = time.monotonic()
+                for address, value in accumulator_values.items():
+                    if address in self.accumulators:
+                        self.accumulators[address].rebase(value, now)
+            if self.refresh_scheduler is not None:
+                for address in self.refresh_defaults:
+                    self.refresh_scheduler.discard((self.unit_id, address))
+            if self.response_cache is not None:
+                self.response_cache.clear()
+        for table, changes in events:
+            self._notify(table, changes)
+
+    def _notify(self, table, changes):
+        """Ein aggregiertes ChangeEvent an alle Listener."""
+        if not changes:
+            return
+        event = ChangeEvent(self.unit_id, table, changes, time.time())
+        for listener in list(self.change_listeners):
+            listener(event)
+
+    def expire_refresh_value(self, address):
+        """Setze einen nicht rechtzeitig aktualisierten Datenpunkt auf den Default."""
+        default = self.refresh_defaults.get(address)
+        if default is None:
+            return
+        with self.seqlock.write():
+            if not self.refresh_scheduler.confirm_expired((self.unit_id, address)):
+                return
+            old = super().getValues(3, address, len(default))
+            self.write_values(3, address, default)
+        self.log_message("EXPIRED", address, len(default),
+                         f"Not refreshed within {self.refresh_scheduler.timeout:.0f}s: "
+                         f"{old} -> default {default}", "refresh_timeout")
+
+    def apply_register_diff(self, diff, valid_addresses, refresh_defaults=None,
+                            write_masks=None):
+        """Wende einen Register-Diff auf den laufenden Datastore an.
+
+        Muss zwischen zwei Requests laufen (im Event-Loop des Servers).
+        Werte unveränderter Register bleiben erhalten, ebenso die von Registern,
+        bei denen sich nur der Zugriff (RO/RW) geändert hat.
+        """
+        with self.seqlock.write():
+            tables = {'holding': 'h', 'input': 'i', **BIT_MODES}
+            added, removed, changed = diff
+            # Access-only changes just swap the write mask below
+            changed = [(old, new) for old, new in changed if value_changed(old, new)]
+
+            # Clear the words of removed registers and the old layout of changed ones
+            for reg in removed + [old for old, _ in changed]:
+                block = self.store.get(tables.get(reg['mode']))
+                if block is None:
+                    continue
+                addr = reg['address']
+                end = min(addr + len(register_words(reg)), len(block.values))
+                if end > addr:
+                    block.values[addr:end] = [0] * (end - addr)
+                    valid = self.valid_bits.get(tables[reg['mode']])
+                    if valid is not None:
+                        valid.fill(addr, end - addr, 0)
+
+            for reg in added + [new for _, new in changed]:
+                block = self.store.get(tables.get(reg['mode']))
+                if block is None:
+                    continue
+                addr = reg['address']
+                words = register_words(reg)
+                # Grow the dense image if the register lies beyond its end
+                missing = addr + len(words) + 1 - len(block.values)
+                if missing > 0:
+                    block.values.extend([0] * missing)
+                block.values[addr:addr + len(words)] = words
+                valid = self.valid_bits.get(tables[reg['mode']])
+                if valid is not None:
+                    if addr + len(words) + 1 > len(valid):
+                        valid.extend([0] * (addr + len(words) + 1 - len(valid)))
+                    valid.fill(addr, len(words), 1)
+                if self.accumulators is not None and reg['mode'] == 'holding':
+                    self.accumulators.rebase_from(block.values, addr, len(words))
+
+            if self.accumulator_rate is not None and valid_addresses != self.valid_addresses:
+                self._rebuild_accumulators(valid_addresses)
+            self.valid_addresses = valid_addresses
+            if write_masks is not None:
+                self.write_masks = write_masks
+            if refresh_defaults is not None:
+                if self.refresh_scheduler is not None:
+                    for addr in set(self.refresh_defaults) - set(refresh_defaults):
+                        self.refresh_scheduler.discard((self.unit_id, addr))
+                self.refresh_defaults = refresh_defaults
+            if self.response_cache is not None:
+                self.response_cache.clear()
+
+
+    def _rebuild_accumulators(self, valid_addresses):
+        """Akkumulatoren an eine neue Register-Map anpassen (z.B. WP-Umschaltung).
+
+        Weiterhin vorhandene Zähler zählen ohne Sprung mit ihrer Rate weiter,
+        neue starten beim Wert im Image, entfernte fallen weg.
+        """
+        old = self.accumulators
+        current = old.values() if old is not None else {}
+        bank = build_accumulators(self.store['h'].values, valid_addresses, current,
+                                  self.accumulator_rate)
+        if bank is not None and old is not None:
+            for address, acc in old.accumulators.items():
+                if address in bank:
+                    bank[address].rate = acc.rate
+        self.accumulators = bank
 
 
 class ModbusServerThread(threading.Thread):
     """Thread für Modbus-Server."""
     
-    def __init__(self, log_queue, registers, port=5020):
+    def __init__(self, log_queue, registers, port=5020,
+                 response_cache=ENABLE_RESPONSE_CACHE, self_check=SELF_CHECK,
+                 max_clients=MAX_CLIENTS, idle_timeout=IDLE_TIMEOUT,
+                 emulation_profile=EMULATION_PROFILE,
+                 record_file=RECORD_TRAFFIC_FILE,
+                 refresh_timeout=REFRESH_TIMEOUT_SECONDS,
+                 enable_simulation=ENABLE_SIMULATION, simulated_devices=SIMULATION_DEVICES,
+                 simulation_interval=SIMULATION_INTERVAL,
+                 simulation_speed=SIMULATION_SPEED,
+                 accumulator_values=None, accumulator_rate=ACCUMULATOR_RATE,
+                 traffic_stats=ENABLE_TRAFFIC_STATS,
+                 traffic_summary_interval=TRAFFIC_SUMMARY_INTERVAL,
+                 request_log_dir=REQUEST_LOG_DIR,
+                 request_log_limit=REQUEST_LOG_DISK_LIMIT,
+                 change_feed=CHANGE_FEED_ADDRESS,
+                 control_api=CONTROL_API_PORT, all_registers=None, hp_mode=None,
+                 state_values=None, shared_image=None, reuse_port=False,
+                 enforce_access=ENFORCE_ACCESS, expire_refresh=True):
         super().__init__(daemon=True)
         self.log_queue = log_queue
         self.registers = registers
         self.port = port
+        self.self_check = self_check
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        if isinstance(emulation_profile, str):
+            emulation_profile = PROFILES[emulation_profile]
+        self.emulation_profile = build_profile(emulation_profile)
+        self.record_file = record_file
+        self.recorder = None
         self.running = False
+        self.ready = threading.Event()
+        self.error = None
         self.context = None
+        self.loop = None
+        self._stopping = None
+        self.server = None
+        # SharedRegisterImage of several worker processes (None = own image)
+        self.shared_image = shared_image
+        self.reuse_port = reuse_port
+        # A per-process cache would miss writes of the other workers
+        self.response_cache = (ReadResponseCache() if response_cache and shared_image is None
+                               else None)
+        if not refresh_timeout:
+            self.refresh_scheduler = None
+        elif shared_image is not None:
+            # Deadlines of all workers in the shared segment
+            self.refresh_scheduler = shared_image.refresh_scheduler(refresh_timeout)
+        else:
+            self.refresh_scheduler = RefreshScheduler(refresh_timeout)
+        # False: only record client refreshes, another worker resets expired values
+        self.expire_refresh = expire_refresh
+        self.enforce_access = enforce_access
+        if enable_simulation and simulation is None:
+            raise RuntimeError("The thermal simulation requires numpy (pip install numpy)")
+        if enable_simulation and not 1 <= simulated_devices <= 247:
+            raise ValueError("simulated_devices must be 1..247 (Modbus unit ids)")
+        self.simulation_enabled = bool(enable_simulation)
+        self.units = simulated_devices if enable_simulation else 1
+        if shared_image is not None:
+            self.units = shared_image.units
+        self.simulation_interval = simulation_interval
+        self.simulation_speed = simulation_speed
+        self.simulation = None
+        self.simulation_binding = None
+        self.simulation_tick_time = 0.0
+        # Start values of the accumulators of unit 1 (e.g. from the saved state)
+        self.accumulator_values = accumulator_values or {}
+        # Saved register values of unit 1 (address -> word), applied before serving
+        self.state_values = state_values or {}
+        self.accumulator_rate = accumulator_rate
+        # Shared by the stores of all units
+        self.change_listeners = []
+        self.traffic_stats = TrafficStats() if traffic_stats else None
+        self.traffic_summary_interval = traffic_summary_interval
+        self.request_log_dir = request_log_dir
+        self.request_log_limit = request_log_limit
+        self.request_log = None
+        self.change_feed_address = change_feed
+        self.change_feed = None
+        self.control_api_port = control_api
+        self.control_api = None
+        # Complete register list and current WP mode, for mode switches
+        self.all_registers = all_registers
+        self.hp_mode = hp_mode
         
     def run(self):
         """Starte den Modbus-Server."""
         self.running = True
         try:
-            context = setup_modbus_server(self.registers, self.log_queue)
+            context = setup_modbus_server(self.registers, self.log_queue,
+                                          response_cache=self.response_cache,
+                                          self_check=self.self_check,
+                                          refresh_scheduler=self.refresh_scheduler,
+                                          units=self.units,
+                                          accumulator_values=self.accumulator_values,
+                                          accumulator_rate=self.accumulator_rate,
+                                          shared_image=self.shared_image,
+                                          enforce_access=self.enforce_access)
+            if self.state_values:
+                store = context[1]
+                valid = store.valid_addresses
+                store.bulk_update([(address, [value & 0xFFFF]) for address, value
+                                   in sorted(self.state_values.items()) if address in valid])
+            if self.shared_image is None:
+                for unit in range(1, self.units + 1):
+                    context[unit].change_listeners = self.change_listeners
             self.context = context
-            
-            StartTcpServer(
-                context=context,
-                address=("0.0.0.0", self.port)
-            )
+            if self.control_api_port is not None:
+                self.control_api = ControlApiServer(self, self.control_api_port)
+                self.control_api.start()
+            asyncio.run(self._serve(context))
         except Exception as e:
+            self.error = e
             if self.log_queue:
                 self.log_message("ERROR", 0, 0, f"Server error: {e}")
+        finally:
+            self.running = False
+            # Also wakes wait_ready() after a failed start
+            self.ready.set()
+
+    async def _serve(self, context):
+        """Server im eigenen Event-Loop (für Hot Reload zwischen Requests)."""
+        self.loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        # FC 1/2/15 work on the packed bit fields directly
+        custom_pdu = list(PACKED_BIT_PDUS)
+        if self.response_cache is not None:
+            custom_pdu.append(CachedReadHoldingRegistersRequest)
+        if self.record_file:
+            self.recorder = TrafficRecorder(self.record_file)
+        if self.request_log_dir:
+            self.request_log = RequestLogWriter(self.request_log_dir,
+                                                max_bytes=self.request_log_limit)
+            self.request_log.start()
+        self.server = LambdaTcpServer(
+            context,
+            address=("0.0.0.0", self.port),
+            custom_pdu=custom_pdu,
+            max_clients=self.max_clients,
+            idle_timeout=self.idle_timeout,
+            emulation_profile=self.emulation_profile,
+            recorder=self.recorder,
+            traffic_stats=self.traffic_stats,
+            request_log=self.request_log,
+            log_message=self.log_message,
+            reuse_port=self.reuse_port
+        )
+        try:
+            # Raises if the port cannot be bound
+            await self.server.serve_forever(background=True)
+            if self.change_feed_address is not None:
+                self.change_feed = ChangeFeedServer(self.change_feed_address,
+                                                    log_message=self.log_message)
+                await self.change_feed.start()
+                self.add_change_listener(self.change_feed.on_change)
+            tasks = []
+            if self.refresh_scheduler is not None and self.expire_refresh:
+                tasks.append(self.loop.create_task(self._expire_refresh_values()))
+            if self.simulation_enabled:
+                tasks.append(self.loop.create_task(self._run_simulation()))
+            if self.traffic_stats is not None and self.traffic_summary_interval:
+                tasks.append(self.loop.create_task(self._log_traffic_summary()))
+            if self.shared_image is not None and self.change_listeners:
+                tasks.append(self.loop.create_task(self._poll_shared_changes()))
+            self.ready.set()
+            if not self.running:
+                # stop() was called before the loop existed
+                self._stopping.set()
+            await self._stopping.wait()
+            for task in tasks:
+                task.cancel()
+        finally:
+            if self.change_feed is not None:
+                self.change_feed.close()
+                self.remove_change_listener(self.change_feed.on_change)
+            # Closes the listening socket, client connections, recorder and request log
+            await self.server.shutdown()
+
+    async def _log_traffic_summary(self):
+        """Schreibe periodisch die meistgenutzten Adressbereiche ins Log."""
+        interval = self.traffic_summary_interval
+        while True:
+            await asyncio.sleep(interval)
+            lines = format_summary(self.traffic_stats.summary(period=interval))
+            if lines:
+                self.log_message("TRAFFIC", 0, len(lines),
+                                 f"Top ranges (last {interval}s): " + "; ".join(lines))
+
+    async def _poll_shared_changes(self):
+        """ChangeEvents für ein gemeinsames Image, auch für Schreibzugriffe anderer Worker.
+
+        Die Stores melden Änderungen im Shared-Modus nicht selbst; stattdessen
+        wird der Versionszähler jeder Unit geprüft und bei einer Änderung das
+        Image gegen eine eigene Kopie verglichen.
+        """
+        stores = {unit: self.context[unit] for unit in range(1, self.units + 1)}
+        versions, shadows = {}, {}
+        for unit, store in stores.items():
+            versions[unit] = store.version
+            shadows[unit] = store.capture_image()[0]
+        while True:
+            await asyncio.sleep(SHARED_CHANGE_POLL_INTERVAL)
+            for unit, store in stores.items():
+                version = store.version
+                if version == versions[unit]:
+                    continue
+                versions[unit] = version
+                tables = store.capture_image()[0]
+                now = time.time()
+                for table in TABLES:
+                    changes = changed_words(shadows[unit][table], tables[table])
+                    if changes:
+                        event = ChangeEvent(unit, table, changes, now)
+                        for listener in list(self.change_listeners):
+                            listener(event)
+                shadows[unit] = tables
+
+    async def _run_simulation(self):
+        """Simuliere alle Geräte gemeinsam und schreibe die Ergebnisse in die Images."""
+        stores = [self.context[unit] for unit in range(1, self.units + 1)]
+        images = [store.store['h'].values for store in stores]
+        bound = stores[0].valid_addresses
+        binding = simulation.RegisterBinding(bound)
+        sim = simulation.ThermalSimulation(self.units, groups=binding.groups)
+        sim.load_state(binding.read_state(images))
+        self.simulation, self.simulation_binding = sim, binding
+
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(self.simulation_interval)
+            if stores[0].valid_addresses is not bound:
+                # Hot reload or WP mode switch: drive only the current registers,
+                # new ones start from their values in the image
+                bound = stores[0].valid_addresses
+                binding = simulation.RegisterBinding(bound)
+                sim.load_state(binding.read_state(images))
+                self.simulation_binding = binding
+            now = time.monotonic()
+            sim.step((now - last) * self.simulation_speed, **binding.read_inputs(images))
+            last = now
+            words = binding.encode(sim).tolist()
+            for store, row in zip(stores, words):
+                store.bulk_update(binding.runs_for(row))
+            self._update_accumulator_rates(stores, sim, now)
+            self.simulation_tick_time = time.monotonic() - now
+
+    def _update_accumulator_rates(self, stores, sim, now):
+        """Energiezähler (Wh) folgen der simulierten elektrischen/thermischen Leistung."""
+        scale = self.simulation_speed / 3600.0
+        electric = (sim.hp_electric * scale).tolist()
+        thermal = (sim.hp_power * scale).tolist()
+        for store, electric_row, thermal_row in zip(stores, electric, thermal):
+            bank = store.accumulators
+            if bank is None:
+                continue
+            # Start value, start time and rate change together (shared image: other workers)
+            with store.seqlock.write():
+                for group in range(sim.groups):
+                    base = 1000 + 100 * group
+                    if base + 20 in bank:
+                        bank[base + 20].set_rate(electric_row[group], now)
+                    if base + 22 in bank:
+                        bank[base + 22].set_rate(thermal_row[group], now)
+
+    async def _expire_refresh_values(self):
+        """Ein Timer für alle Refresh-Datenpunkte: Abgelaufene auf Default setzen."""
+        interval = min(1.0, self.refresh_scheduler.timeout / 4)
+        while True:
+            await asyncio.sleep(interval)
+            for unit, address in self.refresh_scheduler.pop_expired():
+                self.context[unit].expire_refresh_value(address)
         
-    def stop(self):
-        """Stoppe den Server."""
+    def stop(self, timeout=5.0):
+        """Stoppe den Server: Port freigeben, Verbindungen trennen, Tasks beenden.
+
+        Kehrt zurück, wenn der Thread beendet ist; ein neuer Server kann den
+        Port sofort wieder binden.
+        """
         self.running = False
+        if self.control_api is not None:
+            self.control_api.stop()
+            self.control_api = None
+        loop, stopping = self.loop, self._stopping
+        if loop is not None and stopping is not None:
+            try:
+                loop.call_soon_threadsafe(stopping.set)
+            except RuntimeError:
+                # Loop already closed
+                pass
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    def wait_ready(self, timeout=5.0):
+        """Warte, bis der Server lauscht (False bei Timeout, RuntimeError bei Startfehler)."""
+        if not self.ready.wait(timeout):
+            return False
+        if self.error is not None:
+            raise RuntimeError(f"Server failed to start: {self.error}")
+        return True
         
     def log_message(self, msg_type, address, count, values=None, function=None):
         """Log-Nachricht senden."""
@@ -166,7 +1039,8 @@ class ModbusServerThread(threading.Thread):
                 "function": function
             }
             try:
-                self.log_queue.put(log_msg, timeout=0.1)
+                # Never block the server; a full queue drops the entry
+                self.log_queue.put_nowait(log_msg)
             except queue.Full:
                 pass
     
@@ -178,112 +1052,490 @@ class ModbusServerThread(threading.Thread):
             if hasattr(slaves, 'update_register'):
                 slaves.update_register(address, value)
 
+    def add_change_listener(self, listener):
+        """Registriere einen Callback für ChangeEvents aller Units.
+
+        Der Callback läuft im schreibenden Thread (meist im Event-Loop des
+        Servers) und muss schnell zurückkehren.
+        """
+        self.change_listeners.append(listener)
+
+    def remove_change_listener(self, listener):
+        """Entferne einen mit add_change_listener registrierten Callback."""
+        if listener in self.change_listeners:
+            self.change_listeners.remove(listener)
+
+    def update_register_values(self, address, values):
+        """Atomares Update mehrerer Register von außen (z.B. 32-Bit High/Low)."""
+        if self.context:
+            self.context[1].update_registers(address, values)
+
+    def read_register_values(self, address, count):
+        """Konsistente Momentaufnahme von Holding-Registern (Unit 1)."""
+        if not self.context:
+            return None
+        return self.context[1].snapshot(3, address, count)
+
+    def run_in_loop(self, func, *args, timeout=5.0):
+        """Führe func im Event-Loop des Servers aus (zwischen zwei Requests) und warte."""
+        if self.loop is None:
+            return func(*args)
+        future = concurrent.futures.Future()
+
+        def call():
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        self.loop.call_soon_threadsafe(call)
+        return future.result(timeout)
+
+    def read_registers(self, unit, address, count):
+        """Konsistente Momentaufnahme von Holding-Registern einer Unit."""
+        store = self._store(unit)
+        if address < 0 or address + count > len(store.store['h'].values):
+            raise ValueError(f"range {address}+{count} outside the register image")
+        return store.snapshot(3, address, count)
+
+    def write_registers(self, writes):
+        """Massen-Update {unit: [(Adresse, Wörter)]}, atomar zwischen zwei Requests.
+
+        Liefert die Anzahl geänderter Wörter.
+        """
+        for unit, runs in writes.items():
+            size = len(self._store(unit).store['h'].values)
+            for address, words in runs:
+                if address < 0 or address + len(words) > size:
+                    raise ValueError(f"range {address}+{len(words)} outside the register image")
+                if any(not 0 <= word <= 0xFFFF for word in words):
+                    raise ValueError(f"values at {address} must be 16-bit words")
+
+        def apply():
+            return sum(self.context[unit].bulk_update(runs) for unit, runs in writes.items())
+
+        return self.run_in_loop(apply)
+
+    def set_heat_pump_mode(self, hp_mode):
+        """Zwischen 1 WP und 2 WP umschalten, ohne den Server neu zu starten."""
+        if hp_mode not in (1, 2):
+            raise ValueError("hp_mode must be 1 or 2")
+        if self.shared_image is not None:
+            raise RuntimeError("mode switch is not supported with a shared register image")
+        if self.all_registers is None:
+            raise RuntimeError("mode switch needs the complete register list (all_registers)")
+        self.reload_registers(filter_registers_for_mode(self.all_registers, hp_mode))
+        self.hp_mode = hp_mode
+        # reload_registers queues the diff in the loop: wait until it is applied
+        self.run_in_loop(lambda: None)
+
+    def take_snapshot(self):
+        """Alle gültigen Holding-Register aller Units als JSON-fähiges Dictionary."""
+        runs = address_runs(self.context[1].valid_addresses)
+        units = {}
+        for unit in range(1, self.units + 1):
+            store = self.context[unit]
+            units[str(unit)] = [[address, store.snapshot(3, address, count)]
+                                for address, count in runs]
+        return {"format": "lambda-snapshot", "version": 1, "hp_mode": self.hp_mode,
+                "units": units}
+
+    def restore_snapshot(self, snapshot):
+        """Snapshot (take_snapshot) zurückspielen; der WP-Modus wird mit übernommen."""
+        if snapshot.get("format") != "lambda-snapshot":
+            raise ValueError("not a register snapshot")
+        hp_mode = snapshot.get("hp_mode")
+        if hp_mode is not None and hp_mode != self.hp_mode and self.all_registers is not None:
+            self.set_heat_pump_mode(hp_mode)
+        writes = {int(unit): [(address, list(words)) for address, words in runs]
+                  for unit, runs in snapshot["units"].items() if int(unit) <= self.units}
+        return self.write_registers(writes)
+
+    def create_checkpoint(self, path=None):
+        """Binärer Checkpoint aller Units und der Simulation (optional auch als Datei)."""
+        def capture():
+            units, accumulators = {}, {}
+            for unit in range(1, self.units + 1):
+                units[unit], accumulators[unit] = self.context[unit].capture_image()
+            sim_state = self.simulation.save_state() if self.simulation is not None else None
+            return RegisterCheckpoint(units, accumulators, sim_state, self.hp_mode)
+
+        if self.context is None:
+            raise RuntimeError("server not running")
+        checkpoint = self.run_in_loop(capture)
+        if path is not None:
+            checkpoint.save(path)
+        return checkpoint
+
+    def restore_checkpoint(self, checkpoint):
+        """Checkpoint (Objekt oder Dateipfad) zurückspielen, atomar zwischen zwei Requests."""
+        if not isinstance(checkpoint, RegisterCheckpoint):
+            checkpoint = RegisterCheckpoint.load(checkpoint)
+        if self.context is None:
+            raise RuntimeError("server not running")
+        if set(checkpoint.units) != set(range(1, self.units + 1)):
+            raise ValueError("checkpoint was taken with a different number of units")
+        if (checkpoint.hp_mode is not None and checkpoint.hp_mode != self.hp_mode
+                and self.all_registers is not None):
+            self.set_heat_pump_mode(checkpoint.hp_mode)
+
+        def restore():
+            # Check every unit first: a mismatch must not leave units half restored
+            for unit, tables in checkpoint.units.items():
+                live = self.context[unit].store
+                for table, words in tables.items():
+                    if len(words) != len(live[table].values):
+                        raise ValueError(
+                            f"checkpoint table {table!r} of unit {unit} has {len(words)} "
+                            f"entries, the live image {len(live[table].values)} "
+                            f"(register map changed since the checkpoint)")
+            for unit, tables in checkpoint.units.items():
+                self.context[unit].restore_image(tables, checkpoint.accumulators.get(unit, {}))
+            if self.simulation is not None and checkpoint.simulation is not None:
+                self.simulation.restore_state(checkpoint.simulation)
+
+        self.run_in_loop(restore)
+
+    def _store(self, unit):
+        if self.context is None:
+            raise RuntimeError("server not running")
+        if not 1 <= unit <= self.units:
+            raise ValueError(f"unknown unit {unit}")
+        return self.context[unit]
+
+    def reload_registers(self, registers):
+        """Übernimm eine neue Register-Liste ohne Neustart des Servers.
+
+        Diff und Adressindex werden im aufrufenden Thread berechnet, angewendet
+        wird im Event-Loop des Servers, also atomar zwischen zwei Requests.
+        """
+        if self.shared_image is not None:
+            raise RuntimeError("hot reload is not supported with a shared register image")
+        diff = diff_registers(self.registers, registers)
+        self.registers = registers
+        if not any(diff) or self.context is None or self.loop is None:
+            return diff
+
+        valid_addresses = frozenset(collect_valid_addresses(registers))
+        refresh_defaults = collect_refresh_defaults(registers, register_words)
+        write_masks = (build_write_masks(registers, register_words) if self.enforce_access
+                       else None)
+        for unit in range(1, self.units + 1):
+            self.loop.call_soon_threadsafe(self.context[unit].apply_register_diff, diff,
+                                           valid_addresses, refresh_defaults, write_masks)
+
+        added, removed, changed = diff
+        self.log_message("RELOAD", 0, len(registers),
+                         f"registers.yaml reloaded: {len(added)} added, "
+                         f"{len(removed)} removed, {len(changed)} changed")
+        return diff
+
+    def get_connection_stats(self):
+        """Liefert die Statistik der Client-Verbindungen (oder None)."""
+        if self.server is None:
+            return None
+        return self.server.get_connection_stats()
+
+    def get_accumulator_values(self):
+        """Aktuelle Zählerstände der Akkumulatoren von Unit 1 (Adresse -> Wert)."""
+        if self.context is None:
+            return {}
+        bank = self.context[1].accumulators
+        return bank.values() if bank is not None else {}
+
+    def get_traffic_summary(self, period=10, top_n=TRAFFIC_TOP_N):
+        """Top-N-Adressbereiche der letzten `period` Sekunden (oder None)."""
+        if self.traffic_stats is None:
+            return None
+        return self.traffic_stats.summary(period=period, top_n=top_n)
+
+    def get_change_feed_stats(self):
+        """Liefert die Zähler des Change-Feeds (oder None)."""
+        if self.change_feed is None:
+            return None
+        return self.change_feed.stats()
+
+    def get_cache_stats(self):
+        """Liefert die Hit/Miss-Zähler des Response-Caches (oder None)."""
+        if self.response_cache is None:
+            return None
+        return self.response_cache.stats()
+
 
 def load_registers(config_file):
-    """Lade Register aus YAML."""
-    with open(config_file, 'r') as file:
-        registers = yaml.safe_load(file)['registers']
-        return sorted(registers, key=lambda x: x['address'])
+    """Lade Register aus YAML (über den kompilierten Register-Cache)."""
+    return register_cache.load_registers(config_file)
+
+
+def register_words(reg):
+    """Liefert die Registerwörter des Initialwerts (32-Bit als Big-Endian).
+
+    Coils und Discrete Inputs liefern ihre Bits (ein Element pro Bit).
+    """
+    if reg['mode'] in BIT_MODES:
+        return register_bits(reg)
+    value = int(reg['initial_value'])
+    if reg['type'] in ['int32', 'uint32']:
+        # Big-Endian: High word first, then low word
+        return [(value >> 16) & 0xFFFF, value & 0xFFFF]
+    return [value & 0xFFFF]
+
 
+def build_register_image(registers):
+    """Baue dichte Register-Images pro Tabelle und die Menge gültiger Adressen.
 
-def setup_modbus_server(registers, log_queue=None):
-    """Setup Modbus Server mit Logging."""
-    # Build set of valid addresses
+    Coils und Discrete Inputs baut build_bit_images (bit-gepackt, eigene Masken).
+    """
     valid_addresses = set()
+    sizes = {'holding': 0, 'input': 0}
+    entries = []
+
+    # First pass: words, valid addresses and block sizes
     for reg in registers:
         addr = reg['address']
-        reg_type = reg['type']
-        # Add all addresses for this register (handle 32-bit)
-        if reg_type in ['int32', 'uint32']:
-            valid_addresses.add(addr)
-            valid_addresses.add(addr + 1)
+        mode = reg['mode']
+        if mode in BIT_MODES:
+            continue
+        words = register_words(reg)
+        valid_addresses.update(range(addr, addr + len(words)))
+        if mode in sizes:
+            sizes[mode] = max(sizes[mode], addr + len(words))
+            entries.append((mode, addr, words))
+
+    # Second pass: fill one dense array per table
+    images = {mode: [0] * (size + 1) for mode, size in sizes.items()}
+    for mode, addr, words in entries:
+        images[mode][addr:addr + len(words)] = words
+    return images, valid_addresses
+
+
+def verify_register_image(store, registers, log_queue=None):
+    """Self-Check: liest jedes Register zurück und meldet Abweichungen."""
+    fx_for_mode = {'holding': 3, 'input': 4, 'coil': 1, 'discrete_input': 2}
+    errors = 0
+    for reg in registers:
+        fx = fx_for_mode.get(reg['mode'])
+        if fx is None:
+            continue
+        expected = register_words(reg)
+        # Bypass the logging override, this is not client traffic
+        written = ModbusDeviceContext.getValues(store, fx, reg['address'], len(expected))
+        if written != expected:
+            errors += 1
+            store.log_message("ERROR", reg['address'], len(expected),
+                              f"Self-check failed: expected {expected}, got {written}")
+    return errors
+
+
+def diff_registers(old_registers, new_registers):
+    """Vergleiche zwei Register-Listen: (added, removed, changed).
+
+    changed enthält (alt, neu)-Paare für Register mit geändertem Typ, Initialwert,
+    Bitanzahl oder Zugriff (RO/RW).
+    """
+    old_by_key = {(reg['mode'], reg['address']): reg for reg in old_registers}
+    new_by_key = {(reg['mode'], reg['address']): reg for reg in new_registers}
+
+    added = [reg for key, reg in new_by_key.items() if key not in old_by_key]
+    removed = [reg for key, reg in old_by_key.items() if key not in new_by_key]
+    changed = []
+    for key, new in new_by_key.items():
+        old = old_by_key.get(key)
+        if old is not None and (value_changed(old, new)
+                                or old.get('access') != new.get('access')):
+            changed.append((old, new))
+    return added, removed, changed
+
+
+def value_changed(old, new):
+    """True, wenn sich Typ, Initialwert oder Bitanzahl eines Registers geändert haben.
+
+    Ein reiner Wechsel des Zugriffs (RO/RW) lässt den laufenden Wert stehen.
+    """
+    return (old['type'] != new['type']
+            or old['initial_value'] != new['initial_value']
+            or old.get('count') != new.get('count'))
+
+
+def changed_words(old, new, chunk=64):
+    """[(Adresse, alt, neu)] zweier gleich langer Images; gleiche Blöcke werden übersprungen."""
+    changes = []
+    for start in range(0, len(old), chunk):
+        end = start + chunk
+        if old[start:end] != new[start:end]:
+            changes.extend((start + offset, a, b) for offset, (a, b)
+                           in enumerate(zip(old[start:end], new[start:end])) if a != b)
+    return changes
+
+
+def address_runs(addresses):
+    """Zusammenhängende Läufe [(Startadresse, Anzahl)] einer Adressmenge."""
+    runs = []
+    for address in sorted(addresses):
+        if runs and runs[-1][0] + runs[-1][1] == address:
+            runs[-1][1] += 1
         else:
-            valid_addresses.add(addr)
-    
-    # Determine block sizes
-    max_hr_addr = 0
-    max_ir_addr = 0
-    max_co_addr = 0
-    
+            runs.append([address, 1])
+    return [tuple(run) for run in runs]
+
+
+def collect_valid_addresses(registers):
+    """Menge aller gültigen Registeradressen (32-Bit-Register belegen zwei, ohne Bits)."""
+    valid_addresses = set()
     for reg in registers:
-        addr = reg['address']
-        reg_type = reg['type']
-        mode = reg['mode']
-        
-        size = 2 if reg_type in ['int32', 'uint32'] else 1
-        end_addr = addr + size
-        
-        if mode == 'holding':
-            max_hr_addr = max(max_hr_addr, end_addr)
-        elif mode == 'input':
-            max_ir_addr = max(max_ir_addr, end_addr)
-        elif mode == 'coil':
-            max_co_addr = max(max_co_addr, end_addr)
-    
-    # Create blocks
-    hr_size = max_hr_addr + 1
-    ir_size = max_ir_addr + 1
-    co_size = max_co_addr + 1
-    
+        if reg['mode'] in BIT_MODES:
+            continue
+        size = 2 if reg['type'] in ['int32', 'uint32'] else 1
+        valid_addresses.update(range(reg['address'], reg['address'] + size))
+    return valid_addresses
+
+
+class RegisterFileWatcher(threading.Thread):
+    """Überwacht registers.yaml und meldet geänderte Register-Listen."""
+
+    def __init__(self, config_file, on_change, interval=1.0, log_queue=None):
+        super().__init__(daemon=True)
+        self.config_file = config_file
+        self.on_change = on_change
+        self.interval = interval
+        self.log_queue = log_queue
+        self._stop_event = threading.Event()
+        self._last_key = self._file_key()
+
+    def _file_key(self):
+        """mtime und Größe der Datei (None wenn nicht lesbar)."""
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def run(self):
+        """Prüfe die Datei periodisch auf Änderungen."""
+        while not self._stop_event.wait(self.interval):
+            key = self._file_key()
+            if key is None or key == self._last_key:
+                continue
+            # A half-written file fails once; the final write changes the key again
+            self._last_key = key
+            try:
+                registers = register_cache.load_registers(self.config_file)
+            except (OSError, yaml.YAMLError, KeyError, TypeError) as e:
+                if self.log_queue is not None:
+                    log_msg = {
+                        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        "type": "ERROR",
+                        "address": 0,
+                        "count": 0,
+                        "values": f"Reload of {self.config_file} failed: {e}",
+                        "function": None
+                    }
+                    try:
+                        self.log_queue.put_nowait(log_msg)
+                    except queue.Full:
+                        pass
+                continue
+            self.on_change(registers)
+
+    def stop(self):
+        """Beende die Überwachung."""
+        self._stop_event.set()
+
+
+def build_accumulators(image, valid_addresses, start_values=None, rate=ACCUMULATOR_RATE):
+    """Virtuelle Akkumulatoren; Startwert aus start_values oder dem Register-Image."""
+    start_values = start_values or {}
+    accumulators = []
+    for address in ACCUMULATOR_REGISTERS:
+        if address not in valid_addresses:
+            continue
+        start = start_values.get(address)
+        if start is None:
+            start = (image[address] << 16) | image[address + 1]
+        accumulators.append(VirtualAccumulator(address, start, rate))
+    return AccumulatorBank(accumulators) if accumulators else None
+
+
+def create_shared_image(registers, units=1, state_values=None,
+                        accumulator_rate=ACCUMULATOR_RATE):
+    """Register-Image für Worker-Prozesse in Shared Memory anlegen.
+
+    Jede Unit erhält das Image der Register-Liste; state_values (Adresse ->
+    Wort) werden vorher auf das Holding-Image angewendet. Die Akkumulatoren
+    starten bei ihren Wörtern im Image und zählen in allen Workern gleich.
+    """
+    images, valid_addresses = build_register_image(registers)
+    bit_images = build_bit_images(registers)
+    holding = images['holding']
+    for address, value in (state_values or {}).items():
+        if address in valid_addresses and address < len(holding):
+            holding[address] = value & 0xFFFF
+    accumulators = {address: ((holding[address] << 16) | holding[address + 1], accumulator_rate)
+                    for address in ACCUMULATOR_REGISTERS if address in valid_addresses}
+    # One word per bit: the shared layout only knows uint16 tables
+    return SharedRegisterImage.create(
+        {'h': holding, 'i': images['input'],
+         'c': list(bit_images['c'][0]), 'd': list(bit_images['d'][0])}, units,
+        accumulators=accumulators,
+        refresh_addresses=collect_refresh_defaults(registers, register_words))
+
+
+def setup_modbus_server(registers, log_queue=None, response_cache=None,
+                        self_check=False, refresh_scheduler=None, units=1,
+                        accumulator_values=None, accumulator_rate=ACCUMULATOR_RATE,
+                        shared_image=None, enforce_access=ENFORCE_ACCESS):
+    """Setup Modbus Server mit Logging.
+
+    Mit shared_image arbeiten die Stores direkt auf dem gemeinsamen Image,
+    auch die Akkumulatoren liegen dort (create_shared_image).
+    """
+    images, valid_addresses = build_register_image(registers)
+    bit_images = build_bit_images(registers)
+    valid_bits = {table: valid for table, (_, valid) in bit_images.items()}
+
+    refresh_defaults = collect_refresh_defaults(registers, register_words)
+    write_masks = build_write_masks(registers, register_words) if enforce_access else None
+
     # pymodbus >= 3.13 treats `address` as 1-based internally (address-1 is the
     # actual register index), so pass 1 to start the block at register 0.
-    hr_block = (ModbusSequentialDataBlock(1, [0] * hr_size)
-                if max_hr_addr > 0 else None)
-    ir_block = (ModbusSequentialDataBlock(1, [0] * ir_size)
-                if max_ir_addr > 0 else None)
-    co_block = (ModbusSequentialDataBlock(1, [0] * co_size)
-                if max_co_addr > 0 else None)
-
-    # Create slave context with logging and valid addresses
-    store = LoggingSlaveContext(
-        log_queue=log_queue,
-        valid_addresses=valid_addresses,
-        hr=hr_block if hr_block else ModbusSequentialDataBlock(1, [0]),
-        ir=ir_block if ir_block else ModbusSequentialDataBlock(1, [0]),
-        co=co_block if co_block else ModbusSequentialDataBlock(1, [0]),
-        di=ModbusSequentialDataBlock(1, [0])
-    )
-    
-    # Initialize values
-    for reg in registers:
-        addr = reg['address']
-        reg_type = reg['type']
-        mode = reg['mode']
-        value = int(reg['initial_value'])
-        
-        # Handle 32-bit values - Big-Endian format
-        if reg_type in ['int32', 'uint32']:
-            # Big-Endian: High word first, then low word
-            high_word = (value >> 16) & 0xFFFF
-            low_word = value & 0xFFFF
-            values = [high_word, low_word]
+    # Each block is installed in one go from its dense image.
+    # Unit 1 is the Lambda controller; further units (simulation) get their
+    # own copy (the block copies the image).
+    slaves = {}
+    if shared_image is not None:
+        units = shared_image.units
+    for unit in range(1, units + 1):
+        if shared_image is not None:
+            blocks = {key: SharedDataBlock(1, shared_image.words(unit, table))
+                      for key, table in (('hr', 'h'), ('ir', 'i'), ('co', 'c'), ('di', 'd'))}
         else:
-            values = [value]
-        
-        try:
-            if mode == 'holding':
-                store.setValues(3, addr, values)
-            elif mode == 'input':
-                store.setValues(4, addr, values)
-            elif mode == 'coil':
-                store.setValues(1, addr, values)
-        except Exception as e:
-            if log_queue:
-                log_msg = {
-                    "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    "type": "ERROR",
-                    "address": addr,
-                    "count": 0,
-                    "values": f"Failed to set: {e}",
-                    "function": None
-                }
-                try:
-                    log_queue.put(log_msg, timeout=0.1)
-                except queue.Full:
-                    pass
-    
-    # Create context with slave id 1 (Lambda expects Unit ID 1)
-    # Map slave id 1 to our store
-    slaves = {1: store}
+            blocks = {'hr': ModbusSequentialDataBlock(1, images['holding']),
+                      'ir': ModbusSequentialDataBlock(1, images['input']),
+                      'co': PackedBitBlock(1, bit_images['c'][0].copy()),
+                      'di': PackedBitBlock(1, bit_images['d'][0].copy())}
+        store = LoggingSlaveContext(
+            log_queue=log_queue,
+            valid_addresses=valid_addresses,
+            unit_id=unit,
+            response_cache=response_cache,
+            refresh_scheduler=refresh_scheduler,
+            refresh_defaults=refresh_defaults,
+            valid_bits=valid_bits,
+            write_masks=write_masks,
+            **blocks
+        )
+        if self_check:
+            verify_register_image(store, registers, log_queue)
+        if shared_image is not None:
+            store.seqlock = shared_image.seqlock(unit)
+            store.accumulators = shared_image.accumulator_bank(unit)
+            slaves[unit] = store
+            continue
+        store.accumulators = build_accumulators(
+            images['holding'], valid_addresses,
+            accumulator_values if unit == 1 else None, accumulator_rate)
+        store.accumulator_rate = accumulator_rate
+        slaves[unit] = store
+
     context = ModbusServerContext(slaves, single=False)
     return context
\ No newline at end of file
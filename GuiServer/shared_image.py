@@ -0,0 +1,302 @@
+"""Register-Image in multiprocessing.shared_memory für mehrere Worker-Prozesse.
+
+Alle Worker lauschen per SO_REUSEPORT auf demselben Port und lesen/schreiben
+dasselbe Image; ein Schreibzugriff ist sofort für alle Worker sichtbar.
+
+Layout:   Versionszähler (uint64) pro Unit, Akkumulatoren (Startwert,
+          Startzeit, Rate als float64) pro Unit, Refresh-Ablaufzeitpunkte
+          (float64) pro Unit, danach pro Unit die Tabellen h, i, c, d als
+          uint16-Wörter (Größen aus dem Layout).
+
+Startzeiten und Ablaufzeitpunkte sind time.monotonic()-Werte; die Uhr
+(CLOCK_MONOTONIC) ist systemweit, alle Worker rechnen also gleich.
+
+Die Versionszähler bilden zusammen mit einem prozessübergreifenden Lock pro
+Unit ein SeqLock wie in seqlock.py: Multi-Word-Updates sind auch für Leser
+in anderen Prozessen atomar.
+"""
+from array import array
+import multiprocessing
+from multiprocessing import shared_memory
+import time
+
+from pymodbus.datastore import ModbusSequentialDataBlock
+
+from accumulators import AccumulatorBank, VirtualAccumulator
+from refresh_timeout import RefreshScheduler
+from seqlock import SeqLock
+
+TABLES = ("h", "i", "c", "d")
+COUNTER_SIZE = 8
+# start value, start time, rate (float64 each)
+ACCUMULATOR_FIELDS = 3
+
+
+class SharedWords:
+    """Listenartige uint16-Sicht auf einen Shared-Memory-Bereich.
+
+    Unterstützt, was Datenblock und Server verwenden: len, Index- und
+    Slice-Zugriff (Slices liefern Listen). Die Größe ist fest.
+    """
+
+    __slots__ = ("_view",)
+
+    def __init__(self, view):
+        self._view = view
+
+    def __len__(self):
+        return len(self._view)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._view[index].tolist()
+        return self._view[index]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(len(self._view))
+            words = array("H", value)
+            if len(words) != stop - start:
+                raise ValueError("the shared register image cannot change its size")
+            self._view[start:stop] = words
+        else:
+            self._view[index] = value
+
+    def __iter__(self):
+        return iter(self._view.tolist())
+
+    def extend(self, values):
+        raise ValueError("the shared register image cannot change its size")
+
+
+class SharedDataBlock(ModbusSequentialDataBlock):
+    """Datenblock direkt auf SharedWords (ohne Kopie in eine Liste)."""
+
+    def __init__(self, address, words):
+        self.address = address
+        self.values = words
+        self.default_value = 0
+
+
+class SharedSeqLock(SeqLock):
+    """SeqLock mit Zähler im Shared Memory und prozessübergreifendem Schreib-Lock."""
+
+    def __init__(self, counters, index, lock):
+        super().__init__()
+        self._counters = counters
+        self._index = index
+        # multiprocessing.RLock: reentrant like the threading.RLock of SeqLock
+        self._write_lock = lock
+
+    @property
+    def _sequence(self):
+        return self._counters[self._index]
+
+    @_sequence.setter
+    def _sequence(self, value):
+        # Set by SeqLock.__init__ before the counters exist
+        if hasattr(self, "_counters"):
+            self._counters[self._index] = value
+
+
+class SharedAccumulator(VirtualAccumulator):
+    """VirtualAccumulator mit Startwert, Startzeit und Rate im Shared Memory."""
+
+    __slots__ = ("_fields", "_offset")
+
+    def __init__(self, address, fields, offset):
+        self.address = address
+        self._fields = fields
+        self._offset = offset
+
+    @property
+    def start_value(self):
+        return self._fields[self._offset]
+
+    @start_value.setter
+    def start_value(self, value):
+        self._fields[self._offset] = value
+
+    @property
+    def started(self):
+        return self._fields[self._offset + 1]
+
+    @started.setter
+    def started(self, value):
+        self._fields[self._offset + 1] = value
+
+    @property
+    def rate(self):
+        return self._fields[self._offset + 2]
+
+    @rate.setter
+    def rate(self, value):
+        self._fields[self._offset + 2] = value
+
+
+class SharedRefreshScheduler(RefreshScheduler):
+    """Refresh-Ablaufzeitpunkte aller Worker im Shared Memory (0 = nicht überwacht).
+
+    Jeder Worker trägt Schreibzugriffe seiner Clients ein; nur ein Prozess
+    setzt abgelaufene Werte zurück. pop_expired() liefert dafür Kandidaten,
+    confirm_expired() prüft sie unter dem SeqLock der Unit erneut, damit ein
+    gleichzeitiger Refresh über einen anderen Worker gewinnt.
+    """
+
+    def __init__(self, deadlines, addresses, units, timeout):
+        super().__init__(timeout)
+        self._slots = deadlines
+        # (unit, address) -> index in deadlines
+        self._index = {(unit, address): (unit - 1) * len(addresses) + offset
+                       for unit in range(1, units + 1)
+                       for offset, address in enumerate(addresses)}
+
+    def __len__(self):
+        return sum(1 for deadline in self._slots if deadline)
+
+    def touch(self, key, now=None):
+        index = self._index.get(key)
+        if index is not None:
+            now = time.monotonic() if now is None else now
+            self._slots[index] = now + self.timeout
+
+    def discard(self, key):
+        index = self._index.get(key)
+        if index is not None:
+            self._slots[index] = 0.0
+
+    def next_deadline(self):
+        pending = [deadline for deadline in self._slots if deadline]
+        return min(pending) if pending else None
+
+    def pop_expired(self, now=None):
+        """Abgelaufene Schlüssel (bleiben bis confirm_expired() eingetragen)."""
+        now = time.monotonic() if now is None else now
+        slots = self._slots
+        return [key for key, index in self._index.items() if 0.0 < slots[index] <= now]
+
+    def confirm_expired(self, key, now=None):
+        index = self._index.get(key)
+        if index is None:
+            return False
+        now = time.monotonic() if now is None else now
+        if not 0.0 < self._slots[index] <= now:
+            # Refreshed through another worker in the meantime
+            return False
+        self._slots[index] = 0.0
+        self.expired += 1
+        return True
+
+
+class SharedRegisterImage:
+    """Register-Images aller Units in einem Shared-Memory-Segment."""
+
+    def __init__(self, layout, shm, locks, owner=False):
+        # {"units": N, "tables": {table: words}, "accumulators": [addresses],
+        #  "refresh": [addresses]}
+        self.layout = layout
+        self.shm = shm
+        # One multiprocessing.RLock per unit (writer lock of the SeqLock)
+        self.locks = locks
+        self.owner = owner
+        units = layout["units"]
+        buffer = shm.buf
+        self._counters = buffer[:units * COUNTER_SIZE].cast("Q")
+        offset = units * COUNTER_SIZE
+        fields = units * len(layout["accumulators"]) * ACCUMULATOR_FIELDS
+        self._accumulators = buffer[offset:offset + 8 * fields].cast("d")
+        offset += 8 * fields
+        slots = units * len(layout["refresh"])
+        self._refresh = buffer[offset:offset + 8 * slots].cast("d")
+        offset += 8 * slots
+        self._words = {}
+        for unit in range(1, units + 1):
+            for table in TABLES:
+                size = layout["tables"][table]
+                self._words[unit, table] = buffer[offset:offset + 2 * size].cast("H")
+                offset += 2 * size
+
+    @staticmethod
+    def segment_size(layout):
+        per_unit = (sum(2 * layout["tables"][table] for table in TABLES)
+                    + 8 * ACCUMULATOR_FIELDS * len(layout["accumulators"])
+                    + 8 * len(layout["refresh"]))
+        return layout["units"] * (COUNTER_SIZE + per_unit)
+
+    @classmethod
+    def create(cls, images, units, context=None, accumulators=None, refresh_addresses=()):
+        """Neues Segment, jede Unit mit einer Kopie der Images {table: Wörter}.
+
+        context: multiprocessing-Kontext der Worker (z.B. "spawn"), die Locks
+        müssen aus demselben Kontext stammen.
+        accumulators: {Adresse: (Startwert, Rate)} der virtuellen Akkumulatoren,
+        sie beginnen für alle Units jetzt zu zählen.
+        refresh_addresses: Datenpunkte mit Refresh-Timeout (refresh_scheduler()).
+        """
+        accumulators = accumulators or {}
+        layout = {"units": units, "tables": {table: len(images[table]) for table in TABLES},
+                  "accumulators": sorted(accumulators),
+                  "refresh": sorted(refresh_addresses)}
+        shm = shared_memory.SharedMemory(create=True, size=cls.segment_size(layout))
+        locks = [(context or multiprocessing).RLock() for _ in range(units)]
+        image = cls(layout, shm, locks, owner=True)
+        now = time.monotonic()
+        for unit in range(1, units + 1):
+            for table in TABLES:
+                image.words(unit, table)[:] = images[table]
+            bank = image.accumulator_bank(unit)
+            for address, (start_value, rate) in accumulators.items():
+                bank[address].start_value = start_value
+                bank[address].started = now
+                bank[address].rate = rate
+        return image
+
+    @classmethod
+    def attach(cls, handle):
+        """Bestehendes Segment in einem Worker-Prozess öffnen (handle aus handle())."""
+        name, layout, locks = handle
+        return cls(layout, shared_memory.SharedMemory(name=name), locks)
+
+    def handle(self):
+        """Argument für multiprocessing.Process: (Name, Layout, Locks)."""
+        return self.shm.name, self.layout, self.locks
+
+    @property
+    def units(self):
+        return self.layout["units"]
+
+    def words(self, unit, table):
+        """SharedWords einer Tabelle."""
+        return SharedWords(self._words[unit, table])
+
+    def accumulator_bank(self, unit):
+        """AccumulatorBank einer Unit auf den gemeinsamen Zählern (None ohne Akkumulatoren)."""
+        addresses = self.layout["accumulators"]
+        if not addresses:
+            return None
+        base = (unit - 1) * len(addresses) * ACCUMULATOR_FIELDS
+        return AccumulatorBank([
+            SharedAccumulator(address, self._accumulators, base + index * ACCUMULATOR_FIELDS)
+            for index, address in enumerate(addresses)])
+
+    def refresh_scheduler(self, timeout):
+        """SharedRefreshScheduler über die Ablaufzeitpunkte aller Units."""
+        return SharedRefreshScheduler(self._refresh, self.layout["refresh"], self.units,
+                                      timeout)
+
+    def seqlock(self, unit):
+        """SeqLock einer Unit, gemeinsam mit allen Prozessen."""
+        return SharedSeqLock(self._counters, unit - 1, self.locks[unit - 1])
+
+    def close(self):
+        """Segment freigeben (der Besitzer löscht es auch)."""
+        # Views must be released before the segment can be closed
+        self._counters.release()
+        self._accumulators.release()
+        self._refresh.release()
+        for view in self._words.values():
+            view.release()
+        self._words.clear()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
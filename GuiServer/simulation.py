@@ -0,0 +1,310 @@
+"""Vektorisierte thermische Simulation für dynamische Registerwerte.
+
+Alle Geräte (Modbus-Units) werden gemeinsam als NumPy-Arrays gerechnet:
+Form (Geräte,) für Umgebungswerte, (Geräte, Gruppen) für Wärmepumpe,
+Boiler, Puffer und Heizkreis. Gruppe k fasst WP k+1, Boiler k+1,
+Puffer k+1 und Heizkreis k+1 zusammen (Subindex k).
+"""
+import numpy as np
+
+WATER_HEAT_CAPACITY = 4186.0   # J/(kg*K)
+
+# Heat pump operating states (1x03) used by the model
+MODE_STBY = 0
+MODE_CH = 1
+MODE_DHW = 2
+
+# Default model parameters (SI units), varied per device by +-PARAMETER_SPREAD
+DEFAULT_PARAMETERS = {
+    "hp_max_power": 8000.0,         # W thermal
+    "hp_flow_tau": 120.0,           # s, flow temperature lag
+    "carnot_efficiency": 0.45,
+    "boiler_capacity": 300 * WATER_HEAT_CAPACITY,
+    "boiler_loss": 2.5,             # W/K
+    "boiler_draw": 150.0,           # W mean hot water draw
+    "boiler_hysteresis": 5.0,       # K
+    "buffer_capacity": 200 * WATER_HEAT_CAPACITY,
+    "buffer_hysteresis": 3.0,       # K
+    "house_loss": 150.0,            # W/K
+    "house_capacity": 1.5e7,        # J/K
+    "emitter_coefficient": 500.0,   # W/K
+    "hc_flow_rate": 0.25,           # kg/s
+    "heating_curve_slope": 0.6,
+    "ambient_mean": 2.0,            # °C
+    "ambient_amplitude": 5.0,       # K, day/night swing
+}
+PARAMETER_SPREAD = 0.1
+
+INDOOR_TEMPERATURE = 20.0       # °C around the boiler
+DAY = 86400.0
+
+
+class ThermalSimulation:
+    """Zustand und Zeitschritt aller simulierten Geräte."""
+
+    def __init__(self, devices, groups=2, parameters=None, seed=None):
+        self.devices = devices
+        self.groups = groups
+        self.time = 0.0
+        rng = np.random.default_rng(seed)
+        params = dict(DEFAULT_PARAMETERS, **(parameters or {}))
+        shape = (devices, groups)
+
+        def vary(name, size=shape):
+            return params[name] * rng.uniform(1 - PARAMETER_SPREAD, 1 + PARAMETER_SPREAD, size)
+
+        self.hp_max_power = vary("hp_max_power")
+        self.hp_flow_tau = params["hp_flow_tau"]
+        self.carnot_efficiency = params["carnot_efficiency"]
+        self.boiler_capacity = vary("boiler_capacity")
+        self.boiler_loss = vary("boiler_loss")
+        self.boiler_draw = vary("boiler_draw")
+        self.boiler_hysteresis = params["boiler_hysteresis"]
+        self.buffer_capacity = vary("buffer_capacity")
+        self.buffer_hysteresis = params["buffer_hysteresis"]
+        self.house_loss = vary("house_loss")
+        self.house_capacity = vary("house_capacity")
+        self.emitter_coefficient = vary("emitter_coefficient")
+        self.hc_flow_capacity = params["hc_flow_rate"] * WATER_HEAT_CAPACITY
+        self.heating_curve_slope = params["heating_curve_slope"]
+        self.ambient_mean = params["ambient_mean"] + rng.normal(0.0, 2.0, devices)
+        self.ambient_amplitude = params["ambient_amplitude"]
+        # Spread the day phase a little so devices do not move in lockstep
+        self.ambient_phase = rng.uniform(-0.05, 0.05, devices)
+
+        # State
+        self.ambient = self.ambient_mean.copy()
+        self.ambient_1h = self.ambient.copy()
+        self.ambient_calculated = self.ambient.copy()
+        self.mode = np.zeros(shape, dtype=np.int8)
+        self.hp_flow = np.full(shape, 35.0)
+        self.hp_power = np.zeros(shape)
+        self.hp_electric = np.zeros(shape)
+        self.boiler = np.full(shape, 45.0)
+        self.buffer = np.full(shape, 40.0)
+        self.room = np.full(shape, 21.0)
+        self.hc_flow = np.full(shape, 35.0)
+        self.hc_return = np.full(shape, 30.0)
+        self.hc_target = np.full(shape, 35.0)
+        self.hc_heating = np.zeros(shape, dtype=bool)
+
+    def load_state(self, state):
+        """Übernimm Startwerte (z.B. aus dem Register-Image), Name -> Array."""
+        for name, values in state.items():
+            current = getattr(self, name)
+            current[...] = np.broadcast_to(values, current.shape)
+
+    def save_state(self):
+        """Kompletter Zustand inkl. Parameter (Kopien), für Checkpoints."""
+        state = {name: value.copy() for name, value in vars(self).items()
+                 if isinstance(value, np.ndarray)}
+        state["time"] = self.time
+        return state
+
+    def restore_state(self, state):
+        """Zustand aus save_state() zurückkopieren (Arrays werden in-place überschrieben)."""
+        for name, values in state.items():
+            if name == "time":
+                self.time = float(values)
+            else:
+                np.copyto(getattr(self, name), values)
+
+    def step(self, dt, boiler_target, buffer_max, room_target, flow_offset):
+        """Rechne alle Geräte um dt Sekunden weiter.
+
+        Sollwerte als Arrays der Form (Geräte, Gruppen) in °C bzw. K.
+        """
+        self.time += dt
+
+        # Ambient: daily sine plus first-order filtered averages
+        day_angle = 2 * np.pi * (self.time / DAY + self.ambient_phase - 0.375)
+        self.ambient = self.ambient_mean + self.ambient_amplitude * np.sin(day_angle)
+        self.ambient_1h += (self.ambient - self.ambient_1h) * (1 - np.exp(-dt / 3600.0))
+        self.ambient_calculated += ((self.ambient - self.ambient_calculated)
+                                    * (1 - np.exp(-dt / 1800.0)))
+        ambient = self.ambient[:, None]
+
+        # Heating circuit: heating curve, capped by what the buffer delivers
+        self.hc_target = np.clip(
+            room_target + self.heating_curve_slope * (room_target - ambient) + flow_offset,
+            20.0, 55.0)
+        self.hc_heating = self.room < room_target + 0.5
+        self.hc_flow = np.where(self.hc_heating,
+                                np.minimum(self.hc_target, self.buffer), self.room)
+        # Emitter outlet temperature for a given flow (exponential approach)
+        transfer = np.exp(-self.emitter_coefficient / self.hc_flow_capacity)
+        self.hc_return = self.room + (self.hc_flow - self.room) * transfer
+        hc_power = self.hc_flow_capacity * (self.hc_flow - self.hc_return)
+
+        # Heat pump control with hysteresis: hot water first, then buffer
+        buffer_target = np.minimum(self.hc_target + 3.0, buffer_max)
+        dhw = ((self.boiler < boiler_target - self.boiler_hysteresis)
+               | ((self.mode == MODE_DHW) & (self.boiler < boiler_target)))
+        ch = ((self.buffer < buffer_target - self.buffer_hysteresis)
+              | ((self.mode == MODE_CH) & (self.buffer < buffer_target)))
+        self.mode = np.where(dhw, MODE_DHW, np.where(ch, MODE_CH, MODE_STBY)).astype(np.int8)
+        running = self.mode != MODE_STBY
+
+        sink = np.where(self.mode == MODE_DHW, self.boiler, self.buffer)
+        supply = np.where(self.mode == MODE_DHW, boiler_target + 5.0,
+                          np.where(self.mode == MODE_CH, buffer_target + 2.0, sink))
+        self.hp_flow += (supply - self.hp_flow) * (1 - np.exp(-dt / self.hp_flow_tau))
+
+        modulation = np.clip((supply - sink) / 5.0, 0.3, 1.0)
+        self.hp_power = np.where(running, self.hp_max_power * modulation, 0.0)
+        lift = np.maximum(self.hp_flow - ambient, 5.0)
+        cop = np.clip(self.carnot_efficiency * (self.hp_flow + 273.15) / lift, 1.5, 7.0)
+        self.hp_electric = self.hp_power / cop
+
+        # Energy balances of the storages and the house
+        dhw_power = np.where(self.mode == MODE_DHW, self.hp_power, 0.0)
+        ch_power = self.hp_power - dhw_power
+        self.boiler += dt * (dhw_power - self.boiler_draw
+                             - self.boiler_loss * (self.boiler - INDOOR_TEMPERATURE)
+                             ) / self.boiler_capacity
+        self.buffer += dt * (ch_power - hc_power) / self.buffer_capacity
+        self.room += dt * (hc_power - self.house_loss * (self.room - ambient)) / self.house_capacity
+
+    @property
+    def hp_state(self):
+        """Wärmepumpen-Status (1x02): READY oder REGULATION."""
+        return np.where(self.mode != MODE_STBY, 7, 3)
+
+    @property
+    def boiler_state(self):
+        """Boiler-Betriebszustand (2x01): DHW oder STBY."""
+        return np.where(self.mode == MODE_DHW, 1, 0)
+
+    @property
+    def buffer_state(self):
+        """Puffer-Betriebszustand (3x01): HEATING oder STBY."""
+        return np.where(self.mode == MODE_CH, 1, 0)
+
+    @property
+    def hc_state(self):
+        """Heizkreis-Betriebszustand (5x01): HEATING oder STBY-HEATING."""
+        return np.where(self.hc_heating, 0, 16)
+
+    @property
+    def total_electric(self):
+        """Elektrische Leistung aller Wärmepumpen eines Geräts (0103) in W."""
+        return self.hp_electric.sum(axis=1)
+
+
+# Register layout: (number offset within the module, state name, scale)
+# Addresses are module index * 1000 + group * 100 + number
+GROUP_OUTPUTS = [
+    (1002, "hp_state", 1),
+    (1003, "mode", 1),
+    (1004, "hp_flow", 100),
+    (2001, "boiler_state", 1),
+    (2002, "boiler", 10),
+    (3001, "buffer_state", 1),
+    (3002, "buffer", 10),
+    (5001, "hc_state", 1),
+    (5002, "hc_flow", 10),
+    (5003, "hc_return", 10),
+    (5004, "room", 10),
+    (5007, "hc_target", 10),
+]
+DEVICE_OUTPUTS = [
+    (2, "ambient", 10),
+    (3, "ambient_1h", 10),
+    (4, "ambient_calculated", 10),
+    (103, "total_electric", 1),
+]
+# Setpoints read back from the image each tick: (address, name, scale, default)
+GROUP_INPUTS = [
+    (2050, "boiler_target", 10, 55.0),
+    (3050, "buffer_max", 10, 45.0),
+    (5050, "flow_offset", 10, 5.0),
+    (5051, "room_target", 10, 21.0),
+]
+
+
+class RegisterBinding:
+    """Abbildung zwischen Simulationszustand und Holding-Register-Image.
+
+    Es werden nur Adressen belegt, die in der Register-Map existieren
+    (z.B. keine WP2-Register im 1-WP-Modus). Zusammenhängende Adressen
+    werden als Läufe geschrieben (eine Slice-Zuweisung pro Lauf).
+    """
+
+    def __init__(self, valid_addresses, groups=2):
+        self.groups = groups
+        columns = [(address, name, None, scale) for address, name, scale in DEVICE_OUTPUTS
+                   if address in valid_addresses]
+        for group in range(groups):
+            columns += [(address + 100 * group, name, group, scale)
+                        for address, name, scale in GROUP_OUTPUTS
+                        if address + 100 * group in valid_addresses]
+        columns.sort()
+        self.columns = columns
+        self.addresses = [address for address, _, _, _ in columns]
+
+        # Contiguous address runs -> (start address, first column, end column)
+        self.runs = []
+        for index, address in enumerate(self.addresses):
+            if self.runs and self.runs[-1][0] + index - self.runs[-1][1] == address:
+                start, first, _ = self.runs[-1]
+                self.runs[-1] = (start, first, index + 1)
+            else:
+                self.runs.append((address, index, index + 1))
+
+        self.inputs = [(address + 100 * group, name, group, scale, default)
+                       for address, name, scale, default in GROUP_INPUTS
+                       for group in range(groups)]
+        self.input_addresses = [address for address, _, _, _, _ in self.inputs]
+        self.input_present = np.array([address in valid_addresses
+                                       for address in self.input_addresses])
+
+    def read_inputs(self, images):
+        """Lies die Sollwerte aller Geräte; images: Liste der Holding-Wertelisten."""
+        raw = np.array([[values[address] if address < len(values) else 0
+                         for address in self.input_addresses] for values in images],
+                       dtype=np.uint16).astype(np.int16).astype(np.float64)
+        inputs = {}
+        for column, (_, name, group, scale, default) in enumerate(self.inputs):
+            array = inputs.setdefault(name, np.empty((len(images), self.groups)))
+            if self.input_present[column]:
+                array[:, group] = raw[:, column] / scale
+            else:
+                array[:, group] = default
+        return inputs
+
+    def read_state(self, images):
+        """Startzustand aus dem Register-Image (nur Temperaturen)."""
+        state = {}
+        for column, (address, name, group, scale) in enumerate(self.columns):
+            if scale == 1:
+                continue
+            words = np.array([values[address] for values in images], dtype=np.uint16)
+            value = words.astype(np.int16) / scale
+            if group is None:
+                state[name] = value
+            else:
+                state.setdefault(name, {})[group] = value
+        result = {}
+        for name, value in state.items():
+            if isinstance(value, dict):
+                # Groups missing in the image fall back to the first present one
+                first = next(iter(value.values()))
+                result[name] = np.stack([value.get(group, first)
+                                         for group in range(self.groups)], axis=1)
+            else:
+                result[name] = value
+        return result
+
+    def encode(self, simulation):
+        """Registerwörter aller Geräte als Matrix (Geräte, Spalten), uint16."""
+        words = np.empty((simulation.devices, len(self.columns)), dtype=np.int64)
+        for column, (_, name, group, scale) in enumerate(self.columns):
+            value = getattr(simulation, name)
+            if group is not None:
+                value = value[:, group]
+            words[:, column] = np.rint(value * scale)
+        return words & 0xFFFF
+
+    def runs_for(self, row):
+        """Schreibläufe [(Adresse, Wörter)] einer Gerätezeile."""
+        return [(start, row[first:end]) for start, first, end in self.runs]
@@ -0,0 +1,201 @@
+"""Write-Ahead-Journal für server_state.json.
+
+Änderungen (GUI, Modbus-Clients, Simulation, Akkumulatoren, WP-Modus)
+werden nur an eine Warteschlange angehängt. Ein Hintergrund-Thread fasst
+alle Änderungen eines Intervalls zu einer Journal-Zeile zusammen (Group
+Commit, ein fsync pro Zeile) und schreibt den kompletten State nur bei der
+Kompaktierung neu – atomar über eine temporäre Datei.
+
+Journal-Zeile:  CRC32 (8 Hex-Zeichen), Leerzeichen, JSON
+                {"r": {Adresse: Wert}, "a": {Adresse: Wert}, "m": WP-Modus}
+
+Beim Start wird der letzte Snapshot geladen und das Journal bis zur ersten
+unvollständigen oder beschädigten Zeile nachgespielt (Absturz beim Schreiben).
+"""
+from collections import deque
+import copy
+import json
+import os
+import threading
+import zlib
+
+from register_manager import STATE_FILE, load_state, save_state
+
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_COMMIT_INTERVAL = 0.2          # seconds collected into one commit
+JOURNAL_COMPACT_BYTES = 1024 * 1024    # compact when the journal grows beyond this
+JOURNAL_COMPACT_INTERVAL = 300.0       # ... or at least this often (seconds)
+
+
+def encode_entry(batch):
+    """Journal-Zeile mit Prüfsumme."""
+    data = json.dumps(batch, separators=(",", ":"))
+    return f"{zlib.crc32(data.encode()):08x} {data}\n"
+
+
+def decode_entry(line):
+    """Batch einer Journal-Zeile oder None, wenn sie unvollständig/beschädigt ist."""
+    if not line.endswith("\n") or len(line) < 10 or line[8] != " ":
+        return None
+    data = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(data.encode()):
+            return None
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+def apply_entry(state, batch):
+    """Einen Batch auf den State anwenden."""
+    for address, value in batch.get("r", {}).items():
+        state["registers"][str(address)] = value
+    for address, value in batch.get("a", {}).items():
+        state["last_accumulated_values"][str(address)] = value
+    if batch.get("m") is not None:
+        state["heat_pump_mode"] = batch["m"]
+
+
+def recover_state(state_file=STATE_FILE):
+    """Snapshot laden und das Journal nachspielen: (State, Anzahl nachgespielter Zeilen)."""
+    state = load_state(state_file)
+    state.setdefault("registers", {})
+    state.setdefault("last_accumulated_values", {})
+    replayed = 0
+    journal_file = state_file + JOURNAL_SUFFIX
+    if os.path.exists(journal_file):
+        with open(journal_file, "r") as f:
+            for line in f:
+                batch = decode_entry(line)
+                if batch is None:
+                    # Torn write at the crash: everything after it is lost
+                    break
+                apply_entry(state, batch)
+                replayed += 1
+    return state, replayed
+
+
+class StateJournal(threading.Thread):
+    """Hintergrund-Thread für Journal-Commits und Kompaktierung."""
+
+    def __init__(self, state, state_file=STATE_FILE,
+                 commit_interval=JOURNAL_COMMIT_INTERVAL,
+                 compact_bytes=JOURNAL_COMPACT_BYTES,
+                 compact_interval=JOURNAL_COMPACT_INTERVAL, unit=1):
+        super().__init__(daemon=True, name="StateJournal")
+        # Own copy: only this thread mutates it, the GUI keeps its dict
+        self.state = copy.deepcopy(state)
+        self.state_file = state_file
+        self.journal_file = state_file + JOURNAL_SUFFIX
+        self.commit_interval = commit_interval
+        self.compact_bytes = compact_bytes
+        self.compact_interval = compact_interval
+        self.unit = unit
+        # ("r" | "a" | "m" | "changes", payload); appended from any thread
+        self._pending = deque()
+        self._stop_event = threading.Event()
+        self._file = None
+        self._journal_size = 0
+        self._since_compaction = 0.0
+        self.commits = 0
+        self.compactions = 0
+
+    def set_register(self, address, value):
+        """Registerwert vormerken (blockiert nie)."""
+        self._pending.append(("r", (address, value)))
+
+    def set_registers(self, values):
+        """Mehrere Registerwerte {Adresse: Wert} vormerken."""
+        self._pending.append(("r*", dict(values)))
+
+    def set_accumulated(self, address, value):
+        """Akkumulator-Wert vormerken."""
+        self._pending.append(("a", (address, value)))
+
+    def set_mode(self, hp_mode):
+        """WP-Modus vormerken."""
+        self._pending.append(("m", hp_mode))
+
+    def on_change(self, event):
+        """ChangeEvent-Listener des Servers: Holding-Register der eigenen Unit."""
+        if event.unit == self.unit and event.table == 'h':
+            self._pending.append(("changes", event.changes))
+
+    def run(self):
+        """Commits im Intervall, Kompaktierung nach Größe oder Zeit."""
+        # Start from a compacted state: also drops a torn tail of the journal
+        self.compact()
+        self._file = open(self.journal_file, "a")
+        while not self._stop_event.wait(self.commit_interval):
+            self.commit()
+            self._since_compaction += self.commit_interval
+            if (self._journal_size >= self.compact_bytes
+                    or self._since_compaction >= self.compact_interval):
+                self.compact()
+        self.commit()
+        self.compact()
+        self._file.close()
+        self._file = None
+
+    def stop(self, timeout=5.0):
+        """Ausstehende Änderungen schreiben, kompaktieren und beenden."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def commit(self):
+        """Alle vorgemerkten Änderungen als eine Journal-Zeile schreiben (Group Commit)."""
+        if not self._pending:
+            return
+        registers, accumulated, mode = {}, {}, None
+        popleft = self._pending.popleft
+        while self._pending:
+            kind, payload = popleft()
+            if kind == "changes":
+                for address, _, new in payload:
+                    registers[str(address)] = new
+            elif kind == "r":
+                registers[str(payload[0])] = payload[1]
+            elif kind == "r*":
+                registers.update((str(address), value) for address, value in payload.items())
+            elif kind == "a":
+                accumulated[str(payload[0])] = payload[1]
+            else:
+                mode = payload
+        batch = {}
+        if registers:
+            batch["r"] = registers
+        if accumulated:
+            batch["a"] = accumulated
+        if mode is not None:
+            batch["m"] = mode
+        apply_entry(self.state, batch)
+        line = encode_entry(batch)
+        self._file.write(line)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._journal_size += len(line)
+        self.commits += 1
+
+    def compact(self):
+        """State atomar als Snapshot schreiben und das Journal leeren."""
+        save_state(self.state, self.state_file)
+        # A crash before the truncation only replays values the snapshot already has
+        with open(self.journal_file, "w") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        if self._file is not None:
+            # Append mode: following writes start at the new end (0)
+            self._file.seek(0, os.SEEK_END)
+        self._journal_size = 0
+        self._since_compaction = 0.0
+        self.compactions += 1
+
+    def stats(self):
+        """Zähler des Journals."""
+        return {
+            "pending": len(self._pending),
+            "commits": self.commits,
+            "compactions": self.compactions,
+            "journal_bytes": self._journal_size,
+        }
@@ -0,0 +1,252 @@
+"""Modbus-TCP-Server mit Verbindungsverwaltung wie bei der Lambda-Steuerung."""
+import asyncio
+from functools import partial
+import time
+import traceback
+
+from pymodbus.constants import ExcCodes
+from pymodbus.exceptions import NoSuchIdException
+from pymodbus.logging import Log
+from pymodbus.pdu import ExceptionResponse
+from pymodbus.server import ModbusTcpServer
+from pymodbus.server.requesthandler import ServerRequestHandler
+
+# Limits of the real controller (Modbus-Beschreibung, 2 and 5.1)
+LAMBDA_MAX_CLIENTS = 16
+LAMBDA_IDLE_TIMEOUT = 60.0
+
+
+class ConnectionStats:
+    """Zähler einer einzelnen Client-Verbindung."""
+
+    __slots__ = ("peer", "connected_at", "last_activity",
+                 "requests", "bytes_in", "bytes_out")
+
+    def __init__(self, peer, now):
+        self.peer = peer
+        self.connected_at = now
+        self.last_activity = now
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def as_dict(self, now=None):
+        """Momentaufnahme als Dictionary."""
+        now = time.monotonic() if now is None else now
+        return {
+            "peer": f"{self.peer[0]}:{self.peer[1]}" if self.peer else "?",
+            "connected_for": round(now - self.connected_at, 1),
+            "idle_for": round(now - self.last_activity, 1),
+            "requests": self.requests,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+class LambdaRequestHandler(ServerRequestHandler):
+    """Request-Handler einer Verbindung mit Accounting."""
+
+    def __init__(self, owner, *args):
+        super().__init__(owner, *args)
+        self.stats = None
+        self.conn_id = 0
+        self.rate_bucket = None
+        # Requests of one connection are answered in order, like on the device
+        self._order_lock = asyncio.Lock()
+        self._tasks = set()
+
+    def callback_connected(self):
+        """Neue Verbindung: registrieren oder bei vollem Server abweisen."""
+        super().callback_connected()
+        peer = self.transport.get_extra_info('peername') if self.transport else None
+        self.stats = ConnectionStats(peer, time.monotonic())
+        if self.server.emulation_profile is not None:
+            self.rate_bucket = self.server.emulation_profile.new_connection_bucket()
+        self.server.register_connection(self)
+
+    def callback_disconnected(self, exc):
+        """Verbindung vom Client beendet."""
+        super().callback_disconnected(exc)
+        self.server.unregister_connection(self)
+
+    def data_received(self, data):
+        """Empfangene Bytes zählen."""
+        if self.stats is not None:
+            self.stats.bytes_in += len(data)
+            self.stats.last_activity = time.monotonic()
+        super().data_received(data)
+
+    def callback_data(self, data, addr=None):
+        """Vollständige Requests zählen."""
+        used_len = super().callback_data(data, addr)
+        if self.last_pdu and self.stats is not None:
+            self.stats.requests += 1
+        return used_len
+
+    def handle_later(self):
+        """Request festhalten und als eigenen Task bearbeiten.
+
+        Der Request wird hier gebunden, damit Verzögerungen nicht mit dem
+        nächsten eintreffenden Request (last_pdu) kollidieren.
+        """
+        if not self.last_pdu:
+            return
+        # Recorder, statistics and request log see every request in arrival order
+        for observer in self.server.request_observers:
+            observer.record(self.conn_id, self.last_pdu)
+        task = self.loop.create_task(self.handle_pdu(self.last_pdu, self.last_addr))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def handle_pdu(self, pdu, addr):
+        """Bearbeite einen Request, ggf. verzögert gemäß Emulationsprofil."""
+        profile = self.server.emulation_profile
+        if profile is None:
+            await self.process_pdu(pdu, addr)
+            return
+        async with self._order_lock:
+            delay = profile.delay(self.rate_bucket)
+            if delay > 0:
+                # Only this connection waits, the event loop keeps serving others
+                await asyncio.sleep(delay)
+            await self.process_pdu(pdu, addr)
+
+    async def process_pdu(self, pdu, addr):
+        """Führe den Request gegen den Datastore aus und sende die Antwort."""
+        try:
+            if self.server.broadcast_enable and not pdu.dev_id:
+                for dev_id in self.server.context.device_ids():
+                    await pdu.update_datastore(self.server.context[dev_id])
+                return
+            context = self.server.context[pdu.dev_id]
+            response = await pdu.update_datastore(context)
+        except NoSuchIdException:
+            if self.server.ignore_missing_devices:
+                return
+            Log.error("requested device id does not exist: {}", pdu.dev_id)
+            response = ExceptionResponse(pdu.function_code, ExcCodes.GATEWAY_NO_RESPONSE)
+        except Exception as exc:  # pylint: disable=broad-except
+            Log.error("Datastore unable to fulfill request: {}; {}",
+                      exc, traceback.format_exc())
+            response = ExceptionResponse(pdu.function_code, ExcCodes.DEVICE_FAILURE)
+        response.transaction_id = pdu.transaction_id
+        response.dev_id = pdu.dev_id
+        if self.transport:
+            self.server_send(response, addr)
+
+    def send(self, data, addr=None):
+        """Gesendete Bytes zählen."""
+        if self.stats is not None:
+            self.stats.bytes_out += len(data)
+        super().send(data, addr)
+
+
+class LambdaTcpServer(ModbusTcpServer):
+    """ModbusTcpServer mit Client-Limit, Idle-Timeout, Verbindungsstatistik
+    und optionaler Antwortzeit-/Durchsatz-Emulation.
+
+    Mit reuse_port=True (SO_REUSEPORT) können mehrere Prozesse denselben
+    Port binden; der Kernel verteilt neue Verbindungen auf sie.
+    """
+
+    def __init__(self, context, *, max_clients=None, idle_timeout=None,
+                 emulation_profile=None, recorder=None, traffic_stats=None,
+                 request_log=None, log_message=None, reuse_port=False, **kwargs):
+        super().__init__(context, **kwargs)
+        if reuse_port:
+            # Listener is created by loop.create_server(..., reuse_address=True)
+            self.call_create = partial(self.call_create, reuse_port=True)
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.emulation_profile = emulation_profile
+        self.recorder = recorder
+        self.traffic_stats = traffic_stats
+        self.request_log = request_log
+        self.request_observers = [observer for observer in (recorder, traffic_stats, request_log)
+                                  if observer is not None]
+        self.log_message = log_message
+        self.connections = {}
+        self.rejected_connections = 0
+        self.reaped_connections = 0
+        self._next_conn_id = 0
+        self._reaper_task = None
+
+    def callback_new_connection(self):
+        """Erzeuge den Handler für eine neue Verbindung."""
+        return LambdaRequestHandler(
+            self,
+            self.trace_packet,
+            self.trace_pdu,
+            self.trace_connect
+        )
+
+    def register_connection(self, handler):
+        """Nimm eine Verbindung auf, sofern das Client-Limit nicht erreicht ist."""
+        if self.max_clients is not None and len(self.connections) >= self.max_clients:
+            self.rejected_connections += 1
+            self._log("REJECT", handler,
+                      f"Connection limit of {self.max_clients} clients reached")
+            handler.close()
+            return False
+        self._next_conn_id += 1
+        handler.conn_id = self._next_conn_id
+        self.connections[handler] = handler.stats
+        return True
+
+    def unregister_connection(self, handler):
+        """Entferne eine Verbindung aus der Verwaltung."""
+        self.connections.pop(handler, None)
+
+    def drop_connection(self, handler, reason):
+        """Schließe eine Verbindung serverseitig."""
+        self._log("DISCONNECT", handler, reason)
+        self.unregister_connection(handler)
+        handler.close()
+
+    async def serve_forever(self, *, background=False):
+        """Starte den Server samt Idle-Reaper."""
+        if self.idle_timeout:
+            self._reaper_task = asyncio.create_task(self._reap_idle_connections())
+        await super().serve_forever(background=background)
+
+    async def shutdown(self):
+        """Beende Reaper und Server."""
+        if self._reaper_task is not None:
+            self._reaper_task.cancel()
+            self._reaper_task = None
+        loop = asyncio.get_running_loop()
+        for observer in (self.recorder, self.request_log):
+            if observer is not None:
+                # close() may flush and join a writer thread: keep it off the loop
+                await loop.run_in_executor(None, observer.close)
+        await super().shutdown()
+
+    async def _reap_idle_connections(self):
+        """Trenne Verbindungen, die länger als idle_timeout keinen Request geschickt haben."""
+        interval = min(self.idle_timeout / 4, 5.0)
+        while True:
+            await asyncio.sleep(interval)
+            deadline = time.monotonic() - self.idle_timeout
+            idle = [handler for handler, stats in self.connections.items()
+                    if stats.last_activity < deadline]
+            for handler in idle:
+                self.reaped_connections += 1
+                self.drop_connection(
+                    handler, f"Idle for more than {self.idle_timeout:.0f}s")
+
+    def get_connection_stats(self):
+        """Momentaufnahme aller Verbindungen."""
+        now = time.monotonic()
+        return {
+            "active": len(self.connections),
+            "rejected": self.rejected_connections,
+            "reaped": self.reaped_connections,
+            "stalls": self.emulation_profile.stalls if self.emulation_profile else 0,
+            "connections": [stats.as_dict(now) for stats in list(self.connections.values())],
+        }
+
+    def _log(self, msg_type, handler, text):
+        """Verbindungsereignis ins Log schreiben."""
+        if self.log_message is not None:
+            peer = handler.stats.as_dict()["peer"] if handler.stats else "?"
+            self.log_message(msg_type, 0, 0, f"{peer}: {text}")
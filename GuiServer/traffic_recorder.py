@@ -0,0 +1,100 @@
+"""Aufzeichnung des Modbus-Verkehrs in ein kompaktes Binärformat.
+
+Dateiformat (Little-Endian):
+    Header:  b"MBTR", Version (B), Startzeit als Unix-Zeit (d)
+    Record:  Zeit seit Start in µs (Q), Verbindung (H), Unit (B), Funktionscode (B),
+             Adresse (H), Anzahl (H), Anzahl Payload-Wörter (H), Payload (H * n)
+
+FC 23 (Read/Write Multiple Registers): Adresse und Anzahl des Lesebereichs,
+Payload = Schreibadresse gefolgt von den geschriebenen Wörtern.
+"""
+import struct
+import time
+from collections import namedtuple
+
+RECORDING_MAGIC = b"MBTR"
+RECORDING_VERSION = 2
+# Version 1 recorded only the write part of FC 23 requests
+READABLE_VERSIONS = (1, RECORDING_VERSION)
+
+HEADER = struct.Struct("<4sBd")
+RECORD = struct.Struct("<QHBBHHH")
+
+Record = namedtuple("Record", "time conn unit function address count payload")
+
+
+def encode_request(pdu):
+    """Liefert (address, count, payload) eines Request-PDUs."""
+    fx = pdu.function_code
+    if fx in (6, 16):
+        # Write single/multiple registers: payload is the written words
+        return pdu.address, len(pdu.registers), list(pdu.registers)
+    if fx in (5, 15):
+        # Write single/multiple coils: payload is one word per bit
+        return pdu.address, len(pdu.bits), [1 if bit else 0 for bit in pdu.bits]
+    if fx == 23:
+        # Read/write multiple registers: read range, write address + written words
+        return pdu.read_address, pdu.read_count, [pdu.write_address, *pdu.write_registers]
+    return getattr(pdu, 'address', 0), getattr(pdu, 'count', 0), []
+
+
+def pack_record(elapsed, conn, unit, function, address, count, payload):
+    """Kodiere einen Record."""
+    data = RECORD.pack(int(elapsed * 1_000_000), conn & 0xFFFF, unit & 0xFF,
+                       function & 0xFF, address & 0xFFFF, count & 0xFFFF, len(payload))
+    if payload:
+        data += struct.pack(f"<{len(payload)}H", *payload)
+    return data
+
+
+class TrafficRecorder:
+    """Schreibt jeden Request mit Zeitstempel in eine Aufzeichnungsdatei."""
+
+    def __init__(self, path, buffer_size=64 * 1024):
+        self.path = path
+        self.start = time.monotonic()
+        self.records = 0
+        self._file = open(path, 'wb', buffering=buffer_size)
+        self._file.write(HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, time.time()))
+
+    def record(self, conn, pdu):
+        """Zeichne einen Request auf (läuft im Event-Loop, nur gepuffertes Schreiben)."""
+        if self._file is None:
+            return
+        address, count, payload = encode_request(pdu)
+        self._file.write(pack_record(time.monotonic() - self.start, conn, pdu.dev_id,
+                                     pdu.function_code, address, count, payload))
+        self.records += 1
+
+    def close(self):
+        """Puffer schreiben und Datei schließen."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_recording(path):
+    """Lese eine Aufzeichnung; liefert (Startzeit, Liste von Records)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, version, started = HEADER.unpack_from(data, 0)
+    if magic != RECORDING_MAGIC or version not in READABLE_VERSIONS:
+        raise ValueError(f"{path} is not a traffic recording")
+
+    records = []
+    offset = HEADER.size
+    while offset + RECORD.size <= len(data):
+        elapsed_us, conn, unit, function, address, count, words = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if offset + 2 * words > len(data):
+            # Truncated last record (server killed while writing)
+            break
+        payload = list(struct.unpack_from(f"<{words}H", data, offset)) if words else []
+        offset += 2 * words
+        if function == 23 and version == 1:
+            # Read range missing, cannot be replayed
+            continue
+        records.append(Record(elapsed_us / 1_000_000, conn, unit, function,
+                              address, count, payload))
+    return started, records
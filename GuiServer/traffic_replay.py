@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Lastgenerator: spielt eine Verkehrsaufzeichnung gegen einen Modbus-Server ab.
+
+Beispiel:
+    python traffic_replay.py traffic.mbtr --speed 10 --connections 32
+    python traffic_replay.py traffic.mbtr --speed 0      # so schnell wie möglich
+"""
+import argparse
+import asyncio
+import time
+
+from pymodbus.client import AsyncModbusTcpClient
+
+from traffic_recorder import read_recording
+
+
+async def send_request(client, record):
+    """Sende einen aufgezeichneten Request, abhängig vom Funktionscode."""
+    fx = record.function
+    kwargs = {"device_id": record.unit}
+    if fx == 3:
+        return await client.read_holding_registers(record.address, count=record.count, **kwargs)
+    if fx == 4:
+        return await client.read_input_registers(record.address, count=record.count, **kwargs)
+    if fx == 6:
+        return await client.write_register(record.address, record.payload[0], **kwargs)
+    if fx == 16:
+        return await client.write_registers(record.address, record.payload, **kwargs)
+    if fx == 1:
+        return await client.read_coils(record.address, count=record.count, **kwargs)
+    if fx == 2:
+        return await client.read_discrete_inputs(record.address, count=record.count, **kwargs)
+    if fx == 5:
+        return await client.write_coil(record.address, bool(record.payload[0]), **kwargs)
+    if fx == 15:
+        return await client.write_coils(record.address, [bool(b) for b in record.payload], **kwargs)
+    if fx == 23:
+        return await client.readwrite_registers(
+            read_address=record.address, read_count=record.count,
+            write_address=record.payload[0], values=record.payload[1:], **kwargs)
+    return None
+
+
+class ReplayStats:
+    """Ergebnisse eines Replay-Laufs."""
+
+    def __init__(self):
+        self.ok = 0
+        self.exceptions = 0
+        self.failed = 0
+        self.skipped = 0
+        self.latencies = []
+
+    def percentile(self, fraction):
+        """Antwortzeit-Perzentil in Millisekunden."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(fraction * len(ordered)))
+        return ordered[index] * 1000.0
+
+
+async def replay_connection(host, port, records, speed, start, origin, stats):
+    """Spiele die Requests einer Verbindung der Reihe nach ab."""
+    client = AsyncModbusTcpClient(host, port=port, retries=0, timeout=5)
+    if not await client.connect():
+        stats.failed += len(records)
+        return
+    try:
+        for record in records:
+            if speed:
+                # Keep the recorded pacing, compressed by the speed factor
+                wait = start + (record.time - origin) / speed - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            sent = time.monotonic()
+            try:
+                response = await send_request(client, record)
+            except Exception:  # pylint: disable=broad-except
+                stats.failed += 1
+                if not client.connected:
+                    break
+                continue
+            if response is None:
+                stats.skipped += 1
+                continue
+            stats.latencies.append(time.monotonic() - sent)
+            if response.isError():
+                stats.exceptions += 1
+            else:
+                stats.ok += 1
+    finally:
+        client.close()
+
+
+def assign_connections(records, connections):
+    """Records auf Replay-Verbindungen verteilen: {Verbindung: [Records]}.
+
+    Bei weniger Verbindungen als aufgezeichnet teilen sich aufgezeichnete
+    Verbindungen eine Replay-Verbindung; bei mehr werden die Requests jeder
+    aufgezeichneten Verbindung reihum auf ihren Anteil verteilt. Innerhalb
+    einer Replay-Verbindung bleibt die aufgezeichnete Reihenfolge erhalten.
+    """
+    recorded = {conn: index for index, conn in
+                enumerate(sorted({record.conn for record in records}))}
+    if not connections:
+        connections = len(recorded)
+    # Replay connections of each recorded connection (round robin over the slots)
+    slots = {index: [slot for slot in range(connections) if slot % len(recorded) == index]
+             or [index % connections]
+             for index in recorded.values()}
+    sequence = dict.fromkeys(recorded.values(), 0)
+    groups = {}
+    for record in records:
+        index = recorded[record.conn]
+        own = slots[index]
+        groups.setdefault(own[sequence[index] % len(own)], []).append(record)
+        sequence[index] += 1
+    return groups
+
+
+async def replay(records, host, port, speed, connections):
+    """Verteile die Records auf die Verbindungen und spiele sie parallel ab."""
+    groups = assign_connections(records, connections)
+
+    stats = ReplayStats()
+    # Start with the first recorded request, not with the server start
+    origin = records[0].time if records else 0.0
+    start = time.monotonic()
+    await asyncio.gather(*(
+        replay_connection(host, port, group, speed, start, origin, stats)
+        for group in groups.values()
+    ))
+    return stats, time.monotonic() - start, len(groups)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Modbus-Verkehrsaufzeichnung abspielen")
+    parser.add_argument("recording", help="Aufzeichnungsdatei (RECORD_TRAFFIC_FILE)")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5020)
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Zeitraffer-Faktor, 0 = so schnell wie möglich")
+    parser.add_argument("--connections", type=int, default=0,
+                        help="Anzahl paralleler Verbindungen (0 = wie aufgezeichnet)")
+    args = parser.parse_args()
+
+    started, records = read_recording(args.recording)
+    print(f"Aufzeichnung vom {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))}: "
+          f"{len(records)} Requests")
+
+    stats, duration, used = asyncio.run(
+        replay(records, args.host, args.port, args.speed, args.connections))
+
+    total = stats.ok + stats.exceptions + stats.failed
+    print(f"Verbindungen: {used}")
+    print(f"Requests: {total} (OK: {stats.ok}, Exception: {stats.exceptions}, "
+          f"Fehler: {stats.failed}, übersprungen: {stats.skipped})")
+    print(f"Dauer: {duration:.2f}s, {total / duration if duration else 0:.0f} Requests/s")
+    print(f"Antwortzeit p50: {stats.percentile(0.50):.1f}ms, "
+          f"p90: {stats.percentile(0.90):.1f}ms, "
+          f"p99: {stats.percentile(0.99):.1f}ms, "
+          f"max: {stats.percentile(1.0):.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Aggregierte Zugriffsstatistik pro (Unit, Funktionscode, Adressbereich).
+
+Statt einer Log-Zeile pro Request werden Zähler in Sekunden-Buckets über
+ein rollierendes Fenster gehalten; daraus entsteht eine Top-N-Übersicht
+der meistgenutzten Bereiche ("1004 x1: 12.0/s von 3 Clients").
+"""
+import time
+
+TRAFFIC_WINDOW = 60          # seconds kept
+TRAFFIC_TOP_N = 10
+
+FUNCTION_NAMES = {
+    1: "read_coils",
+    2: "read_discrete_inputs",
+    3: "read_holding_registers",
+    4: "read_input_registers",
+    5: "write_single_coil",
+    6: "write_single_register",
+    15: "write_multiple_coils",
+    16: "write_multiple_registers",
+    23: "read_write_multiple_registers",
+}
+
+
+def request_range(pdu):
+    """(address, count) eines Request-PDUs."""
+    fx = pdu.function_code
+    if fx in (6, 16):
+        return pdu.address, len(pdu.registers)
+    if fx in (5, 15):
+        # Packed FC 15 requests carry their count, bits are unpacked on demand
+        return pdu.address, pdu.count or len(pdu.bits)
+    return getattr(pdu, 'address', 0), getattr(pdu, 'count', 0)
+
+
+class TrafficStats:
+    """Rollierende Zähler in Sekunden-Buckets."""
+
+    def __init__(self, window=TRAFFIC_WINDOW):
+        self.window = window
+        # One dict per second: key -> [requests, set of connection ids]
+        self._buckets = [{} for _ in range(window)]
+        self._bucket_seconds = [None] * window
+        self.total = 0
+
+    def record(self, conn, pdu, now=None):
+        """Zähle einen Request (läuft im Event-Loop)."""
+        second = int(time.monotonic() if now is None else now)
+        index = second % self.window
+        if self._bucket_seconds[index] != second:
+            # Bucket left the window: reuse it for this second
+            self._buckets[index] = {}
+            self._bucket_seconds[index] = second
+        address, count = request_range(pdu)
+        key = (pdu.dev_id, pdu.function_code, address, count)
+        entry = self._buckets[index].get(key)
+        if entry is None:
+            entry = self._buckets[index][key] = [0, set()]
+        entry[0] += 1
+        entry[1].add(conn)
+        self.total += 1
+
+    def summary(self, period=10, top_n=TRAFFIC_TOP_N, now=None):
+        """Top-N-Bereiche der letzten `period` Sekunden, absteigend nach Rate."""
+        period = max(1, min(period, self.window))
+        current = int(time.monotonic() if now is None else now)
+        totals = {}
+        for second, bucket in zip(self._bucket_seconds, self._buckets):
+            if second is None or not current - period < second <= current:
+                continue
+            # Copy first: the event loop may add keys while the GUI reads
+            for key, (requests, clients) in list(bucket.items()):
+                entry = totals.get(key)
+                if entry is None:
+                    totals[key] = [requests, set(clients)]
+                else:
+                    entry[0] += requests
+                    entry[1] |= clients
+        ranked = sorted(merge_overlapping(totals).items(),
+                        key=lambda item: item[1][0], reverse=True)
+        return [
+            {
+                "unit": unit,
+                "function": function,
+                "address": address,
+                "count": count,
+                "requests": requests,
+                "rate": requests / period,
+                "clients": len(clients),
+            }
+            for (unit, function, address, count), (requests, clients) in ranked[:top_n]
+        ]
+
+
+def merge_overlapping(totals):
+    """Überlappende Bereiche gleicher Unit und Funktion zusammenfassen.
+
+    Clients, die dieselben Register mit verschobenem oder unterschiedlich
+    langem Fenster lesen, erscheinen so als ein Bereich statt als mehrere.
+    """
+    merged = {}
+    current_key = None
+    for key in sorted(totals):
+        unit, function, address, count = key
+        requests, clients = totals[key]
+        end = address + max(count, 1)
+        if (current_key is not None and current_key[:2] == (unit, function)
+                and address < current_end):
+            entry = merged.pop(current_key)
+            current_end = max(current_end, end)
+            current_key = (unit, function, current_key[2], current_end - current_key[2])
+            entry[0] += requests
+            entry[1] |= clients
+            merged[current_key] = entry
+            continue
+        current_key, current_end = key, end
+        merged[key] = [requests, set(clients)]
+    return merged
+
+
+def format_summary(summary):
+    """Eine Textzeile pro Bereich, z.B. für das Log."""
+    lines = []
+    for entry in summary:
+        name = FUNCTION_NAMES.get(entry["function"], f"function_{entry['function']}")
+        last = entry["address"] + max(entry["count"], 1) - 1
+        span = (f"{entry['address']}" if last == entry["address"]
+                else f"{entry['address']}-{last}")
+        lines.append(f"Unit {entry['unit']} {name} {span}: {entry['rate']:.1f}/s "
+                     f"by {entry['clients']} client(s)")
+    return lines
@@ -7,6 +7,8 @@ import yaml
 import os
 import logging
 
+import register_cache
+
 # Server configuration constants
 MODBUS_SERVER_PORT = 5020  # Standard Modbus TCP port is 502, but we use 5020 for testing
 
@@ -15,6 +17,9 @@ LOG_ERRORS = True
 LOG_WRITE_REGISTERS = True
 LOG_READ_REGISTERS = True
 
+# Read back and log every register after startup (slow with large maps)
+SELF_CHECK = False
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -109,105 +114,78 @@ class LoggingSlaveContext(ModbusDeviceContext):
             logger.error(f"Actually written: {written_values}")
 
 def load_registers(config_file):
-    with open(config_file, 'r') as file:
-        registers = yaml.safe_load(file)['registers']
-        # Sort registers by address to ensure proper initialization order
-        return sorted(registers, key=lambda x: x['address'])
-
-def setup_modbus_server(registers):
-    # Determine maximum address needed for each block type
-    max_hr_addr = 0
-    max_ir_addr = 0
-    max_co_addr = 0
-    
-    # First pass: determine block sizes
+    # Compiled cache next to the YAML file; re-parsed (and sorted by address)
+    # only when registers.yaml changed since the cache was written
+    return register_cache.load_registers(config_file)
+
+def register_words(reg):
+    value = int(reg['initial_value'])
+    # Handle 32-bit values - Big-Endian format: high word first, then low word
+    if reg['type'] in ['int32', 'uint32']:
+        return [(value >> 16) & 0xFFFF, value & 0xFFFF]
+    return [value & 0xFFFF]
+
+def build_register_image(registers):
+    valid_addresses = set()
+    sizes = {'holding': 0, 'input': 0, 'coil': 0}
+    entries = []
+
+    # First pass: words, valid addresses and block sizes
     for reg in registers:
         addr = reg['address']
-        reg_type = reg['type']
         mode = reg['mode']
-        
-        # Account for 32-bit registers
-        size = 2 if reg_type in ['int32', 'uint32'] else 1
-        end_addr = addr + size
-        
-        if mode == 'holding':
-            max_hr_addr = max(max_hr_addr, end_addr)
-        elif mode == 'input':
-            max_ir_addr = max(max_ir_addr, end_addr)
-        elif mode == 'coil':
-            max_co_addr = max(max_co_addr, end_addr)
-
-    logger.info(f"Initializing blocks - HR: {max_hr_addr}, IR: {max_ir_addr}, CO: {max_co_addr}")
+        words = register_words(reg)
+        valid_addresses.update(range(addr, addr + len(words)))
+        if mode in sizes:
+            sizes[mode] = max(sizes[mode], addr + len(words))
+            entries.append((mode, addr, words))
 
-    # Create data blocks with sufficient size and initialize with zeros
+    # Second pass: fill one dense array per table
     # Add +1 to size to account for zero-based addressing
-    hr_size = max_hr_addr + 1
-    ir_size = max_ir_addr + 1
-    co_size = max_co_addr + 1
+    images = {mode: [0] * (size + 1) for mode, size in sizes.items()}
+    for mode, addr, words in entries:
+        images[mode][addr:addr + len(words)] = words
+    return images, valid_addresses
+
+def verify_registers(store, registers):
+    # Self-check: read every register back through the logging context
+    logger.info("Verifying all registers after initialization:")
+    fx_for_mode = {'holding': 3, 'input': 4, 'coil': 1}
+    for reg in registers:
+        fx = fx_for_mode.get(reg['mode'])
+        if fx is None:
+            continue
+        addr = reg['address']
+        expected = register_words(reg)
+        written = store.getValues(fx, addr, len(expected))
+        if written != expected:
+            if LOG_ERRORS:
+                logger.error(f"Verification failed for register {addr}!")
+                logger.error(f"Expected: {expected}, Got: {written}")
+        else:
+            logger.info(f"Register {addr}: {[f'0x{v:04x} ({v})' for v in written]}")
 
-    hr_block = ModbusSequentialDataBlock(0, [0] * hr_size) if max_hr_addr > 0 else None
-    ir_block = ModbusSequentialDataBlock(0, [0] * ir_size) if max_ir_addr > 0 else None
-    co_block = ModbusSequentialDataBlock(0, [0] * co_size) if max_co_addr > 0 else None
+def setup_modbus_server(registers):
+    images, valid_addresses = build_register_image(registers)
+    logger.info(f"Initializing blocks - HR: {len(images['holding']) - 1}, "
+                f"IR: {len(images['input']) - 1}, CO: {len(images['coil']) - 1}")
 
-    # Create slave context first
+    # pymodbus treats `address` as 1-based internally (address-1 is the actual
+    # register index), so pass 1 to start the block at register 0.
+    # Each block is installed in one go from its dense image.
     store = LoggingSlaveContext(
-        hr=hr_block if hr_block else ModbusSequentialDataBlock(0, [0]),
-        ir=ir_block if ir_block else ModbusSequentialDataBlock(0, [0]),
-        co=co_block if co_block else ModbusSequentialDataBlock(0, [0]),
-        di=ModbusSequentialDataBlock(0, [0])  # Add empty discrete inputs block
+        hr=ModbusSequentialDataBlock(1, images['holding']),
+        ir=ModbusSequentialDataBlock(1, images['input']),
+        co=ModbusSequentialDataBlock(1, images['coil']),
+        di=ModbusSequentialDataBlock(1, [0])  # Add empty discrete inputs block
     )
 
     # Store valid addresses in the context for validation
     store.valid_addresses = valid_addresses
 
-    # Second pass: initialize values
-    for reg in registers:
-        addr = reg['address']
-        reg_type = reg['type']
-        mode = reg['mode']
-        value = int(reg['initial_value'])
-        
-        logger.info(f"Setting register - Address: {addr}, Type: {reg_type}, Mode: {mode}, Value: 0x{value:x} ({value})")
-        
-        # Handle 32-bit values - Big-Endian format
-        if reg_type in ['int32', 'uint32']:
-            # Big-Endian: High word first, then low word
-            high_word = (value >> 16) & 0xFFFF
-            low_word = value & 0xFFFF
-            values = [high_word, low_word]
-            logger.info(f"32-bit register split: [0x{high_word:04x}, 0x{low_word:04x}]")
-        else:
-            values = [value]
-        
-        try:
-            if mode == 'holding':
-                # Use the correct function code (3) and address
-                store.setValues(3, addr, values)
-                # Verify the write
-                written = store.getValues(3, addr, len(values))
-                if written != values:
-                    logger.error(f"Verification failed for register {addr}!")
-                    logger.error(f"Expected: {values}, Got: {written}")
-                    # Try to read the surrounding registers to debug
-                    surrounding = store.getValues(3, max(0, addr-1), min(3, hr_size-addr))
-                    logger.error(f"Surrounding registers ({max(0, addr-1)}-{min(addr+1, hr_size-1)}): {surrounding}")
-            elif mode == 'input':
-                store.setValues(4, addr, values)  # 4 = input registers
-            elif mode == 'coil':
-                store.setValues(1, addr, values)  # 1 = coils
-        except Exception as e:
-            logger.error(f"Failed to set register {addr}: {e}")
-            logger.error(f"Block size - HR: {hr_size}, IR: {ir_size}, CO: {co_size}")
-    
-    # Verify all registers after initialization
-    logger.info("\nVerifying all registers after initialization:")
-    for reg in registers:
-        addr = reg['address']
-        if reg['mode'] == 'holding':
-            size = 2 if reg['type'] in ['int32', 'uint32'] else 1
-            values = store.getValues(3, addr, size)
-            logger.info(f"Register {addr}: {[f'0x{v:04x} ({v})' for v in values]}")
-    
+    if SELF_CHECK:
+        verify_registers(store, registers)
+
     context = ModbusServerContext(store, single=True)
     return context
 
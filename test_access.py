@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Teste Schreibrechte (RO/RW) und bit-gepackte Coil-/Discrete-Input-Zugriffe
+
+Schreibzugriffe auf RO-Datenpunkte müssen mit Exception Code 3 abgelehnt
+werden, auf nicht definierte Adressen mit Code 2; der Wert bleibt dabei
+unverändert. FC 1/2/15 über Byte-Grenzen und in RO-Coils werden geprüft.
+
+Da registers.yaml keine Coils enthält, startet das Skript einen eigenen
+Server (registers.yaml plus Test-Coils und -Discrete-Inputs).
+Voraussetzung: Port 5022 frei (kein anderer Server darauf)
+"""
+
+from pymodbus.client import ModbusTcpClient
+import os
+import sys
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "GuiServer")
+sys.path.insert(0, SERVER_DIR)
+
+from server_threaded import ModbusServerThread, load_registers  # noqa: E402
+
+PORT = 5022
+DISCRETE_INPUTS = [True, False, True, True, False, False, True, False,
+                   False, True, False, True]
+TEST_BITS = [
+    {"address": 0, "mode": "coil", "type": "bool", "count": 20, "initial_value": 0},
+    {"address": 20, "mode": "coil", "type": "bool", "count": 8, "initial_value": 1,
+     "access": "RO"},
+    {"address": 0, "mode": "discrete_input", "type": "bool", "count": len(DISCRETE_INPUTS),
+     "initial_value": DISCRETE_INPUTS},
+]
+
+
+def start_server():
+    registers = load_registers(os.path.join(SERVER_DIR, "registers.yaml")) + TEST_BITS
+    registers.sort(key=lambda reg: reg["address"])
+    server = ModbusServerThread(None, registers, port=PORT, request_log_dir=None,
+                                change_feed=None, control_api=None, enforce_access=True)
+    server.start()
+    if not server.wait_ready():
+        raise RuntimeError("Server nicht gestartet")
+    return server
+
+
+def check_exception(label, result, code):
+    actual = result.exception_code if result.isError() else None
+    print(f"{label}: Code {actual} ({'OK' if actual == code else 'FEHLER'}, Korrekt: {code})")
+
+
+def check_value(label, actual, expected):
+    print(f"{label}: {actual} ({'OK' if actual == expected else 'FEHLER'}, Korrekt: {expected})")
+
+
+def test_register_access(client):
+    print("\nTeste Schreibrechte der Holding-Register...")
+    result = client.write_register(address=5050, value=55)
+    print(f"RW 5050 schreiben: {'FEHLER: ' + str(result) if result.isError() else 'OK'}")
+    before = client.read_holding_registers(address=1000, count=1).registers
+    check_exception("RO 1000 schreiben", client.write_register(address=1000, value=7), 3)
+    check_value("RO 1000 unverändert", client.read_holding_registers(address=1000, count=1).registers,
+                before)
+    check_exception("RO uint32 1020 schreiben",
+                    client.write_registers(address=1020, values=[0, 5]), 3)
+    check_exception("Undefiniertes Register 9999 schreiben",
+                    client.write_register(address=9999, value=1), 2)
+
+
+def test_packed_bits(client):
+    print("\nTeste Coils und Discrete Inputs (bit-gepackt)...")
+    pattern = [bool(i % 3) for i in range(13)]
+    result = client.write_coils(address=3, values=list(pattern))
+    print(f"FC 15 Coils 3-15 schreiben: {'FEHLER: ' + str(result) if result.isError() else 'OK'}")
+    check_value("FC 1 Coils 3-15", client.read_coils(address=3, count=13).bits[:13], pattern)
+    check_exception("FC 15 Coils 16-23 (20-23 RO)",
+                    client.write_coils(address=16, values=[False] * 8), 3)
+    check_value("RO-Coils 20-27 unverändert", client.read_coils(address=20, count=8).bits[:8],
+                [True] * 8)
+    check_exception("FC 5 undefinierte Coil 40", client.write_coil(address=40, value=True), 2)
+    check_value("FC 2 Discrete Inputs 0-11",
+                client.read_discrete_inputs(address=0, count=len(DISCRETE_INPUTS))
+                .bits[:len(DISCRETE_INPUTS)], DISCRETE_INPUTS)
+    check_exception("FC 2 über das Ende hinaus",
+                    client.read_discrete_inputs(address=8, count=8), 2)
+
+
+if __name__ == "__main__":
+    print("Teste Schreibrechte und Bit-Zugriffe...")
+    server = start_server()
+    client = ModbusTcpClient('localhost', port=PORT)
+    try:
+        if client.connect():
+            print("OK: Verbindung erfolgreich!")
+            test_register_access(client)
+            test_packed_bits(client)
+        else:
+            print("FEHLER: Verbindung fehlgeschlagen!")
+    finally:
+        client.close()
+        server.stop()
+        print("Verbindung geschlossen.")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Teste Verbindungslimit (16 Master) und Idle-Timeout (1 min) des GUI-Servers
+
+Voraussetzung: MAX_CLIENTS = 16 und IDLE_TIMEOUT = 60 in GuiServer/server_threaded.py
+"""
+
+from pymodbus.client import ModbusTcpClient
+import time
+
+MAX_CLIENTS = 16
+IDLE_TIMEOUT = 60
+
+def test_connection_limit():
+    print(f"Teste Verbindungslimit ({MAX_CLIENTS} Clients)...")
+
+    clients = [ModbusTcpClient('localhost', port=5020, retries=0, timeout=2)
+               for _ in range(MAX_CLIENTS + 1)]
+
+    try:
+        for client in clients:
+            client.connect()
+
+        accepted = 0
+        for i, client in enumerate(clients):
+            try:
+                result = client.read_holding_registers(address=1000, count=1)
+                if not result.isError():
+                    accepted += 1
+            except Exception as e:
+                print(f"Client {i + 1}: abgewiesen ({type(e).__name__})")
+
+        print(f"Angenommen: {accepted}")
+        print(f"Erwartet: {MAX_CLIENTS}")
+        print(f"Korrekt: {'OK' if accepted == MAX_CLIENTS else 'FEHLER'}")
+
+    finally:
+        for client in clients:
+            client.close()
+        print("Verbindungen geschlossen.")
+
+def test_idle_timeout():
+    print(f"\nTeste Idle-Timeout ({IDLE_TIMEOUT} Sekunden)...")
+
+    client = ModbusTcpClient('localhost', port=5020, retries=0, timeout=2)
+
+    try:
+        if client.connect():
+            print("OK: Verbindung erfolgreich!")
+            client.read_holding_registers(address=1000, count=1)
+
+            print(f"Warte {IDLE_TIMEOUT + 10} Sekunden ohne Anfrage...")
+            time.sleep(IDLE_TIMEOUT + 10)
+
+            try:
+                result = client.read_holding_registers(address=1000, count=1)
+                print(f"FEHLER: Verbindung noch offen ({result})")
+            except Exception as e:
+                print(f"OK: Verbindung vom Server getrennt ({type(e).__name__})")
+        else:
+            print("FEHLER: Verbindung fehlgeschlagen!")
+
+    finally:
+        client.close()
+        print("Verbindung geschlossen.")
+
+if __name__ == "__main__":
+    test_connection_limit()
+    test_idle_timeout()
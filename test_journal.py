@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Teste die Wiederherstellung des States aus dem Journal nach einem Absturz
+
+Das Skript startet den Server selbst mit einer eigenen State-Datei, schreibt
+Register, beendet ihn hart (SIGKILL) und hängt eine gültige und eine halb
+geschriebene Journal-Zeile an. Nach dem Neustart müssen die geschriebenen
+Werte und die gültige Zeile wiederhergestellt sein, die halbe Zeile nicht;
+danach muss das Journal weiter funktionieren.
+
+Voraussetzung: Port 5021 frei (kein anderer Server darauf)
+"""
+
+from pymodbus.client import ModbusTcpClient
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "GuiServer")
+sys.path.insert(0, SERVER_DIR)
+
+from state_journal import JOURNAL_SUFFIX, encode_entry  # noqa: E402
+
+PORT = 5021
+COMMIT_WAIT = 1.0
+
+
+def start_server(state_file):
+    process = subprocess.Popen(
+        [sys.executable, "server_daemon.py", "--port", str(PORT), "--state-file", state_file,
+         "--log", "none", "--no-watch"],
+        cwd=SERVER_DIR)
+    client = ModbusTcpClient('localhost', port=PORT)
+    for _ in range(50):
+        if client.connect():
+            return process, client
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Server nicht erreichbar")
+
+
+def crash_server(process, client):
+    client.close()
+    process.kill()
+    process.wait()
+
+
+def read_values(client, address, count):
+    result = client.read_holding_registers(address=address, count=count)
+    return None if result.isError() else result.registers
+
+
+def check(label, actual, expected):
+    print(f"{label}: {actual} ({'OK' if actual == expected else 'FEHLER'}, Korrekt: {expected})")
+
+
+def test_journal_recovery():
+    print("Teste Journal-Wiederherstellung nach Absturz...")
+    state_file = os.path.join(tempfile.mkdtemp(prefix="journal_test_"), "server_state.json")
+    journal_file = state_file + JOURNAL_SUFFIX
+
+    process, client = start_server(state_file)
+    try:
+        print("OK: Server gestartet!")
+        client.write_registers(address=5050, values=[111, 222])
+        time.sleep(COMMIT_WAIT)
+        crash_server(process, client)
+        print(f"\nServer hart beendet, Journal: {os.path.getsize(journal_file)} Bytes")
+
+        # One complete entry and one torn entry (crash while writing)
+        torn = encode_entry({"r": {"5050": 9999}})
+        with open(journal_file, "a") as f:
+            f.write(encode_entry({"r": {"5052": 333}}))
+            f.write(torn[:len(torn) // 2])
+
+        process, client = start_server(state_file)
+        print("\nServer neu gestartet")
+        check("Register 5050-5052", read_values(client, 5050, 3), [111, 222, 333])
+
+        print("\nSchreibe weiter nach der Wiederherstellung...")
+        client.write_register(address=5051, value=444)
+        time.sleep(COMMIT_WAIT)
+        crash_server(process, client)
+
+        process, client = start_server(state_file)
+        print("Server erneut gestartet")
+        check("Register 5050-5052", read_values(client, 5050, 3), [111, 444, 333])
+    finally:
+        crash_server(process, client)
+        print("Server beendet.")
+
+
+if __name__ == "__main__":
+    test_journal_recovery()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Teste WP-Umschaltung im laufenden Betrieb (1 WP -> 2 WP -> 1 WP)
+
+Die Akkumulatoren 1120/1122 von WP2 müssen nach dem Umschalten auf 2 WP
+weiterzählen und nach dem Zurückschalten aus der Steuer-API verschwinden;
+die Zähler von WP1 zählen ohne Sprung weiter.
+
+Voraussetzung: Server mit Steuer-API, z.B.
+    cd GuiServer && python server_daemon.py --control-api 5080
+"""
+
+from pymodbus.client import ModbusTcpClient
+import json
+import time
+from urllib.request import Request, urlopen
+
+CONTROL_API = "http://127.0.0.1:5080"
+WAIT_SECONDS = 3
+
+
+def api(path, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    request = Request(CONTROL_API + path, data=data,
+                      headers={"Content-Type": "application/json"})
+    with urlopen(request, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def read_uint32(client, address):
+    result = client.read_holding_registers(address=address, count=2)
+    if result.isError():
+        return None
+    high_word, low_word = result.registers
+    return (high_word << 16) | low_word
+
+
+def check_counting(client, address):
+    first = read_uint32(client, address)
+    time.sleep(WAIT_SECONDS)
+    second = read_uint32(client, address)
+    print(f"Register {address}: {first} -> {second}")
+    print(f"Zählt weiter: {'OK' if first is not None and second is not None and second > first else 'FEHLER'}")
+    return second
+
+
+def test_mode_switch():
+    print("Teste WP-Umschaltung mit Akkumulatoren...")
+
+    client = ModbusTcpClient('localhost', port=5020)
+
+    try:
+        if not client.connect():
+            print("FEHLER: Verbindung fehlgeschlagen!")
+            return
+        print("OK: Verbindung erfolgreich!")
+
+        print("\nSchalte auf 1 WP...")
+        api("/mode", {"hp_mode": 1})
+        wp1 = read_uint32(client, 1020)
+
+        print("\nSchalte auf 2 WP...")
+        api("/mode", {"hp_mode": 2})
+        for address in (1120, 1122):
+            check_counting(client, address)
+        after = read_uint32(client, 1020)
+        print(f"WP1-Zähler 1020: {wp1} -> {after}")
+        print(f"Ohne Sprung: {'OK' if wp1 is not None and after is not None and 0 <= after - wp1 < 100 else 'FEHLER'}")
+
+        print("\nSchalte zurück auf 1 WP...")
+        api("/mode", {"hp_mode": 1})
+        result = client.read_holding_registers(address=1120, count=1)
+        print(f"Register 1120 ungültig: {'OK' if result.isError() else 'FEHLER'} ({result})")
+        check_counting(client, 1020)
+
+    finally:
+        client.close()
+        print("Verbindung geschlossen.")
+
+
+if __name__ == "__main__":
+    test_mode_switch()
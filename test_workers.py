@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Teste den Worker-Modus (mehrere Prozesse, gemeinsames Register-Image)
+
+Viele Verbindungen landen auf verschiedenen Workern: Schreibzugriffe müssen
+über alle Verbindungen sichtbar sein, die Akkumulatoren müssen überall
+denselben, weiterzählenden Stand liefern.
+
+Voraussetzung: Server im Worker-Modus, z.B.
+    cd GuiServer && python server_daemon.py --workers 4
+"""
+
+from pymodbus.client import ModbusTcpClient
+import time
+
+CONNECTIONS = 16
+WAIT_SECONDS = 3
+
+
+def read_uint32(client, address):
+    result = client.read_holding_registers(address=address, count=2)
+    if result.isError():
+        return None
+    high_word, low_word = result.registers
+    return (high_word << 16) | low_word
+
+
+def test_shared_writes(clients):
+    print("\nTeste Schreibzugriffe über alle Verbindungen (Register 5050)...")
+    ok = True
+    for i, writer in enumerate(clients):
+        value = 100 + i
+        result = writer.write_register(address=5050, value=value)
+        if result.isError():
+            print(f"FEHLER: Schreiben über Verbindung {i + 1}: {result}")
+            ok = False
+            continue
+        seen = [client.read_holding_registers(address=5050, count=1).registers[0]
+                for client in clients]
+        if any(v != value for v in seen):
+            print(f"FEHLER: Wert {value} nicht überall sichtbar: {seen}")
+            ok = False
+    print(f"Sichtbar in allen Verbindungen: {'OK' if ok else 'FEHLER'}")
+
+
+def test_accumulators(clients):
+    for address in (1020, 1022):
+        print(f"\nTeste Akkumulator {address} über {len(clients)} Verbindungen...")
+        first = [read_uint32(client, address) for client in clients]
+        time.sleep(WAIT_SECONDS)
+        second = [read_uint32(client, address) for client in clients]
+        print(f"Werte: {min(first)}..{max(first)} -> {min(second)}..{max(second)}")
+        print(f"Zählt weiter: {'OK' if min(second) > max(first) else 'FEHLER'}")
+        print(f"Gleicher Stand (max. 1 Zählschritt Abstand): "
+              f"{'OK' if max(second) - min(second) <= 1 else 'FEHLER'}")
+
+
+if __name__ == "__main__":
+    print(f"Teste Worker-Modus mit {CONNECTIONS} Verbindungen...")
+    clients = [ModbusTcpClient('localhost', port=5020) for _ in range(CONNECTIONS)]
+    try:
+        if all(client.connect() for client in clients):
+            print("OK: Verbindungen erfolgreich!")
+            test_shared_writes(clients)
+            test_accumulators(clients)
+        else:
+            print("FEHLER: Verbindung fehlgeschlagen!")
+    finally:
+        for client in clients:
+            client.close()
+        print("Verbindungen geschlossen.")